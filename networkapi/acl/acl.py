@@ -18,6 +18,7 @@
 from networkapi.cvs import Cvs, CVSCommandError
 from networkapi.acl.file import File, FileError
 from networkapi.acl.Enum import Enum, NETWORK_TYPES
+from networkapi.infrastructure.config_template import render_file
 from networkapi.settings import PATH_ACL
 import logging
 import os
@@ -308,18 +309,13 @@ def scriptAclCvs(acl_name, vlan, environment, network, user, template_name):
 
             Cvs.synchronization()
 
-            file_template = open(template_name, "r")
-
-            content_template = file_template.read()
-
             nova_acl = replace_template(
-                acl_name, vlan, content_template, network)
+                acl_name, vlan, template_name, network)
 
             chdir(PATH_TYPES.ACL, network, path_env)
 
             arquivo.write("%s" % nova_acl)
             arquivo.close()
-            file_template.close()
 
             Cvs.commit(acl, "%s gerou Script para a acl %s" % (user.user, acl))
 
@@ -339,19 +335,13 @@ def scriptAclCvs(acl_name, vlan, environment, network, user, template_name):
 
                 chdir(PATH_TYPES.TEMPLATE, network)
 
-                file_template = open(
-                    PREFIX_TEMPLATES + TEMPLATES.BE + EXTENTION_FILE, "r")
-
-                content_template = file_template.read()
-
                 nova_acl = replace_template(
-                    acl_name, vlan, content_template, network)
+                    acl_name, vlan, PREFIX_TEMPLATES + TEMPLATES.BE + EXTENTION_FILE, network)
 
                 chdir(PATH_TYPES.ACL, network, path_env)
 
                 arquivo.write("%s" % nova_acl)
                 arquivo.close()
-                file_template.close()
 
                 Cvs.commit(acl, "%s gerou Script para a acl %s" %
                            (user.user, acl))
@@ -372,19 +362,13 @@ def scriptAclCvs(acl_name, vlan, environment, network, user, template_name):
 
                 chdir(PATH_TYPES.TEMPLATE, network)
 
-                file_template = open(
-                    PREFIX_TEMPLATES + TEMPLATES.FE_DEV_QA + EXTENTION_FILE, "r")
-
-                content_template = file_template.read()
-
                 nova_acl = replace_template(
-                    acl_name, vlan, content_template, network)
+                    acl_name, vlan, PREFIX_TEMPLATES + TEMPLATES.FE_DEV_QA + EXTENTION_FILE, network)
 
                 chdir(PATH_TYPES.ACL, network, path_env)
 
                 arquivo.write("%s" % nova_acl)
                 arquivo.close()
-                file_template.close()
 
                 Cvs.commit(acl, "%s gerou Script para a acl %s" %
                            (user.user, acl))
@@ -406,22 +390,17 @@ def scriptAclCvs(acl_name, vlan, environment, network, user, template_name):
                 chdir(PATH_TYPES.TEMPLATE, network)
 
                 if "staging" in acl.lower():
-                    file_template = open(
-                        PREFIX_TEMPLATES + TEMPLATES.FE_STAGING + EXTENTION_FILE, "r")
+                    template_name = PREFIX_TEMPLATES + TEMPLATES.FE_STAGING + EXTENTION_FILE
                 else:
-                    file_template = open(
-                        PREFIX_TEMPLATES + TEMPLATES.FE_PORTAL + EXTENTION_FILE, "r")
-
-                content_template = file_template.read()
+                    template_name = PREFIX_TEMPLATES + TEMPLATES.FE_PORTAL + EXTENTION_FILE
 
                 nova_acl = replace_template(
-                    acl_name, vlan, content_template, network)
+                    acl_name, vlan, template_name, network)
 
                 chdir(PATH_TYPES.ACL, network, path_env)
 
                 arquivo.write("%s" % nova_acl)
                 arquivo.close()
-                file_template.close()
 
                 Cvs.commit(acl, "%s gerou Script para a acl %s" %
                            (user.user, acl))
@@ -442,19 +421,13 @@ def scriptAclCvs(acl_name, vlan, environment, network, user, template_name):
 
                 chdir(PATH_TYPES.TEMPLATE, network)
 
-                file_template = open(
-                    PREFIX_TEMPLATES + TEMPLATES.FE_APLICATIVOS + EXTENTION_FILE, "r")
-
-                content_template = file_template.read()
-
                 nova_acl = replace_template(
-                    acl_name, vlan, content_template, network)
+                    acl_name, vlan, PREFIX_TEMPLATES + TEMPLATES.FE_APLICATIVOS + EXTENTION_FILE, network)
 
                 chdir(PATH_TYPES.ACL, network, path_env)
 
                 arquivo.write("%s" % nova_acl)
                 arquivo.close()
-                file_template.close()
 
                 Cvs.commit(acl, "%s gerou Script para a acl %s" %
                            (user.user, acl))
@@ -475,19 +448,13 @@ def scriptAclCvs(acl_name, vlan, environment, network, user, template_name):
 
                 chdir(PATH_TYPES.TEMPLATE, network)
 
-                file_template = open(
-                    PREFIX_TEMPLATES + TEMPLATES.BEHO + EXTENTION_FILE, "r")
-
-                content_template = file_template.read()
-
                 nova_acl = replace_template(
-                    acl_name, vlan, content_template, network)
+                    acl_name, vlan, PREFIX_TEMPLATES + TEMPLATES.BEHO + EXTENTION_FILE, network)
 
                 chdir(PATH_TYPES.ACL, network, path_env)
 
                 arquivo.write("%s" % nova_acl)
                 arquivo.close()
-                file_template.close()
 
                 Cvs.commit(acl, "%s gerou Script para a acl %s" %
                            (user.user, acl))
@@ -542,22 +509,22 @@ def checkAclCvs(acl_file_name, environment, network, user):
         raise CVSCommandError(e)
 
 
-def replace_template(acl_name, vlan, content_template, network):
+def replace_template(acl_name, vlan, template_name, network):
+    '''Generates the acl from the template file, compiled once while the file is not modified.'''
 
     network, block, wmasc, special_1, special_2 = parse_template(vlan, network)
 
-    acl = content_template.replace('%ACL', acl_name)
-    acl = acl.replace('%NUMERO', "%s" % (vlan["num_vlan"]))
+    variables = {'%ACL': acl_name, '%NUMERO': "%s" % (vlan["num_vlan"])}
 
     if network is not None and block is not None and wmasc is not None and special_1 is not None and special_2 is not None:
 
-        acl = acl.replace('%REDE', network)
-        acl = acl.replace('%BLOCO', block)
-        acl = acl.replace('%WMASC', wmasc)
-        acl = acl.replace('%ESPECIAL1', special_1)
-        acl = acl.replace('%ESPECIAL2', special_2)
+        variables['%REDE'] = network
+        variables['%BLOCO'] = block
+        variables['%WMASC'] = wmasc
+        variables['%ESPECIAL1'] = special_1
+        variables['%ESPECIAL2'] = special_2
 
-    return acl
+    return render_file(template_name, variables)
 
 
 def parse_template(vlan, network):
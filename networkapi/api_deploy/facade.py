@@ -26,11 +26,16 @@ from networkapi.log import Log
 from networkapi.extra_logging import local, NO_REQUEST_ID
 from networkapi.plugins.factory import PluginFactory
 
-from networkapi.settings import TFTPBOOT_FILES_PATH, TFTP_SERVER_ADDR, CONFIG_FILES_PATH, CONFIG_FILES_REL_PATH
+from networkapi.settings import TFTPBOOT_FILES_PATH, TFTP_SERVER_ADDR, CONFIG_FILES_PATH, CONFIG_FILES_REL_PATH, \
+	DEPLOY_PARALLELISM
+
+from django.db import connection
 
 import os
 import paramiko
+import Queue
 import sys
+import threading
 import time
 import re
 import pkgutil 
@@ -61,8 +66,13 @@ def __applyConfig(equipment,filename, equipment_access=None,source_server=None,p
 	
 	equip_plugin = PluginFactory.factory(equipment)
 	equip_plugin.connect()
-	equip_plugin.ensure_privilege_level()
-	equip_output = equip_plugin.copyScriptFileToConfig(filename)
+	try:
+		equip_plugin.ensure_privilege_level()
+		equip_output = equip_plugin.copyScriptFileToConfig(filename)
+	except Exception:
+		#state of the shell is not known, it can not be reused
+		equip_plugin.close(reuse=False)
+		raise
 	equip_plugin.close()
 
 	return equip_output
@@ -135,3 +145,105 @@ def deploy_config_in_equipment_synchronous(rel_filename, equipment, lockvar, tft
 
 	with distributedlock(lockvar):
 		return __applyConfig(equipment, rel_filename, equipment_access, tftpserver)
+
+DEPLOY_FAIL_FAST = "fail_fast"
+DEPLOY_BEST_EFFORT = "best_effort"
+
+def deploy_config_in_equipments(deploys, parallelism=None, policy=DEPLOY_FAIL_FAST, deploy_function=None):
+	'''Apply configuration files on many equipments at the same time
+
+	Deploys with the same lock variable are applied one after the other, by the
+	same thread, and each one takes its lock as deploy_config_in_equipment_synchronous does.
+
+	Args:
+		deploys: list of (equipment, rel_filename, lockvar), equipment as in deploy_config_in_equipment_synchronous
+		parallelism: number of equipments configured at the same time, DEPLOY_PARALLELISM when None
+		policy: DEPLOY_FAIL_FAST to start no other deploy after an error and raise it,
+			DEPLOY_BEST_EFFORT to apply all files and report the errors in the result
+		deploy_function: function(rel_filename, equipment, lockvar) that applies a file,
+			deploy_config_in_equipment_synchronous when None. Tests may pass fake devices
+
+	Returns:
+		dict with one entry per equipment id (or equipment, if given as id):
+		{"output": equipment output or error, "status": "OK", "ERROR" or "SKIPPED", "time": seconds}
+
+	Raises:
+		in DEPLOY_FAIL_FAST, the first error of a deploy, after the running deploys finish
+	'''
+
+	if deploy_function is None:
+		deploy_function = deploy_config_in_equipment_synchronous
+	if parallelism is None:
+		parallelism = DEPLOY_PARALLELISM
+
+	#group deploys by lock, keeping order
+	groups = []
+	group_of_lock = dict()
+	for deploy in deploys:
+		lockvar = deploy[2]
+		if lockvar not in group_of_lock:
+			group_of_lock[lockvar] = []
+			groups.append(group_of_lock[lockvar])
+		group_of_lock[lockvar].append(deploy)
+
+	pending = Queue.Queue()
+	for group in groups:
+		pending.put(group)
+
+	results = dict()
+	errors = []
+	failed = threading.Event()
+	#request id and user of the logs
+	request_context = dict(local.__dict__)
+
+	def apply_group():
+		local.__dict__.update(request_context)
+		try:
+			while True:
+				try:
+					group = pending.get_nowait()
+				except Queue.Empty:
+					return
+				for equipment, rel_filename, lockvar in group:
+					key = getattr(equipment, "id", equipment)
+					if failed.isSet() and policy == DEPLOY_FAIL_FAST:
+						results[key] = {"output": "Not applied: another deploy failed.", "status": "SKIPPED", "time": 0}
+						continue
+					start = time.time()
+					try:
+						output = deploy_function(rel_filename, equipment, lockvar)
+						results[key] = {"output": output, "status": "OK", "time": time.time() - start}
+					except Exception, e:
+						log.error("Error applying file %s to equipment %s: %s" % (rel_filename, key, e))
+						results[key] = {"output": str(e), "status": "ERROR", "time": time.time() - start}
+						errors.append(sys.exc_info())
+						failed.set()
+		finally:
+			#each thread has its own database connection
+			connection.close()
+
+	threads = [threading.Thread(target=apply_group) for i in range(min(parallelism, len(groups)))]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	if errors and policy == DEPLOY_FAIL_FAST:
+		raise errors[0][0], errors[0][1], errors[0][2]
+
+	return results
+
+def deploy_config_in_equipment_job(user, rel_filename, equipment_id, lockvar):
+	'''Apply configuration file on equipment, run by the job workers (api_job)
+
+	Args:
+		rel_filename: relative file path from TFTPBOOT_FILES_PATH to apply in equipment
+		equipment_id: networkapi.equipamento.Equipamento().id
+		lockvar: distributed lock variable to use when applying config to equipment
+
+	Returns:
+		dict with equipment output and status
+	'''
+
+	output = deploy_config_in_equipment_synchronous(rel_filename, equipment_id, lockvar)
+	return {"output": output, "status": "OK"}
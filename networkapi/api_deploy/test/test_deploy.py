@@ -0,0 +1,159 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from unittest import TestCase
+
+from networkapi.api_deploy.facade import deploy_config_in_equipments, DEPLOY_FAIL_FAST, DEPLOY_BEST_EFFORT
+from networkapi.extra_logging import local
+
+
+class DeployError(Exception):
+    pass
+
+
+class FakeDevices(object):
+    """Applies files to fake equipments, recording the calls.
+
+    failures maps an equipment to the message of the error it raises and
+    waits maps an equipment to an event it waits for before applying the file.
+    """
+
+    def __init__(self, failures=None, waits=None):
+        self.failures = failures or {}
+        self.waits = waits or {}
+        self.started = dict()
+        self.calls = []
+        self.finished = []
+        self.active_locks = []
+        self.overlaps = []
+        self.request_ids = []
+        self.timeouts = []
+        self._mutex = threading.Lock()
+
+    def __call__(self, rel_filename, equipment, lockvar):
+        with self._mutex:
+            self.calls.append(equipment)
+            self.request_ids.append(getattr(local, 'request_id', None))
+            if lockvar in self.active_locks:
+                self.overlaps.append(lockvar)
+            self.active_locks.append(lockvar)
+        self.started.setdefault(equipment, threading.Event()).set()
+        try:
+            if equipment in self.waits and not self.waits[equipment].wait(5):
+                self.timeouts.append(equipment)
+            time.sleep(0.01)
+            if equipment in self.failures:
+                raise DeployError(self.failures[equipment])
+            return 'applied %s' % rel_filename
+        finally:
+            with self._mutex:
+                self.active_locks.remove(lockvar)
+                self.finished.append(equipment)
+
+    def event(self, equipment):
+        return self.started.setdefault(equipment, threading.Event())
+
+
+class DeployConfigInEquipmentsTestCase(TestCase):
+
+    def test_applies_every_file(self):
+        devices = FakeDevices()
+        deploys = [(1, 'file1', 'lock1'), (2, 'file2', 'lock2'), (3, 'file3', 'lock3')]
+
+        results = deploy_config_in_equipments(deploys, parallelism=2, deploy_function=devices)
+
+        self.assertEqual([1, 2, 3], sorted(results.keys()))
+        for equipment in (1, 2, 3):
+            self.assertEqual('OK', results[equipment]['status'])
+            self.assertEqual('applied file%s' % equipment, results[equipment]['output'])
+            self.assertTrue(results[equipment]['time'] > 0)
+
+    def test_result_key_is_the_equipment_id(self):
+        class Equipment(object):
+            def __init__(self, id):
+                self.id = id
+
+        devices = FakeDevices()
+        results = deploy_config_in_equipments([(Equipment(7), 'file7', 'lock7')], deploy_function=devices)
+
+        self.assertEqual(['applied file7'], [result['output'] for result in results.values()])
+        self.assertEqual([7], results.keys())
+
+    def test_fail_fast_skips_the_deploys_not_started(self):
+        devices = FakeDevices(failures={1: 'no route to equipment'})
+        deploys = [(1, 'file1', 'lock1'), (2, 'file2', 'lock1'), (3, 'file3', 'lock3'), (4, 'file4', 'lock4')]
+
+        with self.assertRaises(DeployError) as context:
+            deploy_config_in_equipments(deploys, parallelism=1, policy=DEPLOY_FAIL_FAST, deploy_function=devices)
+
+        self.assertEqual('no route to equipment', str(context.exception))
+        self.assertEqual([1], devices.calls)
+
+    def test_fail_fast_raises_after_the_running_deploys_finish(self):
+        devices = FakeDevices(failures={1: 'timeout'})
+        #equipment 2 is being configured when equipment 1 fails
+        devices.waits[2] = devices.event(1)
+        deploys = [(1, 'file1', 'lock1'), (2, 'file2', 'lock2')]
+
+        with self.assertRaises(DeployError):
+            deploy_config_in_equipments(deploys, parallelism=2, policy=DEPLOY_FAIL_FAST, deploy_function=devices)
+
+        self.assertEqual([1, 2], sorted(devices.finished))
+        self.assertEqual([], devices.timeouts)
+
+    def test_best_effort_applies_all_files_and_reports_errors(self):
+        devices = FakeDevices(failures={2: 'authentication failed'})
+        deploys = [(1, 'file1', 'lock1'), (2, 'file2', 'lock2'), (3, 'file3', 'lock2'), (4, 'file4', 'lock4')]
+
+        results = deploy_config_in_equipments(deploys, parallelism=1, policy=DEPLOY_BEST_EFFORT,
+                                              deploy_function=devices)
+
+        self.assertEqual([1, 2, 3, 4], devices.calls)
+        self.assertEqual({1: 'OK', 2: 'ERROR', 3: 'OK', 4: 'OK'},
+                         dict((equipment, result['status']) for equipment, result in results.items()))
+        self.assertEqual('authentication failed', results[2]['output'])
+
+    def test_shared_lock_deploys_run_in_order_one_at_a_time(self):
+        devices = FakeDevices()
+        #the deploy of lock2 only ends after the first deploy of lock1 starts
+        devices.waits[2] = devices.event(1)
+        deploys = [(1, 'file1', 'lock1'), (2, 'file2', 'lock2'), (3, 'file3', 'lock1'),
+                   (4, 'file4', 'lock1'), (5, 'file5', 'lock2')]
+
+        results = deploy_config_in_equipments(deploys, parallelism=4, deploy_function=devices)
+
+        self.assertEqual(['OK'] * 5, [result['status'] for result in results.values()])
+        self.assertEqual([], devices.overlaps)
+        self.assertEqual([1, 3, 4], [equipment for equipment in devices.calls if equipment in (1, 3, 4)])
+        self.assertEqual([2, 5], [equipment for equipment in devices.calls if equipment in (2, 5)])
+        self.assertEqual([], devices.timeouts)
+
+    def test_keeps_the_request_id(self):
+        devices = FakeDevices()
+        local.request_id = 'deploy-request'
+        try:
+            deploy_config_in_equipments([(1, 'file1', 'lock1'), (2, 'file2', 'lock2')],
+                                        parallelism=2, deploy_function=devices)
+        finally:
+            del local.request_id
+
+        self.assertEqual(['deploy-request', 'deploy-request'], devices.request_ids)
+
+    def test_no_deploys(self):
+        self.assertEqual({}, deploy_config_in_equipments([], deploy_function=FakeDevices()))
@@ -29,6 +29,7 @@ from networkapi.interface.models import InterfaceNotFoundError
 from networkapi.api_deploy.permissions import Read, Write, DeployConfig
 from networkapi.api_deploy import exceptions
 from networkapi.api_deploy import facade
+from networkapi.api_job import facade as job_facade
 from networkapi.distributedlock import LOCK_EQUIPMENT_DEPLOY_CONFIG_USERSCRIPT
 from networkapi.settings import USER_SCRIPTS_REL_PATH
 
@@ -45,6 +46,7 @@ def deploy_sync_copy_script_to_equipment(request, equipment_id):
     Default destination: apply config (running-config)
     Default protocol: tftp
     Receives script
+    With async=1 returns the id of the job that applies the script
     """
 
     try:
@@ -52,6 +54,13 @@ def deploy_sync_copy_script_to_equipment(request, equipment_id):
         script_file = facade.create_file_from_script(script, USER_SCRIPTS_REL_PATH)
         equipment_id = int(equipment_id)
         lockvar = LOCK_EQUIPMENT_DEPLOY_CONFIG_USERSCRIPT % (equipment_id)
+
+        if job_facade.is_async(request):
+            job = job_facade.submit_job(request.user, facade.deploy_config_in_equipment_job,
+                                        {"rel_filename": script_file, "equipment_id": equipment_id, "lockvar": lockvar},
+                                        lockvar)
+            return Response(job_facade.job_response_data(job), status=status.HTTP_202_ACCEPTED)
+
         data = dict()
         data["output"] = facade.deploy_config_in_equipment_synchronous(script_file, equipment_id, lockvar)
         data["status"] = "OK"
@@ -71,6 +80,7 @@ def deploy_sync_copy_script_to_multiple_equipments(request):
     Default destination: apply config (running-config)
     Default protocol: tftp
     Receives script
+    With async=1 returns the id of the job of each equipment
     """
 
     try:
@@ -85,6 +95,18 @@ def deploy_sync_copy_script_to_multiple_equipments(request):
         output_data = dict()
 
         script_file = facade.create_file_from_script(script, USER_SCRIPTS_REL_PATH)
+
+        if job_facade.is_async(request):
+            # One job per equipment: the equipments are configured in parallel by the workers
+            for id_equip in id_equips:
+                equipment_id = int(id_equip)
+                lockvar = LOCK_EQUIPMENT_DEPLOY_CONFIG_USERSCRIPT % (equipment_id)
+                job = job_facade.submit_job(request.user, facade.deploy_config_in_equipment_job,
+                                            {"rel_filename": script_file, "equipment_id": equipment_id, "lockvar": lockvar},
+                                            lockvar)
+                output_data[equipment_id] = job_facade.job_response_data(job)
+            return Response(output_data, status=status.HTTP_202_ACCEPTED)
+
         for id_equip in id_equips:
             equipment_id = int(id_equip)
             lockvar = LOCK_EQUIPMENT_DEPLOY_CONFIG_USERSCRIPT % (equipment_id)
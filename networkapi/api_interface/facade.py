@@ -31,7 +31,7 @@ from networkapi.util import is_valid_int_greater_zero_param
 from networkapi.api_interface import exceptions
 from networkapi.equipamento.models import Equipamento, EquipamentoRoteiro
 from networkapi.roteiro.models import TipoRoteiro
-from networkapi.api_deploy.facade import deploy_config_in_equipment_synchronous
+from networkapi.api_deploy.facade import deploy_config_in_equipment_synchronous, deploy_config_in_equipments
 
 SUPPORTED_EQUIPMENT_BRANDS = ["Cisco"]
 TEMPLATE_TYPE_INT = "interface_configuration"
@@ -84,12 +84,20 @@ def generate_and_deploy_channel_config_sync(user, id_channel):
         file_to_deploy = _generate_config_file(grouped_interfaces)
         files_to_deploy[equipment_id] = file_to_deploy
 
-    #TODO Deploy config file
-    #make separate threads
+    #deploy config files in all equipments at the same time
+    deploys = []
     for equipment_id in files_to_deploy.keys():
         lockvar = LOCK_INTERFACE_DEPLOY_CONFIG % (equipment_id)
         equipamento = Equipamento.get_by_pk(equipment_id)
-        status_deploy = deploy_config_in_equipment_synchronous(files_to_deploy[equipment_id], equipamento, lockvar)
+        deploys.append((equipamento, files_to_deploy[equipment_id], lockvar))
+
+    results = deploy_config_in_equipments(deploys)
+
+    #response keeps the output of the last equipment, as in the serial deploy
+    status_deploy = None
+    for equipment_id in files_to_deploy.keys():
+        log.info("Deploy in equipment %s took %.2fs" % (equipment_id, results[equipment_id]["time"]))
+        status_deploy = results[equipment_id]["output"]
 
     return status_deploy
 
@@ -0,0 +1,57 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from networkapi.api_interface import facade
+
+
+def _interface(equipment_id):
+    interface = Mock()
+    interface.equipamento.id = equipment_id
+    return interface
+
+
+class DeployChannelConfigTestCase(TestCase):
+
+    def setUp(self):
+        channel = Mock()
+        channel.list_interfaces.return_value = [_interface(1), _interface(2), _interface(1)]
+        patches = [
+            patch.object(facade.PortChannel, 'get_by_pk', return_value=channel),
+            patch.object(facade.Equipamento, 'get_by_pk', side_effect=lambda equipment_id: 'equipment%s' % equipment_id),
+            patch.object(facade, '_generate_config_file',
+                         side_effect=lambda interfaces: 'file%s' % interfaces[0].equipamento.id),
+            patch.object(facade, 'deploy_config_in_equipments',
+                         return_value={1: {'output': 'output1', 'status': 'OK', 'time': 1.0},
+                                       2: {'output': 'output2', 'status': 'OK', 'time': 2.0}}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_one_deploy_per_equipment(self):
+        facade.generate_and_deploy_channel_config_sync(None, 10)
+
+        deploys = facade.deploy_config_in_equipments.call_args[0][0]
+        self.assertEqual([('equipment1', 'file1', facade.LOCK_INTERFACE_DEPLOY_CONFIG % 1),
+                          ('equipment2', 'file2', facade.LOCK_INTERFACE_DEPLOY_CONFIG % 2)], sorted(deploys))
+
+    def test_response_is_the_output_of_the_last_equipment(self):
+        self.assertEqual('output2', facade.generate_and_deploy_channel_config_sync(None, 10))
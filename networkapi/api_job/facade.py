@@ -0,0 +1,122 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+import traceback
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.importlib import import_module
+
+from networkapi.api_job.models import Job, JOB_RUNNING, JOB_SUCCESS, JOB_ERROR, worker_name
+from networkapi.distributedlock import LockNotAcquiredError
+from networkapi.infrastructure import commit_hooks
+from networkapi.log import Log
+from networkapi.util import convert_string_or_int_to_boolean
+
+
+log = Log(__name__)
+
+
+def submit_job(user, function, params, lock=None):
+    """
+    Queues the function to be run by a worker and returns the job.
+
+    :param user: User that asked for the job, passed to the function.
+    :param function: Function defined at module level, called as function(user, **params).
+    :param params: Arguments of the function, must be serializable to JSON.
+    :param lock: LOCK_* key taken by the function. Jobs with the same key run one at a time.
+    """
+    path = '%s.%s' % (function.__module__, function.__name__)
+    return Job.submit(user, path, params, lock)
+
+
+def is_async(request):
+    """
+    Tells if the request asked, with the async parameter, to run as a job.
+    """
+    return convert_string_or_int_to_boolean(request.QUERY_PARAMS.get('async', False))
+
+
+def job_response_data(job):
+    """
+    Data of the response of a request run as a job.
+    """
+    return {'job': job.id, 'status': job.status}
+
+
+def _load_function(path):
+    module_name, function_name = path.rsplit('.', 1)
+    return getattr(import_module(module_name), function_name)
+
+
+def run_job(job):
+    """
+    Runs the job in the current process and saves its result. A job whose lock
+    is taken by a request goes back to the queue, up to JOB_MAX_ATTEMPTS times.
+    """
+    commit_hooks.start_batch()
+    try:
+        with transaction.commit_on_success():
+            result = _load_function(job.function)(job.user, **job.get_params())
+        commit_hooks.run_batch()
+        status = JOB_SUCCESS
+    except LockNotAcquiredError:
+        commit_hooks.discard_batch()
+        if job.attempts + 1 < settings.JOB_MAX_ATTEMPTS:
+            log.info(u'Lock %s of job %s is taken, job queued again.' % (job.lock, job.id))
+            job.retry(settings.JOB_POLL_INTERVAL * (job.attempts + 1))
+            return
+        result = {'error': u'Lock %s could not be acquired.' % job.lock}
+        status = JOB_ERROR
+    except Exception, e:
+        commit_hooks.discard_batch()
+        log.error(u'Job %s failed: %s' % (job.id, e))
+        result = {'error': unicode(getattr(e, 'detail', None) or e), 'traceback': traceback.format_exc()}
+        status = JOB_ERROR
+
+    job.finish(status, result)
+
+
+def work(should_stop=lambda: False):
+    """
+    Loop of a worker process: runs the pending jobs until should_stop returns True.
+    """
+    name = worker_name()
+    # The connection of the parent process can not be shared with it
+    connection.close()
+
+    while not should_stop():
+        with transaction.commit_on_success():
+            job = Job.claim(name)
+
+        if job is None:
+            time.sleep(settings.JOB_POLL_INTERVAL)
+            continue
+
+        log.info(u'Running job %s: %s.' % (job.id, job.function))
+        run_job(job)
+
+
+def fail_jobs_of_worker(name):
+    """
+    Marks as failed the jobs left running by a worker process that died.
+    """
+    Job.objects.filter(status=JOB_RUNNING, worker=name).update(
+        status=JOB_ERROR, result=json.dumps({'error': u'Worker %s died.' % name}), finished=datetime.now())
@@ -0,0 +1,95 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import signal
+import time
+import traceback
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from networkapi.api_job import facade
+from networkapi.api_job.models import worker_name
+
+
+class Command(BaseCommand):
+
+    help = 'Runs the queued jobs with a pool of worker processes.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers', type='int', dest='workers', default=None,
+                    help='Number of worker processes (default: JOB_WORKERS).'),
+    )
+
+    def handle(self, *args, **options):
+        workers = options.get('workers') or settings.JOB_WORKERS
+        self.stopping = False
+        self.children = set()
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Forked workers must open their own database connections
+        connection.close()
+
+        while not self.stopping:
+            while len(self.children) < workers and not self.stopping:
+                self.children.add(self.fork_worker())
+            try:
+                pid, _ = os.wait()
+            except OSError:
+                continue
+            if pid in self.children:
+                self.children.discard(pid)
+                facade.fail_jobs_of_worker(worker_name(pid))
+                connection.close()
+                if not self.stopping:
+                    # Avoids forking in a loop if the workers die on start
+                    time.sleep(1)
+
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        for pid in list(self.children):
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+
+    def fork_worker(self):
+        pid = os.fork()
+        if pid:
+            return pid
+
+        stop = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.append(signum))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        code = 0
+        try:
+            facade.work(lambda: bool(stop))
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        os._exit(code)
+
+    def stop(self, signum, frame):
+        self.stopping = True
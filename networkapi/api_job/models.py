@@ -0,0 +1,148 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import socket
+from datetime import datetime, timedelta
+
+from django.db import models
+from django.db.models import Q
+
+from networkapi.log import Log
+from networkapi.models.BaseModel import BaseModel
+from networkapi.usuario.models import Usuario
+
+
+JOB_PENDING = 'PENDING'
+JOB_RUNNING = 'RUNNING'
+JOB_SUCCESS = 'SUCCESS'
+JOB_ERROR = 'ERROR'
+
+
+class Job(BaseModel):
+
+    '''Long operation (equipment deploys, scripts) run by the jobworker processes
+    instead of the request that asked for it.
+
+    Jobs with the same lock, one of the LOCK_* keys of distributedlock, are not
+    run at the same time.
+    '''
+
+    id = models.AutoField(primary_key=True, db_column='id_job')
+    function = models.CharField(max_length=200)
+    params = models.TextField()
+    lock = models.CharField(max_length=200, null=True)
+    status = models.CharField(max_length=10, default=JOB_PENDING)
+    attempts = models.IntegerField(default=0)
+    result = models.TextField(null=True)
+    worker = models.CharField(max_length=100, null=True)
+    user = models.ForeignKey(Usuario, db_column='id_user')
+    created = models.DateTimeField()
+    started = models.DateTimeField(null=True)
+    run_after = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+
+    log = Log('Job')
+
+    class Meta(BaseModel.Meta):
+        db_table = u'jobs'
+        managed = True
+
+    @classmethod
+    def submit(cls, user, function, params, lock=None):
+        '''Creates a pending job.
+
+        @param user: User that asked for the job.
+        @param function: Dotted path of the function to run, called as function(user, **params).
+        @param params: Dict with the arguments of the function, saved as JSON.
+        @param lock: Lock key of the job.
+        '''
+        job = cls()
+        job.function = function
+        job.params = json.dumps(params)
+        job.lock = lock
+        job.status = JOB_PENDING
+        job.user = user
+        job.created = datetime.now()
+        job.save(user)
+        return job
+
+    @classmethod
+    def claim(cls, worker):
+        '''Marks the oldest pending job whose lock is free as running by the worker.
+
+        Must be called inside a transaction. The unfinished jobs of the lock of the
+        chosen job are read with SELECT ... FOR UPDATE, so a worker claiming a job of
+        the same lock waits for the commit and then sees it running.
+
+        @return: The job, or None if there is none to run.
+        '''
+        now = datetime.now()
+        busy_locks = cls.objects.filter(status=JOB_RUNNING, lock__isnull=False).values('lock')
+        pending = cls.objects.filter(Q(run_after=None) | Q(run_after__lte=now), status=JOB_PENDING) \
+            .exclude(lock__in=busy_locks)
+
+        while True:
+            candidate = pending.order_by('id').values_list('id', 'lock')[:1]
+            if not candidate:
+                return None
+            job_id, lock = candidate[0]
+
+            if lock is None:
+                jobs = cls.objects.select_for_update().filter(id=job_id)
+            else:
+                jobs = cls.objects.select_for_update().filter(lock=lock).exclude(status__in=(JOB_SUCCESS, JOB_ERROR))
+            statuses = dict(jobs.values_list('id', 'status'))
+
+            if statuses.get(job_id) == JOB_PENDING and JOB_RUNNING not in statuses.values():
+                cls.objects.filter(id=job_id).update(status=JOB_RUNNING, worker=worker, started=now)
+                return cls.objects.get(id=job_id)
+
+            # Claimed by another worker since the query, or its lock was taken
+            pending = pending.exclude(id=job_id)
+            if lock is not None:
+                pending = pending.exclude(lock=lock)
+
+    def get_params(self):
+        return json.loads(self.params)
+
+    def finish(self, status, result):
+        Job.objects.filter(id=self.id).update(status=status, result=json.dumps(result, default=unicode),
+                                              finished=datetime.now())
+
+    def retry(self, delay):
+        '''Puts the job back in the queue, to be run after delay seconds, when its lock is taken by a request.'''
+        Job.objects.filter(id=self.id).update(status=JOB_PENDING, attempts=self.attempts + 1, worker=None,
+                                              run_after=datetime.now() + timedelta(seconds=delay))
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'function': self.function,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': json.loads(self.result) if self.result is not None else None,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+def worker_name(pid=None):
+    '''Name of a worker process in the job table: host:pid, of the current process when pid is None.'''
+    return '%s:%d' % (socket.gethostname(), pid or os.getpid())
@@ -0,0 +1,126 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.test import TestCase
+from mock import patch
+
+from networkapi.api_job.facade import run_job, fail_jobs_of_worker
+from networkapi.api_job.models import Job, JOB_PENDING, JOB_RUNNING, JOB_SUCCESS, JOB_ERROR
+from networkapi.distributedlock import LockNotAcquiredError
+from networkapi.usuario.models import Usuario
+
+
+def echo(user, value):
+    return {'value': value}
+
+
+def lock_taken(user):
+    raise LockNotAcquiredError(None, u'Lock taken.')
+
+
+def fail(user):
+    raise ValueError(u'Failed.')
+
+
+class JobTestCase(TestCase):
+
+    def setUp(self):
+        # bulk_create, so the audit signals of BaseModel are not sent
+        Usuario.objects.bulk_create([Usuario(id=1, user='jobs', pwd='', nome='jobs', ativo=True, email='')])
+        self.user = Usuario.objects.get(id=1)
+
+    def _jobs(self, *locks, **fields):
+        now = datetime.now()
+        Job.objects.bulk_create([Job(function='networkapi.api_job.test.test_jobs.echo', params='{"value": 1}',
+                                     lock=lock, user=self.user, created=now, **fields) for lock in locks])
+        return list(Job.objects.order_by('-id')[:len(locks)])[::-1]
+
+    def test_claim_takes_the_oldest_pending_job(self):
+        first, second = self._jobs(None, None)
+        job = Job.claim('host:1')
+        self.assertEqual(first.id, job.id)
+        self.assertEqual(JOB_RUNNING, job.status)
+        self.assertEqual('host:1', job.worker)
+        self.assertEqual(second.id, Job.claim('host:2').id)
+        self.assertEqual(None, Job.claim('host:3'))
+
+    def test_claim_skips_the_jobs_of_running_locks(self):
+        self._jobs('vlan:1', status=JOB_RUNNING, worker='host:1')
+        self._jobs(*(['vlan:1'] * 30))
+        free, = self._jobs('vlan:2')
+        self.assertEqual(free.id, Job.claim('host:2').id)
+        self.assertEqual(None, Job.claim('host:3'))
+
+    def test_claim_runs_one_job_per_lock(self):
+        first, _, other = self._jobs('vlan:1', 'vlan:1', None)
+        self.assertEqual(first.id, Job.claim('host:1').id)
+        self.assertEqual(other.id, Job.claim('host:2').id)
+        self.assertEqual(None, Job.claim('host:3'))
+
+    def test_claim_skips_jobs_to_run_later(self):
+        self._jobs(None, run_after=datetime.now() + timedelta(hours=1))
+        due, = self._jobs(None, run_after=datetime.now() - timedelta(seconds=1))
+        self.assertEqual(due.id, Job.claim('host:1').id)
+        self.assertEqual(None, Job.claim('host:1'))
+
+    def test_run_job(self):
+        self._jobs(None)
+        run_job(Job.claim('host:1'))
+        job = Job.objects.get()
+        self.assertEqual(JOB_SUCCESS, job.status)
+        self.assertEqual({'value': 1}, job.as_dict()['result'])
+        self.assertNotEqual(None, job.finished)
+
+    def test_run_job_error(self):
+        self._jobs(None)
+        Job.objects.update(function='networkapi.api_job.test.test_jobs.fail', params='{}')
+        run_job(Job.claim('host:1'))
+        job = Job.objects.get()
+        self.assertEqual(JOB_ERROR, job.status)
+        self.assertEqual(u'Failed.', job.as_dict()['result']['error'])
+
+    def test_job_is_retried_while_its_lock_is_taken(self):
+        self._jobs('vlan:1')
+        Job.objects.update(function='networkapi.api_job.test.test_jobs.lock_taken', params='{}')
+        with patch.object(settings, 'JOB_MAX_ATTEMPTS', 2):
+            run_job(Job.claim('host:1'))
+            job = Job.objects.get()
+            self.assertEqual(JOB_PENDING, job.status)
+            self.assertEqual(1, job.attempts)
+            self.assertEqual(None, job.worker)
+            self.assertTrue(job.run_after > datetime.now())
+            self.assertEqual(None, Job.claim('host:1'))
+
+            Job.objects.update(run_after=datetime.now() - timedelta(seconds=1))
+            run_job(Job.claim('host:1'))
+            job = Job.objects.get()
+            self.assertEqual(JOB_ERROR, job.status)
+
+    def test_jobs_of_a_dead_worker_fail_and_free_their_locks(self):
+        self._jobs('vlan:1', status=JOB_RUNNING, worker='host:1')
+        self._jobs('vlan:2', status=JOB_RUNNING, worker='host:2')
+        waiting, = self._jobs('vlan:1')
+        self.assertEqual(None, Job.claim('host:3'))
+
+        fail_jobs_of_worker('host:1')
+
+        self.assertEqual([JOB_ERROR, JOB_RUNNING], list(Job.objects.filter(
+            status__in=(JOB_ERROR, JOB_RUNNING)).order_by('id').values_list('status', flat=True)))
+        self.assertEqual(waiting.id, Job.claim('host:3').id)
@@ -0,0 +1,46 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from networkapi.api_job import exceptions
+from networkapi.api_job.models import Job
+from networkapi.log import Log
+from networkapi.util import is_valid_int_greater_zero_param
+
+
+log = Log(__name__)
+
+
+@api_view(['GET'])
+@permission_classes((IsAuthenticated,))
+def job_status(request, job_id):
+    """
+    Returns the status of a job and, when it is finished, its result.
+    Only the user that submitted the job can see it.
+    """
+    if not is_valid_int_greater_zero_param(job_id):
+        raise exceptions.InvalidIdJobException()
+
+    try:
+        job = Job.objects.get(id=job_id, user=request.user)
+    except Job.DoesNotExist:
+        raise exceptions.JobDoesNotExistException()
+
+    return Response(job.as_dict())
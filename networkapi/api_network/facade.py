@@ -21,12 +21,12 @@ from networkapi.log import Log
 
 from networkapi.extra_logging import local, NO_REQUEST_ID
 from networkapi.ip.models import Ip, IpNotFoundError, IpEquipamento, Ipv6Equipament, Ipv6
-from networkapi.equipamento.models import EquipamentoRoteiro
+from networkapi.equipamento.models import Equipamento, EquipamentoRoteiro
 from networkapi.infrastructure import ipaddr
 from networkapi.api_network import exceptions
 from networkapi.settings import NETWORK_CONFIG_FILES_PATH,\
 							 NETWORK_CONFIG_TOAPPLY_REL_PATH, NETWORK_CONFIG_TEMPLATE_PATH
-from networkapi.api_deploy.facade import deploy_config_in_equipment_synchronous
+from networkapi.api_deploy.facade import deploy_config_in_equipments
 from networkapi.distributedlock import distributedlock,LOCK_VLAN, \
 								 LOCK_EQUIPMENT_DEPLOY_CONFIG_NETWORK_SCRIPT, LOCK_NETWORK_IPV4, LOCK_NETWORK_IPV6
 from networkapi.ip.models import NetworkIPv4, NetworkIPv6
@@ -60,14 +60,14 @@ def deploy_networkIPv4_configuration(user, networkipv4, equipment_list):
 
 			#load dict with all equipment attributes
 			dict_ips = get_dict_v4_to_use_in_configuration_deploy(user, networkipv4, equipment_list)
-			status_deploy = dict()
-			#TODO implement threads
+			deploys = []
 			for equipment in equipment_list:
 				#generate config file
 				file_to_deploy = _generate_config_file(dict_ips, equipment, TEMPLATE_NETWORKv4_ACTIVATE)
-				#deploy config file in equipments
 				lockvar = LOCK_EQUIPMENT_DEPLOY_CONFIG_NETWORK_SCRIPT % (equipment.id)
-				status_deploy[equipment.id] = deploy_config_in_equipment_synchronous(file_to_deploy, equipment, lockvar)
+				deploys.append((equipment, file_to_deploy, lockvar))
+			#deploy config files in all equipments at the same time
+			status_deploy = _deploy_outputs(deploy_config_in_equipments(deploys))
 			
 			networkipv4.activate(user)
 			transaction.commit()
@@ -97,14 +97,14 @@ def deploy_networkIPv6_configuration(user, networkipv6, equipment_list):
 
 			#load dict with all equipment attributes
 			dict_ips = get_dict_v6_to_use_in_configuration_deploy(user, networkipv6, equipment_list)
-			status_deploy = dict()
-			#TODO implement threads
+			deploys = []
 			for equipment in equipment_list:
 				#generate config file
 				file_to_deploy = _generate_config_file(dict_ips, equipment, TEMPLATE_NETWORKv6_ACTIVATE)
-				#deploy config file in equipments
 				lockvar = LOCK_EQUIPMENT_DEPLOY_CONFIG_NETWORK_SCRIPT % (equipment.id)
-				status_deploy[equipment.id] = deploy_config_in_equipment_synchronous(file_to_deploy, equipment, lockvar)
+				deploys.append((equipment, file_to_deploy, lockvar))
+			#deploy config files in all equipments at the same time
+			status_deploy = _deploy_outputs(deploy_config_in_equipments(deploys))
 			
 			networkipv6.activate(user)
 			transaction.commit()
@@ -134,14 +134,14 @@ def remove_deploy_networkIPv4_configuration(user, networkipv4, equipment_list):
 
 			#load dict with all equipment attributes
 			dict_ips = get_dict_v4_to_use_in_configuration_deploy(user, networkipv4, equipment_list)
-			status_deploy = dict()
-			#TODO implement threads
+			deploys = []
 			for equipment in equipment_list:
 				#generate config file
 				file_to_deploy = _generate_config_file(dict_ips, equipment, TEMPLATE_NETWORKv4_DEACTIVATE)
-				#deploy config file in equipments
 				lockvar = LOCK_EQUIPMENT_DEPLOY_CONFIG_NETWORK_SCRIPT % (equipment.id)
-				status_deploy[equipment.id] = deploy_config_in_equipment_synchronous(file_to_deploy, equipment, lockvar)
+				deploys.append((equipment, file_to_deploy, lockvar))
+			#deploy config files in all equipments at the same time
+			status_deploy = _deploy_outputs(deploy_config_in_equipments(deploys))
 			networkipv4.deactivate(user)
 			transaction.commit()
 			if networkipv4.vlan.ativada == 1:
@@ -176,14 +176,14 @@ def remove_deploy_networkIPv6_configuration(user, networkipv6, equipment_list):
 
 			#load dict with all equipment attributes
 			dict_ips = get_dict_v6_to_use_in_configuration_deploy(user, networkipv6, equipment_list)
-			status_deploy = dict()
-			#TODO implement threads
+			deploys = []
 			for equipment in equipment_list:
 				#generate config file
 				file_to_deploy = _generate_config_file(dict_ips, equipment, TEMPLATE_NETWORKv6_DEACTIVATE)
-				#deploy config file in equipments
 				lockvar = LOCK_EQUIPMENT_DEPLOY_CONFIG_NETWORK_SCRIPT % (equipment.id)
-				status_deploy[equipment.id] = deploy_config_in_equipment_synchronous(file_to_deploy, equipment, lockvar)
+				deploys.append((equipment, file_to_deploy, lockvar))
+			#deploy config files in all equipments at the same time
+			status_deploy = _deploy_outputs(deploy_config_in_equipments(deploys))
 			
 			networkipv6.deactivate(user)
 			transaction.commit()
@@ -198,6 +198,36 @@ def remove_deploy_networkIPv6_configuration(user, networkipv6, equipment_list):
 
 			return status_deploy
 
+def _deploy_outputs(results):
+	'''Output of each equipment in the results of deploy_config_in_equipments, logging the deploy times'''
+
+	for equipment_id, result in results.items():
+		log.info("Deploy in equipment %s took %.2fs" % (equipment_id, result["time"]))
+	return dict((equipment_id, result["output"]) for equipment_id, result in results.items())
+
+def deploy_network_job(user, version, network_id, equipment_ids, remove=False):
+	'''Deploys or removes the configuration of a network, run by the job workers (api_job).
+
+	Args: version: 4 or 6
+	network_id: id of the NetworkIPv4 or NetworkIPv6
+	equipment_ids: ids of the equipments to configure
+	remove: True to remove the configuration
+
+	Returns: List with status of equipments output
+	'''
+
+	equipment_list = Equipamento.objects.filter(id__in=equipment_ids)
+	if version == 4:
+		network = NetworkIPv4.get_by_pk(network_id)
+		if remove:
+			return remove_deploy_networkIPv4_configuration(user, network, equipment_list)
+		return deploy_networkIPv4_configuration(user, network, equipment_list)
+
+	network = NetworkIPv6.get_by_pk(network_id)
+	if remove:
+		return remove_deploy_networkIPv6_configuration(user, network, equipment_list)
+	return deploy_networkIPv6_configuration(user, network, equipment_list)
+
 def _generate_config_file(dict_ips, equipment, template_type):
 	'''Load a template and write a file with the rended output
 
@@ -456,7 +486,12 @@ def _load_template_file(equipment, template_type):
 def _remove_svi(equipment, vlan_num):
 	equip_plugin = PluginFactory.factory(equipment)
 	equip_plugin.connect()
-	output = equip_plugin.remove_svi(vlan_num)
+	try:
+		output = equip_plugin.remove_svi(vlan_num)
+	except Exception:
+		#state of the shell is not known, it can not be reused
+		equip_plugin.close(reuse=False)
+		raise
 	equip_plugin.close()
 
 	return output
@@ -28,6 +28,8 @@ from networkapi.api_rest import exceptions as api_exceptions
 from networkapi.admin_permission import AdminPermission
 
 from networkapi.api_network import facade
+from networkapi.api_job import facade as job_facade
+from networkapi.distributedlock import LOCK_NETWORK_IPV4, LOCK_NETWORK_IPV6
 from networkapi.api_network.permissions import Read, Write, DeployConfig
 from networkapi.api_network.serializers import NetworkIPv4Serializer, NetworkIPv6Serializer
 from networkapi.api_network import exceptions
@@ -75,6 +77,7 @@ def networkIPv4_deploy(request, network_id):
 
     Receives optional parameter equipments to specify what equipment should
     receive network configuration
+    With async=1 returns the id of the job that deploys the configuration
     '''
 
     networkipv4 = NetworkIPv4.get_by_pk(int(network_id))
@@ -118,6 +121,14 @@ def networkIPv4_deploy(request, network_id):
             raise APIException.PermissionDenied("No permission to configure equipment %s-%s " % (equip.id, equip.nome) )
 
     #deploy network configuration
+    if job_facade.is_async(request):
+        job = job_facade.submit_job(request.user, facade.deploy_network_job,
+                                    {"version": 4, "network_id": networkipv4.id,
+                                     "equipment_ids": [equip.id for equip in equipment_list],
+                                     "remove": request.method == 'DELETE'},
+                                    LOCK_NETWORK_IPV4 % networkipv4.id)
+        return Response(job_facade.job_response_data(job), status=status.HTTP_202_ACCEPTED)
+
     if request.method == 'POST':
         returned_data = facade.deploy_networkIPv4_configuration(request.user, networkipv4, equipment_list)
     elif request.method == 'DELETE':
@@ -163,6 +174,7 @@ def networkIPv6_deploy(request, network_id):
 
     Receives optional parameter equipments to specify what equipment should
     receive network configuration
+    With async=1 returns the id of the job that deploys the configuration
     '''
 
     networkipv6 = NetworkIPv6.get_by_pk(int(network_id))
@@ -206,6 +218,14 @@ def networkIPv6_deploy(request, network_id):
             raise APIException.PermissionDenied("No permission to configure equipment %s-%s " % (equip.id, equip.nome) )
 
     #deploy network configuration
+    if job_facade.is_async(request):
+        job = job_facade.submit_job(request.user, facade.deploy_network_job,
+                                    {"version": 6, "network_id": networkipv6.id,
+                                     "equipment_ids": [equip.id for equip in equipment_list],
+                                     "remove": request.method == 'DELETE'},
+                                    LOCK_NETWORK_IPV6 % networkipv6.id)
+        return Response(job_facade.job_response_data(job), status=status.HTTP_202_ACCEPTED)
+
     if request.method == 'POST':
         returned_data = facade.deploy_networkIPv6_configuration(request.user, networkipv6, equipment_list)
     elif request.method == 'DELETE':
@@ -15,7 +15,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+
+from multiprocessing.pool import ThreadPool
+
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from django.db import transaction
 
@@ -23,6 +28,7 @@ from networkapi.ambiente.models import Ambiente
 from networkapi.api_pools import exceptions
 from networkapi.api_pools.models import OptionPool, OptionPoolEnvironment
 from networkapi.healthcheckexpect.models import Healthcheck
+from networkapi.infrastructure import commit_hooks
 from networkapi.infrastructure.script_utils import exec_script, ScriptError
 from networkapi.ip.models import Ip, Ipv6
 from networkapi.requisicaovips.models import ServerPoolMember, ServerPool
@@ -33,6 +39,9 @@ from networkapi.log import Log
 
 log = Log(__name__)
 
+# Status of the members of a pool, as returned by the check script: {member id: status}
+POOL_MEMBER_STATUS_KEY = 'pool_member_status:%s'
+
 #Todo
 #Not to be used alone like this
 #User has to specifically choose an existing healthcheck in order to use the same healthcheck
@@ -308,6 +317,8 @@ def save_server_pool_member(user, sp, list_server_pool_member):
                 transaction.commit()
                 raise exceptions.ScriptAlterPriorityPoolMembersException()
 
+    invalidate_poolmember_status([sp.id])
+
     return list_pool_member
 
 
@@ -315,7 +326,7 @@ def exec_script_check_poolmember_by_pool(pool_id):
 
     #execute script check status real
     command = settings.POOL_REAL_CHECK_BY_POOL % (pool_id)
-    status_code, stdout, stderr = exec_script(command)
+    status_code, stdout, stderr = exec_script(command, settings.POOL_MEMBER_STATUS_TIMEOUT)
 
     if status_code != 0:
         raise exceptions.ScriptCheckStatusPoolMemberException()
@@ -323,6 +334,80 @@ def exec_script_check_poolmember_by_pool(pool_id):
     return stdout
 
 
+def _check_poolmember_status(pool_id):
+    try:
+        script_out = json.loads(exec_script_check_poolmember_by_pool(pool_id))
+        return dict((str(member_id), member_status)
+                    for member_id, member_status in script_out[str(pool_id)].iteritems())
+    except Exception, exception:
+        log.error(u'Failed to check status of members of pool %s: %s' % (pool_id, exception))
+        return None
+
+
+def check_poolmember_status_by_pools(pool_ids):
+    """
+    Returns the status of the members of the pools: {pool id: {member id: status}}.
+
+    Each pool is checked by one script call, the pools not in cache are checked
+    concurrently and each call is killed after POOL_MEMBER_STATUS_TIMEOUT. The
+    results stay in cache for POOL_MEMBER_STATUS_CACHE_TIME.
+
+    :param pool_ids: Ids of the pools.
+
+    :raise ScriptCheckStatusPoolMemberException: The status of a pool could not be checked.
+    """
+    pool_ids = list(set(int(pool_id) for pool_id in pool_ids))
+    keys = dict((POOL_MEMBER_STATUS_KEY % pool_id, pool_id) for pool_id in pool_ids)
+    found = dict((keys[key], statuses) for key, statuses in cache.get_many(keys.keys()).iteritems())
+
+    not_cached = [pool_id for pool_id in pool_ids if pool_id not in found]
+    if len(not_cached) > 1:
+        pool = ThreadPool(min(settings.POOL_MEMBER_STATUS_WORKERS, len(not_cached)))
+        try:
+            checked = pool.map(_check_poolmember_status, not_cached)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        checked = [_check_poolmember_status(pool_id) for pool_id in not_cached]
+
+    checked = dict((pool_id, statuses) for pool_id, statuses in zip(not_cached, checked) if statuses is not None)
+    if checked:
+        cache.set_many(dict((POOL_MEMBER_STATUS_KEY % pool_id, statuses) for pool_id, statuses in checked.iteritems()),
+                       settings.POOL_MEMBER_STATUS_CACHE_TIME)
+    found.update(checked)
+
+    if len(found) < len(pool_ids):
+        raise exceptions.ScriptCheckStatusPoolMemberException()
+
+    return found
+
+
+def invalidate_poolmember_status(pool_ids):
+    """
+    Removes the cached status of the members of the pools, after their members are
+    changed, enabled or disabled. Removed now and again at the end of the transaction,
+    on commit and on rollback, so a concurrent check does not keep the old status in cache.
+
+    :param pool_ids: Ids of the pools.
+    """
+    keys = [POOL_MEMBER_STATUS_KEY % pool_id for pool_id in set(int(pool_id) for pool_id in pool_ids)]
+    if keys:
+        cache.delete_many(keys)
+        commit_hooks.on_transaction_end(lambda: cache.delete_many(keys))
+
+
+def get_cached_poolmember_status(pool_member):
+    """
+    Returns the last checked status of the pool member, without calling the
+    check script: the one in cache or, when there is none, the one saved in database.
+    """
+    statuses = cache.get(POOL_MEMBER_STATUS_KEY % pool_member.server_pool_id)
+    if statuses is not None and str(pool_member.id) in statuses:
+        return statuses[str(pool_member.id)]
+    return pool_member.member_status
+
+
 def manager_pools(request):
     """
     Manager Status Pool Members Enable/Disabled By Pool
@@ -331,6 +416,8 @@ def manager_pools(request):
 
     """
 
+    pool_id = None
+
     try:
         pool_id = request.DATA.get("server_pool_id")
         pool_members = request.DATA.get("server_pool_members", [])
@@ -385,6 +472,11 @@ def manager_pools(request):
 
         raise exception
 
+    finally:
+        # The status of the members may have changed even when the script failed
+        if is_valid_int_greater_zero_param(pool_id):
+            invalidate_poolmember_status([pool_id])
+
 
 def save_option_pool(user, type, description):
 
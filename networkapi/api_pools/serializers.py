@@ -17,13 +17,12 @@
 
 from rest_framework import serializers
 from networkapi.ambiente.models import Ambiente
-from networkapi.infrastructure.script_utils import exec_script
+from networkapi.api_pools.facade import get_cached_poolmember_status
 from networkapi.ip.models import Ip, Ipv6
 from networkapi.requisicaovips.models import ServerPool, ServerPoolMember, VipPortToPool
 from networkapi.healthcheckexpect.models import Healthcheck
 from networkapi.equipamento.models import Equipamento
 from networkapi.api_pools.models import OpcaoPoolAmbiente, OpcaoPool, OptionPool, OptionPoolEnvironment
-from networkapi.settings import POOL_REAL_CHECK
 
 class HealthcheckSerializer(serializers.ModelSerializer):
     class Meta:
@@ -79,8 +78,6 @@ class Ipv6Serializer(serializers.ModelSerializer):
 
 class ServerPoolMemberSerializer(serializers.ModelSerializer):
 
-    #pool_enabled = serializers.SerializerMethodField('check_pool_member_enabled')
-
     equipment_name = serializers.SerializerMethodField('get_name_equipment')
     last_status_update_formated = serializers.Field(source='last_status_update_formated')
 
@@ -105,18 +102,6 @@ class ServerPoolMemberSerializer(serializers.ModelSerializer):
                   'equipment_name',
                   )
 
-    def check_pool_member_enabled(self, obj):
-
-        command = POOL_REAL_CHECK % (obj.server_pool.id, obj.ip.id, obj.port_real)
-
-
-        code, _, _ = exec_script(command)
-
-        if code == 0:
-            return True
-
-        return False
-
     def get_name_equipment(self, obj):
 
         ipv4 = obj.ip
@@ -248,8 +233,5 @@ class ServerPoolMemberStatusSerializer(serializers.ModelSerializer):
 
     def check_pool_member_status(self, obj):
 
-        command = POOL_REAL_CHECK % (obj.server_pool.id, obj.ip.id, obj.port_real)
-
-        code, _, _ = exec_script(command)
-
-        return code
\ No newline at end of file
+        # Only the status checked by pool is read, the check script is not run per member
+        return get_cached_poolmember_status(obj)
@@ -32,16 +32,16 @@ from networkapi.api_pools.facade import get_or_create_healthcheck, save_server_p
     prepare_to_save_reals, manager_pools, save_option_pool, update_option_pool, save_environment_option_pool, \
     update_environment_option_pool, delete_environment_option_pool, delete_option_pool
 from networkapi.error_message_utils import error_messages
-from networkapi.ip.models import IpEquipamento, Ip, Ipv6
+from networkapi.ip.models import IpEquipamento, Ip, Ipv6, get_network_index
 from networkapi.equipamento.models import Equipamento
-from networkapi.api_pools.facade import exec_script_check_poolmember_by_pool
+from networkapi.api_pools.facade import check_poolmember_status_by_pools, invalidate_poolmember_status
 from networkapi.requisicaovips.models import ServerPool, ServerPoolMember, \
     VipPortToPool
 from networkapi.api_pools.serializers import ServerPoolSerializer, HealthcheckSerializer, \
     ServerPoolMemberSerializer, ServerPoolDatatableSerializer, EquipamentoSerializer, OpcaoPoolAmbienteSerializer, \
     VipPortToPoolSerializer, PoolSerializer, AmbienteSerializer, OptionPoolSerializer, OptionPoolEnvironmentSerializer
 from networkapi.healthcheckexpect.models import Healthcheck
-from networkapi.ambiente.models import Ambiente, EnvironmentVip, EnvironmentEnvironmentVip
+from networkapi.ambiente.models import Ambiente, EnvironmentVip, EnvironmentEnvironmentVip, IP_VERSION
 from networkapi.infrastructure.datatable import build_query_to_datatable
 from networkapi.api_rest import exceptions as api_exceptions
 from networkapi.util import is_valid_list_int_greater_zero_param, is_valid_int_greater_zero_param, \
@@ -188,14 +188,13 @@ def list_all_members_by_pool(request, id_server_pool):
             checkstatus = True
 
         if total > 0 and checkstatus:
-            stdout = exec_script_check_poolmember_by_pool(id_server_pool)
-            script_out = json.loads(stdout)
+            members_status = check_poolmember_status_by_pools([id_server_pool])[int(id_server_pool)]
 
-            if id_server_pool not in script_out.keys() or len(script_out[id_server_pool]) != total:
+            if len(members_status) != total:
                 raise exceptions.ScriptCheckStatusPoolMemberException(detail="Script did not return as expected.")
 
             for pm in query_pools:
-                member_checked_status = script_out[id_server_pool][str(pm.id)]
+                member_checked_status = members_status.get(str(pm.id))
                 if member_checked_status not in range(0, 8):
                     raise exceptions.ScriptCheckStatusPoolMemberException(
                         detail="Status script did not return as expected.")
@@ -489,6 +488,8 @@ def enable(request):
 	Create Pools by list id running script and update to created.
 	"""
 
+    pool_ids = []
+
     try:
 
         ids = request.DATA.get('ids')
@@ -506,6 +507,8 @@ def enable(request):
             id_ip = ipv4 and ipv4.id or ipv6 and ipv6.id
             port_ip = server_pool_member.port_real
 
+            pool_ids.append(id_pool)
+
             command = settings.POOL_REAL_ENABLE % (id_pool, id_ip, port_ip)
 
             code, _, _ = exec_script(command)
@@ -535,6 +538,9 @@ def enable(request):
         log.error(exception)
         raise api_exceptions.NetworkAPIException()
 
+    finally:
+        invalidate_poolmember_status(pool_ids)
+
 
 @api_view(['POST'])
 @permission_classes((IsAuthenticated, ScriptAlterPermission))
@@ -544,6 +550,8 @@ def disable(request):
 	Create Pools by list id running script and update to created.
 	"""
 
+    pool_ids = []
+
     try:
 
         ids = request.DATA.get('ids')
@@ -561,6 +569,8 @@ def disable(request):
             id_ip = ipv4 and ipv4.id or ipv6 and ipv6.id
             port_ip = server_pool_member.port_real
 
+            pool_ids.append(id_pool)
+
             command = settings.POOL_REAL_DISABLE % (id_pool, id_ip, port_ip)
 
             code, _, _ = exec_script(command)
@@ -590,6 +600,9 @@ def disable(request):
         log.error(exception)
         raise api_exceptions.NetworkAPIException()
 
+    finally:
+        invalidate_poolmember_status(pool_ids)
+
 
 @api_view(['GET', 'POST'])
 @permission_classes((IsAuthenticated, Read))
@@ -991,9 +1004,9 @@ def chk_status_poolmembers_by_pool(request, pool_id):
 
         pool_obj = ServerPool.objects.get(id=pool_id)
 
-        stdout = exec_script_check_poolmember_by_pool(pool_obj.id)
+        members_status = check_poolmember_status_by_pools([pool_obj.id])[pool_obj.id]
 
-        data = json.loads(stdout)
+        data = {str(pool_obj.id): members_status}
 
         return Response(data)
 
@@ -1027,9 +1040,12 @@ def chk_status_poolmembers_by_vip(request, vip_id):
         if len(list_pools) is 0:
             raise exceptions.PoolMemberDoesNotExistException()
 
+        # All the pools of the VIP are checked at once
+        pools_status = check_poolmember_status_by_pools([obj_pool.id for obj_pool in list_pools])
+
         list_result = []
         for obj_pool in list_pools:
-            list_sts_poolmembers = exec_script_check_poolmember_by_pool(obj_pool.id)
+            list_sts_poolmembers = json.dumps({str(obj_pool.id): pools_status[obj_pool.id]})
             list_result.append({obj_pool.id: list_sts_poolmembers})
 
         return Response(list_result)
@@ -1451,19 +1467,23 @@ def _get_available_ips_to_add_server_pool(equip_name, id_ambiente):
     environment_vip_list = EnvironmentVip.get_environment_vips_by_environment_id(id_ambiente)
     environment_list_related = EnvironmentEnvironmentVip.get_environment_list_by_environment_vip_list(environment_vip_list)
 
+    environment_ids = set(environment.id for environment in environment_list_related)
+
     # # Get all IPV4's Equipment
-    for environment in environment_list_related:
-        for ipequip in equip.ipequipamento_set.select_related().all():
-            network_ipv4 = ipequip.ip.networkipv4
-            if network_ipv4.vlan.ambiente == environment:
-                lista_ips_equip.add(ipequip.ip)
+    ips = Ip.objects.filter(ipequipamento__equipamento=equip).select_related('networkipv4')
+    networks = get_network_index(IP_VERSION.IPv4[0]).get_many([ip.networkipv4_id for ip in ips])
+    for ip in ips:
+        network = networks.get(ip.networkipv4_id)
+        if network is not None and network.environment_id in environment_ids:
+            lista_ips_equip.add(ip)
 
     # # Get all IPV6's Equipment
-    for environment in environment_list_related:
-        for ipequip in equip.ipv6equipament_set.select_related().all():
-            network_ipv6 = ipequip.ip.networkipv6
-            if network_ipv6.vlan.ambiente == environment:
-                lista_ipsv6_equip.add(ipequip.ip)
+    ips = Ipv6.objects.filter(ipv6equipament__equipamento=equip).select_related('networkipv6')
+    networks = get_network_index(IP_VERSION.IPv6[0]).get_many([ip.networkipv6_id for ip in ips])
+    for ip in ips:
+        network = networks.get(ip.networkipv6_id)
+        if network is not None and network.environment_id in environment_ids:
+            lista_ipsv6_equip.add(ip)
 
     return lista_ips_equip, lista_ipsv6_equip
 
@@ -1495,18 +1515,23 @@ def reals_can_associate_server_pool(server_pool, list_server_pool_member):
 
         environment_list_related = EnvironmentEnvironmentVip.get_environment_list_by_environment_vip_list(environment_vip_list)
 
+        environment_ids = set(environment.id for environment in environment_list_related)
+
         ipv4_list, ipv6_list = _get_server_pool_member_ipv4_ipv6(list_server_pool_member)
 
+        networks = get_network_index(IP_VERSION.IPv4[0]).get_many([ipv4.networkipv4_id for ipv4 in ipv4_list])
         for ipv4 in ipv4_list:
-            environment = Ambiente.objects.filter(vlan__networkipv4__ip=ipv4).uniqueResult()
-            if environment not in environment_list_related:
+            network = networks.get(ipv4.networkipv4_id)
+            if network is None or network.environment_id not in environment_ids:
+                environment = Ambiente.objects.filter(vlan__networkipv4__ip=ipv4).uniqueResult()
                 raise api_exceptions.EnvironmentEnvironmentVipNotBoundedException(
                     error_messages.get(396) % (environment.name, ipv4.ip_formated, environment_vip_list_name)
                 )
 
+        networks = get_network_index(IP_VERSION.IPv6[0]).get_many([ipv6.networkipv6_id for ipv6 in ipv6_list])
         for ipv6 in ipv6_list:
-            environment = Ambiente.objects.filter(vlan__networkipv6__ipv6=ipv6).uniqueResult()
-            if environment not in environment_list_related:
+            network = networks.get(ipv6.networkipv6_id)
+            if network is None or network.environment_id not in environment_ids:
                 raise api_exceptions.EnvironmentEnvironmentVipNotBoundedException(
                     error_messages.get(396) % (server_pool.environment.name, ipv6.ip_formated, environment_vip_list_name)
                 )
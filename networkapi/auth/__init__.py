@@ -16,14 +16,22 @@
 # limitations under the License.
 
 
-from networkapi.usuario.models import Usuario
+import time
 
-from networkapi.grupo.models import PermissaoAdministrativa, UGrupo, DireitosGrupoEquipamento, EGrupo, EGrupoNotFoundError, PermissaoAdministrativaNotFoundError, GrupoError
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
 
-from networkapi.equipamento.models import Equipamento, EquipamentoNotFoundError
+from networkapi.usuario.models import Usuario, UsuarioGrupo
+
+from networkapi.grupo.models import PermissaoAdministrativa, Permission, UGrupo, DireitosGrupoEquipamento, EGrupo, EGrupoNotFoundError, PermissaoAdministrativaNotFoundError, GrupoError
+
+from networkapi.equipamento.models import Equipamento, EquipamentoGrupo, EquipamentoNotFoundError
 
 from networkapi.admin_permission import AdminPermission
 
+from networkapi.infrastructure import commit_hooks
+
 
 def authenticate(username, password, user_ldap=None):
     '''Busca o usuário com ativo com o login e senha informados.
@@ -41,6 +49,9 @@ def authenticate(username, password, user_ldap=None):
 
 def has_perm(user, perm_function, perm_oper, egroup_id=None, equip_id=None, equip_oper=None):
     '''
+    As permissões do usuário são lidas da matriz de permissões (ver get_perm_matrix), que fica em
+    memória e no memcached, então com o cache quente nenhuma query é feita.
+
     @raise EGrupoNotFoundError: Grupo do equipamento nao cadastrado.
 
     @raise EquipamentoNotFoundError: Equipamento nao cadastrado.
@@ -54,31 +65,169 @@ def has_perm(user, perm_function, perm_oper, egroup_id=None, equip_id=None, equi
 
     egroups = None
     if egroup_id is not None:
-        egroup = EGrupo.get_by_pk(egroup_id)
-        egroups = [egroup]
+        try:
+            egroups = [int(egroup_id)]
+        except (TypeError, ValueError):
+            egroups = [EGrupo.get_by_pk(egroup_id).id]
     elif equip_id is not None:
-        equip = Equipamento.get_by_pk(equip_id, 'grupos')
-        egroups = equip.grupos.all()
+        egroups = get_equip_groups(equip_id)
         if len(egroups) == 0:
             return False
 
-    ugroups = user.grupos.all()
-    for ugroup in ugroups:
-        try:
-            perm = PermissaoAdministrativa().get_permission(perm_function, ugroup, perm_oper)
-            if (egroups is None) or (_has_equip_perm(ugroup, egroups, equip_oper)):
-                return True
-        except PermissaoAdministrativaNotFoundError:
+    matrix = get_perm_matrix(user.id)
+    for functions, rights in matrix.values():
+        if not _has_function_perm(functions, perm_function, perm_oper):
             continue
+        if (egroups is None) or (_has_equip_perm(rights, egroups, equip_oper)):
+            return True
+
+    if egroup_id is not None:
+        # Grupo inexistente continua gerando EGrupoNotFoundError
+        EGrupo.get_by_pk(egroup_id)
     return False
 
 
-def _has_equip_perm(ugroup, egroups, equip_oper):
-    if len(egroups) == 0:
-        return False
+def _has_function_perm(functions, perm_function, perm_oper):
+    read, write = functions.get(perm_function, (False, False))
+    if perm_oper == AdminPermission.WRITE_OPERATION:
+        return write
+    return read
+
 
-    direitos = DireitosGrupoEquipamento.search(ugroup.id, equip_oper)
-    for direito in direitos:
-        if direito.egrupo in egroups:
+def _has_equip_perm(rights, egroups, equip_oper):
+    for egroup in egroups:
+        if egroup not in rights:
+            continue
+        read, write, update_config = rights[egroup]
+        if equip_oper == AdminPermission.EQUIP_READ_OPERATION:
+            allowed = read
+        elif equip_oper == AdminPermission.EQUIP_WRITE_OPERATION:
+            allowed = write
+        elif equip_oper == AdminPermission.EQUIP_UPDATE_CONFIG_OPERATION:
+            allowed = update_config
+        else:
+            allowed = True
+        if allowed:
             return True
     return False
+
+
+PERM_MATRIX_KEY = 'perm_matrix:%s:%s'
+PERM_EQUIP_GROUPS_KEY = 'perm_equip_groups:%s:%s'
+PERM_GENERATION_KEY = 'perm_generation'
+
+# Cópia em memória das matrizes da geração atual, por id de usuário
+_local_matrices = {}
+_local_generation = [None]
+_LOCAL_MATRICES_MAX = 10000
+
+
+def _perm_generation():
+    generation = cache.get(PERM_GENERATION_KEY)
+    if generation is None:
+        # Starts from the clock, so the keys of a lost generation are not reused
+        cache.add(PERM_GENERATION_KEY, int(time.time() * 1000), settings.PERMISSION_CACHE_TIME)
+        generation = cache.get(PERM_GENERATION_KEY)
+    return generation
+
+
+def _build_perm_matrix(user_id):
+    '''Lê de uma vez as permissões de todos os grupos do usuário.
+
+    @return: {id do grupo de usuário: ({função: (leitura, escrita)},
+             {id do grupo de equipamento: (leitura, escrita, alterar_config)})}
+    '''
+    ugroups = list(UsuarioGrupo.objects.filter(usuario__id=user_id).values_list('ugrupo', flat=True))
+    matrix = dict((ugroup, ({}, {})) for ugroup in ugroups)
+    if not ugroups:
+        return matrix
+
+    perms = PermissaoAdministrativa.objects.filter(ugrupo__id__in=ugroups) \
+        .values_list('ugrupo', 'permission__function', 'leitura', 'escrita')
+    for ugroup, function, read, write in perms:
+        functions = matrix[ugroup][0]
+        old_read, old_write = functions.get(function, (False, False))
+        functions[function] = (old_read or bool(read), old_write or bool(write))
+
+    direitos = DireitosGrupoEquipamento.objects.filter(ugrupo__id__in=ugroups) \
+        .values_list('ugrupo', 'egrupo', 'leitura', 'escrita', 'alterar_config')
+    for ugroup, egroup, read, write, update_config in direitos:
+        rights = matrix[ugroup][1]
+        old_read, old_write, old_update_config = rights.get(egroup, (False, False, False))
+        rights[egroup] = (old_read or bool(read), old_write or bool(write),
+                          old_update_config or bool(update_config))
+
+    return matrix
+
+
+def get_perm_matrix(user_id):
+    '''Retorna a matriz de permissões do usuário (ver _build_perm_matrix).
+
+    A matriz é procurada na memória do processo, depois no memcached, e só então é montada
+    com três queries. Qualquer alteração de grupos, permissões ou direitos descarta todas as
+    matrizes (perm_post_change).
+
+    @raise GrupoError: Falha ao pesquisar as permissões.
+    '''
+    generation = _perm_generation()
+    if _local_generation[0] != generation or len(_local_matrices) > _LOCAL_MATRICES_MAX:
+        _local_matrices.clear()
+        _local_generation[0] = generation
+
+    matrix = _local_matrices.get(user_id)
+    if matrix is not None:
+        return matrix
+
+    key = PERM_MATRIX_KEY % (generation, user_id)
+    matrix = cache.get(key)
+    if matrix is None:
+        try:
+            matrix = _build_perm_matrix(user_id)
+        except Exception, e:
+            raise GrupoError(e, u'Falha ao pesquisar as permissões administrativas.')
+        cache.set(key, matrix, settings.PERMISSION_CACHE_TIME)
+
+    _local_matrices[user_id] = matrix
+    return matrix
+
+
+def get_equip_groups(equip_id):
+    '''Retorna os ids dos grupos do equipamento, guardados no memcached.
+
+    @raise EquipamentoNotFoundError: Equipamento nao cadastrado.
+    @raise EquipamentoError: Falha ao pesquisar o equipamento.
+    '''
+    key = PERM_EQUIP_GROUPS_KEY % (_perm_generation(), equip_id)
+    egroups = cache.get(key)
+    if egroups is None:
+        egroups = list(EquipamentoGrupo.objects.filter(equipamento__id=equip_id).values_list('egrupo', flat=True))
+        if len(egroups) == 0:
+            # Equipamento inexistente continua gerando EquipamentoNotFoundError
+            Equipamento.get_by_pk(equip_id)
+            return egroups
+        cache.set(key, egroups, settings.PERMISSION_CACHE_TIME)
+    return egroups
+
+
+def _next_perm_generation():
+    try:
+        cache.incr(PERM_GENERATION_KEY)
+    except ValueError:
+        cache.set(PERM_GENERATION_KEY, int(time.time() * 1000), settings.PERMISSION_CACHE_TIME)
+
+
+def perm_post_change(sender, instance, **kwargs):
+    """Discards the permission matrices of all users, now and at the end of the
+    transaction, on commit and on rollback.
+
+    A matrix built by a concurrent request from the rows of before the commit would
+    otherwise stay in cache, and a revoked permission would still be granted.
+    """
+    _next_perm_generation()
+    commit_hooks.on_transaction_end(_next_perm_generation)
+
+
+for _sender in (UGrupo, Permission, PermissaoAdministrativa, DireitosGrupoEquipamento, UsuarioGrupo, EGrupo, EquipamentoGrupo):
+    post_save.connect(perm_post_change, sender=_sender)
+    post_delete.connect(perm_post_change, sender=_sender)
+post_delete.connect(perm_post_change, sender=Equipamento)
@@ -54,18 +54,26 @@ LOCK_USER_GROUP = "user_group:%s:%s"
 LOCK_USER = "user:%s"
 LOCK_VLAN = "vlan:%s"
 LOCK_RACK = "rack:%s"
+LOCK_SEMAFORO = "semaforo:%s"
 
 
 # Adjusts settings
+import time
+from django.conf import settings
 from django.core.cache import cache
 from networkapi.distributedlock.memcachedlock import MemcachedLock
+from networkapi.distributedlock.mysqllock import MySQLLock
+from networkapi.distributedlock.metrics import metrics
 
 DEBUG = False
 DEFAULT_TIMEOUT = 600
 DEFAULT_BLOCKING = False
 DEFAULT_MEMCACHED_CLIENT = cache
-DEFAULT_LOCK_FACTORY = lambda key: MemcachedLock(
-    key, DEFAULT_MEMCACHED_CLIENT, DEFAULT_TIMEOUT)
+LOCK_BACKENDS = {
+    'memcached': lambda key: MemcachedLock(key, DEFAULT_MEMCACHED_CLIENT, DEFAULT_TIMEOUT),
+    'mysql': lambda key: MySQLLock(key, DEFAULT_TIMEOUT),
+}
+DEFAULT_LOCK_FACTORY = LOCK_BACKENDS[getattr(settings, 'LOCK_BACKEND', 'memcached')]
 
 
 def _debug(msg):
@@ -105,7 +113,12 @@ class distributedlock(object):
         if not (type(self.key) == str or type(self.key) == unicode) and self.key == '':
             raise RuntimeError("Key not specified!")
 
-        if self.lock.acquire(self.blocking):
+        start = time.time()
+        acquired = self.lock.acquire(self.blocking)
+        self.acquired_at = time.time()
+        metrics.waited(self.key, self.acquired_at - start, acquired)
+
+        if acquired:
             _debug("locking with key %s" % self.key)
         else:
             raise LockNotAcquiredError()
@@ -113,3 +126,13 @@ class distributedlock(object):
     def __exit__(self, type, value, traceback):
         _debug("releasing lock %s" % self.key)
         self.lock.release()
+        metrics.held(self.key, time.time() - self.acquired_at)
+
+    def renew(self):
+        '''Extends the lease of the lock for long operations. Returns False if the lock was lost.'''
+        return self.lock.renew()
+
+
+def get_lock_metrics():
+    '''Returns the wait and hold times of the locks taken by this process, by kind of lock.'''
+    return metrics.snapshot()
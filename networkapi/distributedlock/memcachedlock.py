@@ -15,6 +15,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import random
 import time
 import uuid
 from networkapi.log import Log
@@ -23,6 +24,10 @@ log = Log('MemcachedLock')
 
 __all__ = ['MemcachedLock']
 
+# Bounds of the pause between two tries of a blocking acquire, in seconds
+MIN_RETRY_INTERVAL = 0.001
+MAX_RETRY_INTERVAL = 0.5
+
 
 class MemcachedLock(object):
 
@@ -42,9 +47,9 @@ class MemcachedLock(object):
         self.instance_id = uuid.uuid1().hex
 
     def acquire(self, blocking=True):
+        interval = MIN_RETRY_INTERVAL
         while True:
             added = self.client.add(self.key, self.instance_id, self.timeout)
-            log.warning("Added=%s" % repr(added))
             if added:
                 break
 
@@ -55,8 +60,20 @@ class MemcachedLock(object):
             if not blocking:   # and not added
                 return False
 
-            log.warning('Waiting locking for "%s"', self.key)
-            time.sleep(1)
+            if interval == MIN_RETRY_INTERVAL:
+                log.warning('Waiting locking for "%s"', self.key)
+
+            # Waiters retry soon after the lock is released, and the random part keeps
+            # them from waking up all at the same time
+            time.sleep(random.uniform(interval / 2, interval))
+            interval = min(interval * 2, MAX_RETRY_INTERVAL)
+        return True
+
+    def renew(self):
+        '''Restarts the timeout of the lock. Returns False if the lock is not held anymore.'''
+        if self.client.get(self.key) != self.instance_id:
+            return False
+        self.client.set(self.key, self.instance_id, self.timeout)
         return True
 
     def release(self):
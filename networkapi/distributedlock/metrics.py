@@ -0,0 +1,72 @@
+# encoding: utf-8
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+__all__ = ['LockMetrics', 'metrics']
+
+
+class LockMetrics(object):
+
+    """
+    Wait and hold times of the locks taken by this process.
+
+    Times are grouped by the kind of lock, which is the LOCK_* key name without
+    its arguments ("vlan" for "vlan:10"), so the number of entries stays small.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._stats = {}
+
+    def _kind(self, key):
+        return str(key).split(':')[0]
+
+    def _entry(self, key):
+        return self._stats.setdefault(self._kind(key), {
+            'acquired': 0,
+            'not_acquired': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'hold_total': 0.0,
+            'hold_max': 0.0,
+        })
+
+    def waited(self, key, seconds, acquired):
+        with self._mutex:
+            entry = self._entry(key)
+            entry['acquired' if acquired else 'not_acquired'] += 1
+            entry['wait_total'] += seconds
+            entry['wait_max'] = max(entry['wait_max'], seconds)
+
+    def held(self, key, seconds):
+        with self._mutex:
+            entry = self._entry(key)
+            entry['hold_total'] += seconds
+            entry['hold_max'] = max(entry['hold_max'], seconds)
+
+    def snapshot(self):
+        '''Returns a copy of the metrics: {kind: {acquired, not_acquired, wait_total, wait_max, hold_total, hold_max}}.'''
+        with self._mutex:
+            return dict((kind, dict(entry)) for kind, entry in self._stats.items())
+
+    def reset(self):
+        with self._mutex:
+            self._stats = {}
+
+
+metrics = LockMetrics()
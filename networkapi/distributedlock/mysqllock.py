@@ -0,0 +1,70 @@
+# encoding: utf-8
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+from django.db import connection
+from networkapi.log import Log
+
+log = Log('MySQLLock')
+
+__all__ = ['MySQLLock']
+
+# MySQL refuses lock names longer than this
+MAX_NAME_LENGTH = 64
+
+
+class MySQLLock(object):
+
+    """
+    Same interface as MemcachedLock, but using MySQL named locks (GET_LOCK).
+
+    Waiting is done by the database server: a waiter is woken up as soon as the lock
+    is released, without polling. MySQL does not grant the lock in arrival order.
+    The lock belongs to the database connection, so it is released by MySQL if the
+    process holding it dies, and does not expire while the holder is alive (the lease
+    is renewed for as long as the connection is open).
+
+    Requires MySQL 5.7 or newer, where a connection may hold more than one named lock.
+    """
+
+    def __init__(self, key, timeout=600):
+        self.key = "lock:%s" % key
+        if len(self.key) > MAX_NAME_LENGTH:
+            self.key = "lock:%s" % hashlib.sha1(self.key).hexdigest()
+        self.timeout = timeout
+
+    def _execute(self, sql, *params):
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+    def acquire(self, blocking=True):
+        timeout = self.timeout if blocking else 0
+        acquired = self._execute("SELECT GET_LOCK(%s, %s)", self.key, timeout)
+        if acquired is None:
+            raise RuntimeError(
+                u"Error calling GET_LOCK for %s! Is the database up?" % self.key)
+        return acquired == 1
+
+    def renew(self):
+        '''Tells if the lock is still held. Named locks live as long as the connection, so there is nothing to extend.'''
+        return self._execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", self.key) == 1
+
+    def release(self):
+        if self._execute("SELECT RELEASE_LOCK(%s)", self.key) != 1:
+            log.warning(
+                "I've no lock to release. Was the database connection closed?")
@@ -17,6 +17,7 @@
 
 
 from django.db import models
+from django.db.models.signals import post_save, post_delete
 
 from networkapi.ambiente.models import Ambiente
 
@@ -1208,3 +1209,9 @@ class EquipamentoRoteiro(BaseModel):
                 u'Falha ao remover uma associação entre um Equipamento e um Roteiro.')
             raise EquipamentoError(
                 e, u'Falha ao remover uma associação entre um Equipamento e um Roteiro.')
+
+
+from networkapi.vlan.models import vlan_numbers_post_change
+
+post_save.connect(vlan_numbers_post_change, sender=EquipamentoAmbiente)
+post_delete.connect(vlan_numbers_post_change, sender=EquipamentoAmbiente)
@@ -22,7 +22,7 @@ from django.db.models import Q
 from networkapi.admin_permission import AdminPermission
 from networkapi.auth import has_perm
 from networkapi.grupo.models import GrupoError
-from networkapi.infrastructure.xml_utils import dumps_networkapi, loads
+from networkapi.infrastructure.xml_utils import iterdumps_networkapi, loads
 from networkapi.log import Log
 from networkapi.rest import RestResource
 from networkapi.util import is_valid_string_minsize, is_valid_int_greater_zero_param, is_valid_boolean_param,\
@@ -30,11 +30,14 @@ from networkapi.util import is_valid_string_minsize, is_valid_int_greater_zero_p
 from networkapi.exception import InvalidValueError
 from networkapi.infrastructure.ipaddr import IPAddress
 from string import split
-from networkapi.ambiente.models import IP_VERSION, Ambiente
+from networkapi.ambiente.models import IP_VERSION, Ambiente, DivisaoDc, AmbienteLogico, GrupoL3
 from networkapi.infrastructure.datatable import build_query_to_datatable
 from django.forms.models import model_to_dict
-from networkapi.equipamento.models import Equipamento, EquipamentoError
-from networkapi.ip.models import Ip, Ipv6
+from networkapi.equipamento.models import Equipamento, EquipamentoError, TipoEquipamento, EquipamentoGrupo, \
+    EquipamentoAmbiente
+from networkapi.grupo.models import EGrupo
+from networkapi.ip.models import Ip, Ipv6, IpEquipamento, Ipv6Equipament, NetworkIPv4, NetworkIPv6
+from networkapi.vlan.models import Vlan
 from networkapi import ambiente
 from networkapi.settings import EQUIPMENT_CACHE_TIME
 
@@ -97,86 +100,122 @@ def get_equips(equipments):
     Join all properties needed
     """
 
-    itens = []
-    for equip in equipments:
-        equip_dict = prepares_equips(equip)
-        itens.append(equip_dict)
+    return prepares_equips.get_many(list(equipments))
 
-    return itens
 
+def _equipments_of_ips(**filters):
+    return IpEquipamento.objects.filter(**filters).values_list('equipamento', flat=True)
 
-@cache_function(EQUIPMENT_CACHE_TIME, True)
-def prepares_equips(equip):
-    equip_dict = dict()
-    equip_dict = model_to_dict(equip)
-    equip_dict["tipo_equipamento"] = equip.tipo_equipamento.tipo_equipamento
-
-    group_list = []
-    for g in equip.grupos.all():
-        group_dict = dict()
-        group_dict["nome"] = g.nome
-        group_list.append(group_dict)
-
-    ips_list = []
-    env_list = []
-    for ipe in equip.ipequipamento_set.all():
-
-        ipp = Ip.objects.select_related().get(id=ipe.ip.id)
 
-        ip_dict = dict()
-        ip_dict["ip"] = str(
-            ipp.oct1) + "." + str(ipp.oct2) + "." + str(ipp.oct3) + "." + str(ipp.oct4)
-        ip_dict["vlan"] = ipp.networkipv4.vlan.nome
-        ip_dict["ambiente"] = ipp.networkipv4.vlan.ambiente.divisao_dc.nome + "-" + \
-            ipp.networkipv4.vlan.ambiente.ambiente_logico.nome + \
-            "-" + ipp.networkipv4.vlan.ambiente.grupo_l3.nome
-        env_list.append(ipp.networkipv4.vlan.ambiente.id)
+def _equipments_of_ipv6s(**filters):
+    return Ipv6Equipament.objects.filter(**filters).values_list('equipamento', flat=True)
 
-        ips_list.append(ip_dict)
 
-    for ipv6e in equip.ipv6equipament_set.all():
+def _equipments_of_vlan(vlan):
+    return set(_equipments_of_ips(ip__networkipv4__vlan=vlan.id)) | \
+        set(_equipments_of_ipv6s(ip__networkipv6__vlan=vlan.id))
 
-        ipp = Ipv6.objects.select_related().get(id=ipv6e.ip.id)
 
-        ipv6_dict = dict()
-        ipv6_dict["ip"] = ipp.block1 + ":" + ipp.block2 + ":" + ipp.block3 + ":" + \
-            ipp.block4 + ":" + ipp.block5 + ":" + \
-            ipp.block6 + ":" + ipp.block7 + ":" + ipp.block8
-        ipv6_dict["vlan"] = ipp.networkipv6.vlan.nome
-        ipv6_dict["ambiente"] = ipp.networkipv6.vlan.ambiente.divisao_dc.nome + "-" + \
-            ipp.networkipv6.vlan.ambiente.ambiente_logico.nome + \
-            "-" + ipp.networkipv6.vlan.ambiente.grupo_l3.nome
-        env_list.append(ipp.networkipv6.vlan.ambiente.id)
+# Models the search result of an equipment is built from, with the equipments affected
+# by each instance. Changes of the models without function discard the results of all
+# equipments.
+@cache_function('equipment', EQUIPMENT_CACHE_TIME,
+                [(Equipamento, lambda equip: [equip.id]),
+                 (EquipamentoGrupo, lambda equip_group: [equip_group.equipamento_id]),
+                 (EquipamentoAmbiente, lambda equip_environment: [equip_environment.equipamento_id]),
+                 (IpEquipamento, lambda ip_equipment: [ip_equipment.equipamento_id]),
+                 (Ipv6Equipament, lambda ip_equipment: [ip_equipment.equipamento_id]),
+                 (Ip, lambda ip: _equipments_of_ips(ip=ip.id)),
+                 (Ipv6, lambda ip: _equipments_of_ipv6s(ip=ip.id)),
+                 (NetworkIPv4, lambda network: _equipments_of_ips(ip__networkipv4=network.id)),
+                 (NetworkIPv6, lambda network: _equipments_of_ipv6s(ip__networkipv6=network.id)),
+                 (Vlan, _equipments_of_vlan),
+                 TipoEquipamento, EGrupo, Ambiente, DivisaoDc, AmbienteLogico, GrupoL3])
+def prepares_equips(equip):
+    return prepares_equips_many([equip])[0]
 
-        ips_list.append(ipv6_dict)
 
-    for env in equip.equipamentoambiente_set.all():
-        if not env.ambiente.id in env_list:
+def _environment_name(division, logical, l3_group):
+    return division + "-" + logical + "-" + l3_group
 
-            ambiente = Ambiente.objects.select_related().get(
-                id=env.ambiente.id)
 
+@prepares_equips.batch
+def prepares_equips_many(equips):
+    """
+    Builds the dicts of many equipments with a fixed number of queries, whatever
+    the number of equipments, groups and IPs
+    """
+    equip_ids = [equip.id for equip in equips]
+
+    equipment_types = dict(TipoEquipamento.objects.filter(
+        id__in=set(equip.tipo_equipamento_id for equip in equips)).values_list('id', 'tipo_equipamento'))
+
+    groups = dict()
+    for equip_id, name in EquipamentoGrupo.objects.filter(
+            equipamento__in=equip_ids).order_by('id').values_list('equipamento', 'egrupo__nome'):
+        groups.setdefault(equip_id, []).append({"nome": name})
+
+    ips = dict()
+    env_ids = dict()
+    for row in IpEquipamento.objects.filter(equipamento__in=equip_ids).order_by('id').values_list(
+            'equipamento', 'ip__oct1', 'ip__oct2', 'ip__oct3', 'ip__oct4', 'ip__networkipv4__vlan__nome',
+            'ip__networkipv4__vlan__ambiente', 'ip__networkipv4__vlan__ambiente__divisao_dc__nome',
+            'ip__networkipv4__vlan__ambiente__ambiente_logico__nome',
+            'ip__networkipv4__vlan__ambiente__grupo_l3__nome'):
+        ip_dict = dict()
+        ip_dict["ip"] = str(row[1]) + "." + str(row[2]) + "." + str(row[3]) + "." + str(row[4])
+        ip_dict["vlan"] = row[5]
+        ip_dict["ambiente"] = _environment_name(*row[7:10])
+        ips.setdefault(row[0], []).append(ip_dict)
+        env_ids.setdefault(row[0], []).append(row[6])
+
+    for row in Ipv6Equipament.objects.filter(equipamento__in=equip_ids).order_by('id').values_list(
+            'equipamento', 'ip__block1', 'ip__block2', 'ip__block3', 'ip__block4', 'ip__block5', 'ip__block6',
+            'ip__block7', 'ip__block8', 'ip__networkipv6__vlan__nome', 'ip__networkipv6__vlan__ambiente',
+            'ip__networkipv6__vlan__ambiente__divisao_dc__nome',
+            'ip__networkipv6__vlan__ambiente__ambiente_logico__nome',
+            'ip__networkipv6__vlan__ambiente__grupo_l3__nome'):
+        ipv6_dict = dict()
+        ipv6_dict["ip"] = ":".join(row[1:9])
+        ipv6_dict["vlan"] = row[9]
+        ipv6_dict["ambiente"] = _environment_name(*row[11:14])
+        ips.setdefault(row[0], []).append(ipv6_dict)
+        env_ids.setdefault(row[0], []).append(row[10])
+
+    for row in EquipamentoAmbiente.objects.filter(equipamento__in=equip_ids).order_by('id').values_list(
+            'equipamento', 'ambiente', 'ambiente__divisao_dc__nome', 'ambiente__ambiente_logico__nome',
+            'ambiente__grupo_l3__nome'):
+        if not row[1] in env_ids.get(row[0], []):
             ip_dict = dict()
             ip_dict["ip"] = "-"
             ip_dict["vlan"] = "-"
-            ip_dict["ambiente"] = ambiente.divisao_dc.nome + "-" + \
-                ambiente.ambiente_logico.nome + "-" + ambiente.grupo_l3.nome
-            ips_list.append(ip_dict)
+            ip_dict["ambiente"] = _environment_name(*row[2:5])
+            ips.setdefault(row[0], []).append(ip_dict)
 
-    equip_dict["grupos"] = group_list
-    equip_dict["ips"] = ips_list
+    equip_dicts = []
+    for equip in equips:
+        equip_dict = model_to_dict(equip)
+        equip_dict["tipo_equipamento"] = equipment_types.get(equip.tipo_equipamento_id)
 
-    if len(ips_list) > 3:
-        equip_dict["is_more"] = True
-    else:
-        equip_dict["is_more"] = False
+        group_list = groups.get(equip.id, [])
+        ips_list = ips.get(equip.id, [])
 
-    if len(group_list) > 3:
-        equip_dict["is_more_group"] = True
-    else:
-        equip_dict["is_more_group"] = False
+        equip_dict["grupos"] = group_list
+        equip_dict["ips"] = ips_list
+
+        if len(ips_list) > 3:
+            equip_dict["is_more"] = True
+        else:
+            equip_dict["is_more"] = False
+
+        if len(group_list) > 3:
+            equip_dict["is_more_group"] = True
+        else:
+            equip_dict["is_more_group"] = False
+
+        equip_dicts.append(equip_dict)
 
-    return equip_dict
+    return equip_dicts
 
 
 class EquipmentFindResource(RestResource):
@@ -348,7 +387,7 @@ class EquipmentFindResource(RestResource):
             equipment_map["equipamento"] = itens
             equipment_map["total"] = total
 
-            return self.response(dumps_networkapi(equipment_map))
+            return self.response(iterdumps_networkapi(equipment_map))
 
         except InvalidValueError, e:
             self.log.error(
@@ -16,8 +16,13 @@
 # limitations under the License.
 
 
+import Queue
+import threading
+
+from django.conf import settings
 from django.db import models
 from datetime import datetime
+from networkapi.infrastructure import commit_hooks
 from networkapi.models.BaseModel import BaseModel
 from networkapi.usuario.models import Usuario
 from networkapi.log import Log
@@ -55,7 +60,10 @@ class EventLog(BaseModel):
 
     @classmethod
     def log(cls, usuario, evento):
-        """ Gera um log da operação realizada pelo usuário """
+        """ Gera um log da operação realizada pelo usuário
+
+        Se um lote foi iniciado nesta thread (start_batch), o log só é gravado em flush_batch.
+        """
 
         try:
             functionality = Functionality()
@@ -70,13 +78,71 @@ class EventLog(BaseModel):
             event_log.id_objeto = evento['id_objeto']
             event_log.evento = ''
             event_log.resultado = 0
-            event_log.save(usuario)
+
+            events = getattr(_batch, 'events', None)
+            if events is not None:
+                events.append(event_log)
+                _batch.last_values[(event_log.funcionalidade, event_log.id_objeto)] = event_log.parametro_atual
+            else:
+                event_log.save(usuario)
         except Exception, e:
             cls.logger.error(
                 u'Falha ao salvar o log: evento = %s, id do usuario = %s.' % (evento, usuario.id))
             raise EventLogError(
                 e, u'Falha ao salvar o log: evento = %s, id do usuario = %s.' % (evento, usuario.id))
 
+    @classmethod
+    def start_batch(cls):
+        """ Passa a acumular os logs desta thread até flush_batch ou discard_batch """
+        _batch.events = []
+        _batch.last_values = dict()
+
+    @classmethod
+    def discard_batch(cls):
+        """ Descarta os logs acumulados, usado quando a transação é desfeita """
+        _batch.events = None
+        _batch.last_values = None
+
+    @classmethod
+    def pending_value(cls, funcionalidade, id_objeto):
+        """ Retorna o parametro_atual do último log ainda não gravado do objeto, ou None.
+
+        Os logs do lote não são vistos por consultas à tabela event_log até flush_batch.
+        """
+        last_values = getattr(_batch, 'last_values', None)
+        if not last_values:
+            return None
+        return last_values.get((funcionalidade, id_objeto))
+
+    @classmethod
+    def flush_batch(cls):
+        """ Grava os logs acumulados com um único insert e encerra o lote.
+
+        Deve ser chamado antes do commit da transação. Com EVENTLOG_ASYNC_WRITER os logs
+        só são entregues depois do commit (commit_hooks.on_commit) a uma thread que os grava
+        na sua própria conexão, então alterações desfeitas não são registradas.
+
+        @raise EventLogError: Falha ao gravar os logs.
+        """
+        events = getattr(_batch, 'events', None)
+        _batch.events = None
+        _batch.last_values = None
+        if not events:
+            return
+
+        if getattr(settings, 'EVENTLOG_ASYNC_WRITER', False):
+            commit_hooks.on_commit(lambda: _get_writer().queue.put(events))
+        else:
+            cls.write_batch(events)
+
+    @classmethod
+    def write_batch(cls, events):
+        try:
+            EventLog.objects.bulk_create(events)
+        except Exception, e:
+            cls.logger.error(u'Falha ao salvar %d logs.' % len(events))
+            raise EventLogError(e, u'Falha ao salvar %d logs.' % len(events))
+
     @classmethod
     def uniqueUsers(cls):
         userlist = Usuario.objects.all().order_by('user')
@@ -95,11 +161,52 @@ class Functionality(models.Model):
 
     @classmethod
     def exist(cls, event_functionality):
+        # Functionalities are never removed, so each one is checked once per process
+        if event_functionality in _known_functionalities:
+            return event_functionality
+
         func = Functionality.objects.filter(nome=event_functionality)
         if func.exists():
+            _known_functionalities.add(event_functionality)
             return event_functionality
         else:
             functionality = Functionality()
             functionality.nome = event_functionality
             functionality.save()
             return event_functionality
+
+
+# Logs acumulados pela thread atual, None quando não há lote
+_batch = threading.local()
+
+_known_functionalities = set()
+
+_writer = [None]
+_writer_lock = threading.Lock()
+
+
+class EventLogWriter(threading.Thread):
+
+    """Thread que grava os lotes de logs entregues por EventLog.flush_batch."""
+
+    def __init__(self):
+        threading.Thread.__init__(self, name='EventLogWriter')
+        self.daemon = True
+        self.queue = Queue.Queue()
+
+    def run(self):
+        while True:
+            events = self.queue.get()
+            try:
+                EventLog.write_batch(events)
+            except EventLogError:
+                # Already logged, there is no request to report the error to
+                pass
+
+
+def _get_writer():
+    with _writer_lock:
+        if _writer[0] is None:
+            _writer[0] = EventLogWriter()
+            _writer[0].start()
+        return _writer[0]
@@ -0,0 +1,110 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from unittest import TestCase
+
+from django.conf import settings
+from mock import patch
+
+from networkapi.eventlog import models
+from networkapi.eventlog.models import EventLog, Functionality
+from networkapi.infrastructure import commit_hooks
+from networkapi.models.models_signal_receiver import networkapi_post_save
+from networkapi.usuario.models import Usuario
+
+
+@patch.object(settings, 'EVENTLOG_ASYNC_WRITER', True)
+@patch.object(models, '_get_writer')
+class EventLogAsyncWriterTestCase(TestCase):
+
+    def tearDown(self):
+        EventLog.discard_batch()
+        commit_hooks.discard_batch()
+
+    def test_logs_are_written_after_the_commit(self, get_writer):
+        commit_hooks.start_batch()
+        EventLog.start_batch()
+        models._batch.events.append('event')
+
+        EventLog.flush_batch()
+        self.assertEqual(0, get_writer.return_value.queue.put.call_count)
+
+        commit_hooks.run_batch()
+        get_writer.return_value.queue.put.assert_called_once_with(['event'])
+
+    def test_logs_of_rolled_back_transaction_are_dropped(self, get_writer):
+        commit_hooks.start_batch()
+        EventLog.start_batch()
+        models._batch.events.append('event')
+
+        EventLog.flush_batch()
+        commit_hooks.discard_batch()
+        self.assertEqual(0, get_writer.return_value.queue.put.call_count)
+
+
+@patch.object(Functionality, 'exist', side_effect=lambda name: name)
+@patch.object(EventLog, 'objects')
+class EventLogPreviousStateTestCase(TestCase):
+
+    def setUp(self):
+        self.user = Usuario(id=1, user='admin')
+        EventLog.start_batch()
+
+    def tearDown(self):
+        EventLog.discard_batch()
+
+    def _save(self, usuario):
+        usuario.set_authenticated_user(self.user)
+        networkapi_post_save(Usuario, usuario, created=False)
+        return models._batch.events[-1]
+
+    def test_previous_state_of_an_object_changed_earlier_in_the_batch(self, objects, exist):
+        first = self._save(Usuario(id=5, user='first', nome='First'))
+        second = self._save(Usuario(id=5, user='second', nome='Second'))
+
+        self.assertEqual(first.parametro_atual, second.parametro_anterior)
+        self.assertIn('user = second', second.parametro_atual)
+        # only the first change looks for the last log in database
+        self.assertEqual(1, objects.values_list.call_count)
+
+    def test_previous_state_of_a_loaded_object(self, objects, exist):
+        usuario = Usuario(id=5, user='loaded', nome='Loaded')
+        usuario.audit_snapshot()
+        usuario.user = 'changed'
+
+        event = self._save(usuario)
+
+        self.assertIn('user = loaded', event.parametro_anterior)
+        self.assertIn('user = changed', event.parametro_atual)
+        self.assertEqual(0, objects.values_list.call_count)
+
+    def test_previous_state_from_database_otherwise(self, objects, exist):
+        objects.values_list.return_value.filter.return_value.order_by.return_value = ['user = stored / ']
+
+        event = self._save(Usuario(id=5, user='changed'))
+
+        self.assertEqual('user = stored / ', event.parametro_anterior)
+
+    def test_pending_values_end_with_the_batch(self, objects, exist):
+        usuario = Usuario(id=5, user='first')
+        usuario.audit_snapshot()
+        self._save(usuario)
+        self.assertIn('user = first', EventLog.pending_value('Usuario', 5))
+        EventLog.discard_batch()
+
+        self.assertEqual(None, EventLog.pending_value('Usuario', 5))
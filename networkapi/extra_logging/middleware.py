@@ -15,11 +15,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import random
+import re
 import uuid
 import base64
 
 from django.conf import settings
 
+from networkapi.infrastructure import formats
 from networkapi.log import Log
 from networkapi.extra_logging import local, REQUEST_ID_HEADER, NO_REQUEST_ID, NO_REQUEST_USER
 
@@ -60,6 +64,65 @@ def get_username(request):
     return username
 
 
+# Tags e chaves JSON cujo conteúdo não pode ir para o log
+_SENSITIVE_TAGS = ('password', 'enable_pass', 'pass')
+
+# Resto de um valor JSON completo, depois da chave
+_JSON_VALUE = re.compile(r'\s*:\s*"(?:[^"\\]|\\.)*"')
+
+
+def _body_text(request):
+    """Retorna o corpo da requisição como texto.
+
+    Corpos msgpack são gravados como JSON, para que as senhas sejam escondidas pelo
+    log. O que não puder ser lido como texto é gravado em base64.
+    """
+    body = request.raw_post_data
+    if not body:
+        return u''
+    if formats.content_format(request) == formats.MSGPACK:
+        try:
+            return json.dumps(formats.loads(body, formats.MSGPACK)[0], ensure_ascii=False)
+        except Exception:
+            return u'base64:' + base64.b64encode(body)
+    try:
+        return body.decode('utf-8')
+    except UnicodeDecodeError:
+        return u'base64:' + base64.b64encode(body)
+
+
+def _cut_open_passwords(body):
+    """Corta o corpo antes de uma senha, em XML ou JSON, que ficou sem o fim do valor."""
+    for tag in _SENSITIVE_TAGS:
+        start = body.rfind('<%s>' % tag)
+        if start >= 0 and body.find('</%s>' % tag, start) < 0:
+            body = body[:start]
+        start = body.rfind('"%s"' % tag)
+        if start >= 0 and not _JSON_VALUE.match(body, start + len(tag) + 2):
+            body = body[:start]
+    return body
+
+
+def get_logged_body(request):
+    """Retorna o corpo da requisição a ser gravado no log.
+
+    Só uma amostra das requisições tem o corpo gravado, até o tamanho máximo
+    configurado. As senhas são escondidas antes do corte, em XML, JSON ou
+    msgpack. Se ainda assim o corte deixar uma senha sem o fim do valor, o
+    corpo é cortado antes dela.
+    """
+    rate = getattr(settings, 'LOG_REQUEST_BODY_SAMPLE_RATE', 1.0)
+    if rate < 1.0 and random.random() >= rate:
+        return u'<omitido>'
+
+    body = logger._search_hide_password(_body_text(request))
+    max_size = getattr(settings, 'LOG_REQUEST_BODY_MAX_SIZE', None)
+    if not max_size or len(body) <= max_size:
+        return body
+
+    return _cut_open_passwords(body[:max_size]) + '...'
+
+
 class ExtraLoggingMiddleware(object):
 
     def process_request(self, request):
@@ -71,7 +134,7 @@ class ExtraLoggingMiddleware(object):
         local.request_path = request.get_full_path()
         request.id = identity
 
-        logger.rest(u'INICIO da requisição %s. Data: [%s].' % (request.method, request.raw_post_data))
+        logger.rest(u'INICIO da requisição %s. Data: [%s].' % (request.method, get_logged_body(request)))
 
     def process_response(self, request, response):
 
@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from unittest import TestCase, skipIf
+
+from django.conf import settings
+from django.test.client import RequestFactory
+from mock import patch
+
+from networkapi.extra_logging.middleware import get_logged_body
+from networkapi.infrastructure import formats
+from networkapi.log import Log
+
+
+class LoggedBodyTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        patcher = patch.multiple(settings, LOG_REQUEST_BODY_SAMPLE_RATE=1.0, LOG_REQUEST_BODY_MAX_SIZE=None, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _logged(self, body, content_type):
+        request = self.factory.post('/vlan/', body, content_type=content_type)
+        return Log('test')._search_hide_password(get_logged_body(request))
+
+    def test_xml_password_is_hidden(self):
+        logged = self._logged('<networkapi><user><password>s3cr3t</password></user></networkapi>', 'text/xml')
+        self.assertEqual(u'<networkapi><user><password>****</password></user></networkapi>', logged)
+
+    def test_json_passwords_are_hidden(self):
+        body = json.dumps({'networkapi': {'user': {'password': 'a"b', 'enable_pass': 'c'}}})
+        logged = self._logged(body, 'application/json')
+        self.assertNotIn('a\\"b', logged)
+        self.assertNotIn('"c"', logged)
+        self.assertEqual({'user': {'password': '****', 'enable_pass': '****'}}, json.loads(logged)['networkapi'])
+
+    @skipIf(formats.msgpack is None, 'msgpack is not installed')
+    def test_msgpack_is_logged_as_json(self):
+        body = formats.msgpack.packb({'networkapi': {'id': 1, 'password': u'sénha'}})
+        logged = self._logged(body, 'application/x-msgpack')
+        self.assertEqual({'id': '1', 'password': '****'}, json.loads(logged)['networkapi'])
+
+    def test_binary_is_logged_in_base64(self):
+        logged = self._logged('\xff\xfe\x00', 'application/octet-stream')
+        self.assertEqual(u'base64://4A', logged)
+
+    def _truncated(self, body, content_type, max_size):
+        with patch.object(settings, 'LOG_REQUEST_BODY_MAX_SIZE', max_size):
+            return get_logged_body(self.factory.post('/vlan/', body, content_type=content_type))
+
+    def test_truncated_xml_password_is_not_logged(self):
+        body = '<networkapi><user><id>1</id><password>s3cr3t-and-long</password></user></networkapi>'
+        for max_size in range(1, len(body)):
+            self.assertNotIn('s3c', self._truncated(body, 'text/xml', max_size))
+
+    def test_truncated_json_password_is_not_logged(self):
+        body = json.dumps({'networkapi': {'user': {'id': 1, 'password': 's3cr3t\\" and long'}}})
+        for max_size in range(1, len(body)):
+            logged = self._truncated(body, 'application/json', max_size)
+            self.assertNotIn('s3c', logged)
+            self.assertNotIn('long', logged)
+
+    @skipIf(formats.msgpack is None, 'msgpack is not installed')
+    def test_truncated_msgpack_password_is_not_logged(self):
+        body = formats.msgpack.packb({'networkapi': {'user': {'id': 1, 'password': 's3cr3t'}}})
+        for max_size in range(1, 60):
+            self.assertNotIn('s3c', self._truncated(body, 'application/x-msgpack', max_size))
+
+    def test_truncation_keeps_masked_passwords(self):
+        body = '<networkapi><password>s3cr3t</password><descricao>%s</descricao></networkapi>' % ('x' * 100)
+        self.assertEqual(u'<networkapi><password>****</password><descricao>xxxxxxxx...',
+                         self._truncated(body, 'text/xml', 56))
+
+    def test_truncation_cuts_passwords_that_could_not_be_hidden(self):
+        body = '<networkapi><id>1</id><password>s3cr3t</passw'
+        self.assertEqual(u'<networkapi><id>1</id>...', self._truncated(body, 'text/xml', len(body) - 1))
+        body = '{"networkapi": {"id": 1, "password": "s3cr3t'
+        self.assertEqual(u'{"networkapi": {"id": 1, ...', self._truncated(body, 'application/json', len(body) - 1))
@@ -0,0 +1,123 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+
+from networkapi.log import Log
+
+
+log = Log(__name__)
+
+# (function, also on rollback) of the current thread waiting for the end of the
+# transaction, None when there is no batch
+_batch = threading.local()
+
+
+def start_batch():
+    """
+        Holds the functions given to on_commit in this thread until run_batch or discard_batch.
+    """
+    _batch.hooks = []
+
+
+def on_commit(function):
+    """
+        Calls function after the transaction of the current request (or job) is committed.
+
+        Cache entries invalidated by post_save/post_delete signals may be read again
+        and cached from the rows of before the commit by a concurrent request, so they
+        must be invalidated once more after the commit. Without a batch, as in scripts
+        and management commands, function is called at once.
+    """
+    hooks = getattr(_batch, 'hooks', None)
+    if hooks is None:
+        function()
+    else:
+        hooks.append((function, False))
+
+
+def on_transaction_end(function):
+    """
+        Calls function after the transaction of the current request (or job) is
+        committed or rolled back. Returns False, without calling it, if there is no batch.
+    """
+    hooks = getattr(_batch, 'hooks', None)
+    if hooks is None:
+        return False
+    hooks.append((function, True))
+    return True
+
+
+def _run(hooks):
+    for function, always in hooks:
+        try:
+            function()
+        except Exception, e:
+            log.error(u'Error running a function after the end of the transaction: %s' % e)
+
+
+def discard_batch():
+    """
+        Drops the held functions, used after the transaction is rolled back.
+        Only the functions given to on_transaction_end are called.
+    """
+    hooks = getattr(_batch, 'hooks', None)
+    _batch.hooks = None
+    _run([hook for hook in hooks or [] if hook[1]])
+
+
+def transaction_committed():
+    """
+        Calls the held functions, keeping the batch open. Used by the code that
+        commits in the middle of a request, as BaseModel.save(commit=True).
+    """
+    hooks = getattr(_batch, 'hooks', None)
+    if hooks:
+        _batch.hooks = []
+        _run(hooks)
+
+
+def run_batch():
+    """
+        Calls the held functions. Must be called after the commit.
+    """
+    hooks = getattr(_batch, 'hooks', None)
+    _batch.hooks = None
+    _run(hooks or [])
+
+
+class CommitHooksMiddleware(object):
+
+    """
+        Runs the functions given to on_commit after the views that commit with
+        transaction.commit_on_success (the views of the REST API). A view that fails
+        rolls back its transaction, so its functions are dropped.
+    """
+
+    def process_request(self, request):
+        start_batch()
+
+    def process_exception(self, request, exception):
+        discard_batch()
+
+    def process_response(self, request, response):
+        if response.status_code < 400:
+            run_batch()
+        else:
+            discard_batch()
+        return response
@@ -0,0 +1,134 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+
+# Maximum number of compiled templates kept by the process
+MAX_TEMPLATES = 256
+
+# {(path, keys): (mtime, size, ConfigTemplate)}
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+class ConfigTemplate(object):
+
+    '''Template of equipment configuration (rack scripts, ACLs) split in literal
+    texts and variables.
+
+    The template is tokenized once, for a given set of variable names, and then
+    each render is a single join of the pieces, whatever the number of
+    variables is. A variable is any occurrence of its name in the text; when
+    names overlap the longest one wins.
+    '''
+
+    def __init__(self, content, keys):
+        '''
+        @param content: Text of the template.
+        @param keys: Names of the variables.
+        '''
+        self.keys = frozenset(keys)
+        keys = sorted((key for key in self.keys if key), key=len, reverse=True)
+        if keys:
+            # Odd positions of the split are the variables
+            self.pieces = re.split('(%s)' % '|'.join(re.escape(key) for key in keys), content)
+        else:
+            self.pieces = [content]
+
+    def render(self, variables):
+        '''Returns the text of the template with the variables replaced by their values.
+
+        @param variables: Dict with the value of each variable of the template.
+        '''
+        pieces = list(self.pieces)
+        for i in xrange(1, len(pieces), 2):
+            pieces[i] = variables[pieces[i]]
+        return ''.join(pieces)
+
+
+def load_template(path, keys):
+    '''Returns the template of the file compiled for the variables, reusing the
+    compiled one while the file is not modified.
+
+    @param path: Path of the template file.
+    @param keys: Names of the variables.
+
+    @raise IOError, OSError: The file can not be read.
+    '''
+    path = os.path.abspath(path)
+    keys = frozenset(keys)
+    stat = os.stat(path)
+
+    entry = _templates.get((path, keys))
+    if entry is not None and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+        return entry[2]
+
+    with open(path, 'r') as template_file:
+        template = ConfigTemplate(template_file.read(), keys)
+
+    with _templates_lock:
+        if len(_templates) >= MAX_TEMPLATES:
+            _templates.clear()
+        _templates[(path, keys)] = (stat.st_mtime, stat.st_size, template)
+    return template
+
+
+def render_file(path, variables):
+    '''Returns the text of the template file with the variables replaced.
+
+    @param path: Path of the template file.
+    @param variables: Dict with the value of each variable.
+    '''
+    return load_template(path, variables.keys()).render(variables)
+
+
+def _render_config(config):
+    path, output, variables = config
+    text = render_file(path, variables)
+    if output is not None:
+        with open(output, 'w') as output_file:
+            output_file.write(text)
+    return text
+
+
+def render_files(configs, workers=None):
+    '''Renders many configurations in one call, compiling each template once.
+
+    @param configs: List of (template path, output path, variables). When the
+        output path is None the text is only returned.
+    @param workers: Number of threads rendering and writing the files, one
+        thread when None.
+
+    @return: List with the text of each configuration, in the same order.
+
+    @raise IOError, OSError: A template can not be read or an output can not be written.
+    '''
+    configs = list(configs)
+    if not workers or workers < 2 or len(configs) < 2:
+        return [_render_config(config) for config in configs]
+
+    pool = ThreadPool(min(workers, len(configs)))
+    try:
+        return pool.map(_render_config, configs)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,172 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+from types import GeneratorType
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+XML = 'xml'
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+CONTENT_TYPES = {
+    JSON: 'application/json',
+    MSGPACK: 'application/x-msgpack',
+}
+
+_MEDIA_TYPES = {
+    'application/json': JSON,
+    'application/x-msgpack': MSGPACK,
+    'application/msgpack': MSGPACK,
+    'application/xml': XML,
+    'text/xml': XML,
+    'text/plain': XML,
+    '*/*': XML,
+}
+
+# Formats of the request being handled by the thread
+_current = threading.local()
+
+
+class FormattedContent(str):
+
+    """Map encoded in JSON or msgpack, with the content type to be used in the response."""
+
+    def __new__(cls, data, format):
+        content = str.__new__(cls, data)
+        content.content_type = CONTENT_TYPES[format]
+        return content
+
+
+def _media_format(media_type):
+    format = _MEDIA_TYPES.get(media_type)
+    if format == MSGPACK and msgpack is None:
+        return None
+    return format
+
+
+def negotiate(accept):
+    """
+    Returns the format of the response for the Accept header: the supported
+    media type with the highest quality, XML when there is none.
+    """
+    best, best_quality = XML, 0.0
+    for media_range in (accept or '').split(','):
+        params = media_range.split(';')
+        format = _media_format(params[0].strip().lower())
+        if format is None:
+            continue
+        quality = 1.0
+        for param in params[1:]:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > best_quality:
+            best, best_quality = format, quality
+    return best
+
+
+def content_format(request):
+    """Returns the format of the request body, from its Content-Type header."""
+    content_type = request.META.get('CONTENT_TYPE', '').split(';')[0].strip().lower()
+    return _media_format(content_type) or XML
+
+
+def activate(request):
+    """Chooses the formats of the request and of its response, from its headers."""
+    _current.response = negotiate(request.META.get('HTTP_ACCEPT'))
+    _current.request = content_format(request)
+
+
+def deactivate():
+    _current.response = _current.request = XML
+
+
+def response_format():
+    return getattr(_current, 'response', XML)
+
+
+def request_format():
+    return getattr(_current, 'request', XML)
+
+
+def _default(obj):
+    if isinstance(obj, GeneratorType):
+        return list(obj)
+    return unicode(obj)
+
+
+def dumps(map, root_name, format):
+    """
+    Encodes the map in JSON or msgpack, under the root_name key, with the same
+    structure given to the XML.
+    """
+    document = {root_name: map}
+    if format == MSGPACK:
+        return FormattedContent(msgpack.packb(document, default=_default), format)
+    return FormattedContent(json.dumps(document, default=_default, separators=(',', ':')), format)
+
+
+def _normalize_value(value, force_list):
+    if isinstance(value, dict):
+        value = dict((key, _normalize(child, key, force_list)) for key, child in value.iteritems())
+        return value or None
+    if value is None or value == '':
+        return None
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return unicode(value)
+
+
+def _normalize(value, name, force_list):
+    # Same values loads gives for XML: texts, None for empty, lists for the force_list tags
+    if isinstance(value, list):
+        value = [_normalize_value(child, force_list) for child in value]
+        if not value and name not in force_list:
+            return None
+        return value
+    value = _normalize_value(value, force_list)
+    if name in force_list:
+        return [value] if value is not None else []
+    return value
+
+
+def loads(data, format, force_list=None):
+    """
+    Decodes a JSON or msgpack request body into the same (map, attributes) that
+    loads gives for an XML one.
+    """
+    if force_list is None:
+        force_list = []
+    if format == MSGPACK:
+        document = msgpack.unpackb(data)
+    else:
+        document = json.loads(data)
+    if not isinstance(document, dict):
+        raise ValueError(u'The document must be an object.')
+    return _normalize(document, None, force_list) or dict(), dict()
@@ -0,0 +1,126 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Number of bits counted at once by AddressBitmap.nth_free
+_CHUNK_BITS = 4096
+
+
+class AddressBitmap(object):
+
+    '''Bitmap of the used addresses of a network.
+
+    Bit N is set when the address "network + N" is in use. It works the same
+    way for other small numbering spaces, like VLAN numbers. The bits are kept
+    in a single long, so searching a free address is done by long arithmetic,
+    one machine word at a time, instead of walking the hosts one by one.
+    '''
+
+    def __init__(self, size, bits=0L):
+        '''
+        @param size: Number of addresses of the network (including network and broadcast).
+        @param bits: Initial bitmap.
+        '''
+        self.size = size
+        self.bits = bits
+
+    @classmethod
+    def from_offsets(cls, size, offsets):
+        '''Builds a bitmap with the given offsets marked as used.
+
+        Offsets out of the network are ignored.
+        '''
+        bits = 0L
+        for offset in offsets:
+            if 0 <= offset < size:
+                bits |= 1L << offset
+        return cls(size, bits)
+
+    def mark(self, offset):
+        if 0 <= offset < self.size:
+            self.bits |= 1L << offset
+
+    def unmark(self, offset):
+        if 0 <= offset < self.size:
+            self.bits &= ~(1L << offset)
+
+    def is_used(self, offset):
+        return bool((self.bits >> offset) & 1)
+
+    def _free_window(self, low, high):
+        '''Returns the free bits of [low, high] shifted to start at bit 0, or None if the window is empty.'''
+        low = max(low, 0)
+        high = min(high, self.size - 1)
+        if high < low:
+            return None
+        return ~(self.bits >> low) & ((1L << (high - low + 1)) - 1)
+
+    def first_free(self, low, high):
+        '''Returns the lowest free offset in [low, high], or None if all of them are used.'''
+        free = self._free_window(low, high)
+        if not free:
+            return None
+        return max(low, 0) + (free & -free).bit_length() - 1
+
+    def last_free(self, low, high):
+        '''Returns the highest free offset in [low, high], or None if all of them are used.'''
+        free = self._free_window(low, high)
+        if not free:
+            return None
+        return max(low, 0) + free.bit_length() - 1
+
+    def free_count(self, low, high):
+        '''Returns the number of free offsets in [low, high].'''
+        free = self._free_window(low, high)
+        if not free:
+            return 0
+        return bin(free).count('1')
+
+    def free_offsets(self, low, high, limit=None):
+        '''Returns the free offsets in [low, high] in ascending order, at most limit of them.'''
+        found = []
+        free = self._free_window(low, high)
+        base = max(low, 0)
+        while free and (limit is None or len(found) < limit):
+            lowest = free & -free
+            found.append(base + lowest.bit_length() - 1)
+            free ^= lowest
+        return found
+
+    def nth_free(self, n, low, high):
+        '''Returns the n-th (starting at 0) free offset in [low, high], or None if there are not enough free offsets.'''
+        free = self._free_window(low, high)
+        if not free or n < 0:
+            return None
+
+        base = max(low, 0)
+        mask = (1L << _CHUNK_BITS) - 1
+
+        # Skips whole chunks while they have fewer free bits than needed
+        while free:
+            chunk = free & mask
+            count = bin(chunk).count('1') if chunk else 0
+            if n < count:
+                while n > 0:
+                    chunk &= chunk - 1
+                    n -= 1
+                return base + (chunk & -chunk).bit_length() - 1
+            n -= count
+            free >>= _CHUNK_BITS
+            base += _CHUNK_BITS
+
+        return None
@@ -0,0 +1,168 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from bisect import bisect_right
+
+
+class RangeAllocator(object):
+
+    '''Sorted list of the occupied ranges of an address space.
+
+    Addresses are integers (128 bits for IPv6). Adjacent and overlapping ranges
+    are merged, so the address right after an occupied range is always free
+    and the next free address is found with one binary search.
+    '''
+
+    def __init__(self, ranges=None):
+        '''
+        @param ranges: List of sorted, disjoint and non adjacent (start, end) tuples.
+        '''
+        self.starts = []
+        self.ends = []
+        for start, end in ranges or []:
+            self.starts.append(start)
+            self.ends.append(end)
+
+    @classmethod
+    def from_addresses(cls, addresses):
+        '''Builds the occupied ranges from a list of used addresses.'''
+        ranges = []
+        for address in sorted(set(addresses)):
+            if ranges and ranges[-1][1] + 1 == address:
+                ranges[-1][1] = address
+            else:
+                ranges.append([address, address])
+        return cls(ranges)
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        '''Builds the occupied ranges from a list of (start, end) tuples, in any order and possibly overlapping.'''
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return cls(merged)
+
+    @property
+    def ranges(self):
+        return zip(self.starts, self.ends)
+
+    def _find(self, address):
+        '''Returns the index of the range that contains address, or -1.'''
+        i = bisect_right(self.starts, address) - 1
+        if i >= 0 and self.ends[i] >= address:
+            return i
+        return -1
+
+    def is_used(self, address):
+        return self._find(address) >= 0
+
+    def add(self, start, end=None):
+        '''Marks the range [start, end] as occupied.'''
+        if end is None:
+            end = start
+
+        # Ranges that overlap or touch [start, end] are merged into it
+        i = bisect_right(self.starts, start - 1) - 1
+        if i < 0 or self.ends[i] < start - 1:
+            i += 1
+        j = bisect_right(self.starts, end + 1)
+
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def remove(self, address):
+        '''Marks address as free.'''
+        i = self._find(address)
+        if i < 0:
+            return
+
+        start, end = self.starts[i], self.ends[i]
+        pieces = []
+        if start < address:
+            pieces.append((start, address - 1))
+        if address < end:
+            pieces.append((address + 1, end))
+
+        self.starts[i:i + 1] = [piece[0] for piece in pieces]
+        self.ends[i:i + 1] = [piece[1] for piece in pieces]
+
+    def first_free(self, low, high):
+        '''Returns the lowest free address in [low, high], or None if all of them are used.'''
+        i = self._find(low)
+        address = low if i < 0 else self.ends[i] + 1
+        if address > high:
+            return None
+        return address
+
+    def last_free(self, low, high):
+        '''Returns the highest free address in [low, high], or None if all of them are used.'''
+        i = self._find(high)
+        address = high if i < 0 else self.starts[i] - 1
+        if address < low:
+            return None
+        return address
+
+    def take(self, quantity, low, high):
+        '''Returns up to quantity free addresses in [low, high], in ascending order.
+
+        The addresses are not marked as occupied. The gaps between the occupied
+        ranges are walked once, so the cost does not depend on how many
+        addresses are used before low.
+        '''
+        found = []
+        address = self.first_free(low, high)
+        if address is None:
+            return found
+
+        i = bisect_right(self.starts, address)
+        while len(found) < quantity and address <= high:
+            gap_end = high
+            if i < len(self.starts):
+                gap_end = min(high, self.starts[i] - 1)
+
+            count = min(quantity - len(found), gap_end - address + 1)
+            found.extend([address + offset for offset in range(count)])
+            if i >= len(self.starts):
+                break
+            address = self.ends[i] + 1
+            i += 1
+
+        return found
+
+    def first_free_block(self, size, low, high):
+        '''Returns the start of the first free block of size addresses inside [low, high],
+        or None if there is none.
+
+        Blocks are aligned to their size, like the subnets of a network, and
+        each occupied range that overlaps a candidate block makes the search
+        jump straight to the first aligned block after it.
+        '''
+        start = low + (-low % size)
+        while start + size - 1 <= high:
+            i = bisect_right(self.starts, start + size - 1) - 1
+            if i < 0 or self.ends[i] < start:
+                return start
+            following = self.ends[i] + 1
+            start = following + (-following % size)
+        return None
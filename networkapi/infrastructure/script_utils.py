@@ -17,10 +17,20 @@
 
 
 import os
+import re
+import shlex
+import signal
+import threading
+import time
 
 from subprocess import Popen, PIPE, STDOUT
+from threading import Timer
 
-from networkapi.settings import SCRIPTS_DIR
+from networkapi.settings import SCRIPTS_DIR, SCRIPT_TIMEOUT, SCRIPT_MAX_CONCURRENCY
+
+
+# Comandos com estes caracteres precisam do shell para serem interpretados
+_SHELL_CHARS = re.compile(r'[|&;<>()$`*?\[\]{}~\n]')
 
 
 class ScriptError(Exception):
@@ -37,8 +47,140 @@ class ScriptError(Exception):
         return msg.encode('utf-8', 'replace')
 
 
-def exec_script(command):
+class ScriptResult(tuple):
+
+    """Resultado de um script: tupla (código de retorno, saída padrão, saída de erro),
+    com o tempo de execução e se o script foi morto por timeout."""
+
+    def __new__(cls, code, stdout, stderr, elapsed=0.0, timed_out=False):
+        result = tuple.__new__(cls, (code, stdout, stderr))
+        result.elapsed = elapsed
+        result.timed_out = timed_out
+        return result
+
+    code = property(lambda self: self[0])
+    stdout = property(lambda self: self[1])
+    stderr = property(lambda self: self[2])
+
+
+class ScriptExecutor(object):
+
+    """Executa os scripts do diretório de scripts.
+
+    O script é executado diretamente, sem um /bin/sh intermediário, a não ser
+    que o comando use recursos do shell (pipes, redirecionamentos, variáveis).
+    O número de scripts rodando ao mesmo tempo no processo é limitado, e o
+    script que passa do timeout é morto, junto com os processos que ele criou.
+    """
+
+    def __init__(self, scripts_dir, timeout=None, max_concurrency=None):
+        """
+        @param scripts_dir: Diretório dos scripts.
+        @param timeout: Tempo máximo padrão de cada script, em segundos.
+        @param max_concurrency: Número máximo de scripts rodando ao mesmo tempo.
+        """
+        self.scripts_dir = scripts_dir
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    def args(self, command):
+        """Retorna os argumentos do Popen: a lista de argumentos, ou a string se o comando precisa do shell."""
+        if _SHELL_CHARS.search(command):
+            return self.scripts_dir + os.sep + command, True
+        args = shlex.split(command.encode('utf-8') if isinstance(command, unicode) else command)
+        args[0] = self.scripts_dir + os.sep + args[0]
+        return args, False
+
+    def run(self, command, timeout=None):
+        """Executa o comando e retorna um ScriptResult.
+
+        @param command: Script e seus argumentos.
+        @param timeout: Tempo máximo em segundos, o timeout do executor quando None.
+
+        @raise ScriptError: O comando é inválido.
+        """
+        try:
+            args, shell = self.args(command)
+        except (ValueError, IndexError), v:
+            raise ScriptError(v, u'Falha ao executar o comando %s.' % command)
+        if timeout is None:
+            timeout = self.timeout
+
+        if self.slots is not None:
+            self.slots.acquire()
+        try:
+            return self._run(command, args, shell, timeout)
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+
+    def _run(self, command, args, shell, timeout):
+        start = time.time()
+        try:
+            p = Popen(args, stdout=PIPE, stderr=PIPE, shell=shell, preexec_fn=os.setpgrp)
+        except OSError, o:
+            return ScriptResult(o.args[0], '', o.args[1])
+        except ValueError, v:
+            raise ScriptError(v, u'Falha ao executar o comando %s.' % command)
+
+        killed = []
+        timer = None
+        if timeout:
+            timer = Timer(timeout, self._kill, (p, killed))
+            timer.start()
+        try:
+            child_stdout, child_stderr = p.communicate()
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        child_stdout = unicode(child_stdout, 'utf-8', 'replace')
+        child_stderr = unicode(child_stderr, 'utf-8', 'replace')
+        if killed:
+            child_stderr += u'\nScript morto após %s segundos.' % timeout
+
+        return ScriptResult(p.returncode, child_stdout, child_stderr, time.time() - start, bool(killed))
+
+    def _kill(self, p, killed):
+        if p.returncode is not None:
+            return
+        killed.append(True)
+        try:
+            # O script roda em um grupo de processos próprio, criado no Popen. Matar o
+            # grupo mata também o /bin/sh, quando há um, e os processos criados pelo script,
+            # que de outra forma manteriam as saídas abertas e o communicate esperando
+            os.killpg(p.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+_executor = [None]
+_executor_lock = threading.Lock()
+
 
+def get_executor():
+    """Retorna o executor de scripts do processo."""
+    if _executor[0] is None:
+        with _executor_lock:
+            if _executor[0] is None:
+                _executor[0] = ScriptExecutor(SCRIPTS_DIR, SCRIPT_TIMEOUT, SCRIPT_MAX_CONCURRENCY)
+    return _executor[0]
+
+
+def exec_script(command, timeout=None):
+    """Executa um script do diretório de scripts.
+
+    @param command: Script e seus argumentos.
+    @param timeout: Tempo máximo em segundos, SCRIPT_TIMEOUT quando None. Se o
+        script não terminar antes, é morto e o código de retorno é diferente de zero.
+
+    @return: ScriptResult, que é a tupla (código de retorno, saída padrão, saída de erro).
+    """
+    return get_executor().run(command, timeout)
+
+
+def exec_script_shell(command):
+    """Executa o script por um /bin/sh, sem timeout nem limite. Usado para comparação com o executor."""
     try:
 
         command = SCRIPTS_DIR + os.sep + command
@@ -56,6 +198,16 @@ def exec_script(command):
         raise ScriptError(v, u'Falha ao executar o comando %s.' % command)
 
 
+def benchmark(command, calls=100):
+    """Compara o tempo de calls execuções do comando pelo shell e pelo executor."""
+    for name, function in (('shell', exec_script_shell), ('executor', exec_script)):
+        start = time.time()
+        for i in xrange(calls):
+            function(command)
+        elapsed = time.time() - start
+        print '%-8s %d chamadas em %.3fs (%.2fms por chamada)' % (name, calls, elapsed, elapsed * 1000 / calls)
+
+
 if __name__ == '__main__':
 
     print os.path.realpath(__file__ + "/../../../../scripts/") + os.sep + 'gerador_vips'
@@ -64,3 +216,5 @@ if __name__ == '__main__':
     print code
     print 'out=' + stdout
     print 'err=' + stderr
+
+    benchmark('configurador teste')
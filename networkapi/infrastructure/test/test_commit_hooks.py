@@ -0,0 +1,110 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from unittest import TestCase
+
+from mock import patch
+
+from networkapi.infrastructure import commit_hooks
+
+
+class CommitHooksTestCase(TestCase):
+
+    def setUp(self):
+        self.called = []
+
+    def tearDown(self):
+        commit_hooks.discard_batch()
+
+    def hook(self):
+        self.called.append(len(self.called))
+
+    def test_without_batch_calls_at_once(self):
+        commit_hooks.discard_batch()
+        commit_hooks.on_commit(self.hook)
+        self.assertEqual([0], self.called)
+
+    def test_batch_calls_after_commit(self):
+        commit_hooks.start_batch()
+        commit_hooks.on_commit(self.hook)
+        commit_hooks.on_commit(self.hook)
+        self.assertEqual([], self.called)
+
+        commit_hooks.run_batch()
+        self.assertEqual([0, 1], self.called)
+
+        # The batch is over, so the next hook runs at once
+        commit_hooks.on_commit(self.hook)
+        self.assertEqual([0, 1, 2], self.called)
+
+    def test_commit_in_the_middle_of_the_batch(self):
+        commit_hooks.start_batch()
+        commit_hooks.on_commit(self.hook)
+        commit_hooks.transaction_committed()
+        self.assertEqual([0], self.called)
+
+        # The batch is still open for the rest of the request
+        commit_hooks.on_commit(self.hook)
+        self.assertEqual([0], self.called)
+        commit_hooks.discard_batch()
+        self.assertEqual([0], self.called)
+
+    def test_discarded_batch_is_not_called(self):
+        commit_hooks.start_batch()
+        commit_hooks.on_commit(self.hook)
+        commit_hooks.discard_batch()
+        commit_hooks.run_batch()
+        self.assertEqual([], self.called)
+
+    def test_transaction_end_hooks_run_on_rollback(self):
+        self.assertFalse(commit_hooks.on_transaction_end(self.hook))
+
+        commit_hooks.start_batch()
+        commit_hooks.on_commit(self.hook)
+        self.assertTrue(commit_hooks.on_transaction_end(self.hook))
+        commit_hooks.discard_batch()
+        self.assertEqual([0], self.called)
+
+    @patch.object(commit_hooks, 'log')
+    def test_failing_hook_does_not_stop_the_others(self, log):
+        def fail():
+            raise ValueError('fail')
+
+        commit_hooks.start_batch()
+        commit_hooks.on_commit(fail)
+        commit_hooks.on_commit(self.hook)
+        commit_hooks.run_batch()
+        self.assertEqual([0], self.called)
+        self.assertEqual(1, log.error.call_count)
+
+    def test_middleware_drops_hooks_of_failed_responses(self):
+        class Response(object):
+            def __init__(self, status_code):
+                self.status_code = status_code
+
+        middleware = commit_hooks.CommitHooksMiddleware()
+
+        middleware.process_request(None)
+        commit_hooks.on_commit(self.hook)
+        middleware.process_response(None, Response(500))
+        self.assertEqual([], self.called)
+
+        middleware.process_request(None)
+        commit_hooks.on_commit(self.hook)
+        middleware.process_response(None, Response(200))
+        self.assertEqual([0], self.called)
@@ -0,0 +1,92 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from networkapi.infrastructure import config_template
+from networkapi.infrastructure.config_template import ConfigTemplate, load_template, render_file, render_files
+
+
+class ConfigTemplateTestCase(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as template_file:
+            template_file.write(content)
+        return path
+
+    def test_render(self):
+        template = ConfigTemplate('hostname HOST\ninterface IFACE\n description HOST\n', ['HOST', 'IFACE'])
+        self.assertEqual('hostname sw1\ninterface eth0\n description sw1\n',
+                         template.render({'HOST': 'sw1', 'IFACE': 'eth0'}))
+
+    def test_longest_name_wins(self):
+        template = ConfigTemplate('VLAN VLAN_ID', ['VLAN', 'VLAN_ID'])
+        self.assertEqual('v 10', template.render({'VLAN': 'v', 'VLAN_ID': '10'}))
+
+    def test_values_are_not_replaced_again(self):
+        template = ConfigTemplate('A B', ['A', 'B'])
+        self.assertEqual('B A', template.render({'A': 'B', 'B': 'A'}))
+
+    def test_names_are_literal(self):
+        template = ConfigTemplate('x.y xzy', ['x.y'])
+        self.assertEqual('1 xzy', template.render({'x.y': '1'}))
+
+    def test_without_variables(self):
+        self.assertEqual('text', ConfigTemplate('text', []).render({}))
+        self.assertEqual('text', ConfigTemplate('text', ['']).render({'': 'x'}))
+
+    def test_load_template_reuses_the_compiled_template(self):
+        path = self._write('rack.txt', 'NAME')
+        template = load_template(path, ['NAME'])
+        self.assertTrue(template is load_template(path, ['NAME']))
+        self.assertFalse(template is load_template(path, ['NAME', 'OTHER']))
+
+    def test_load_template_reads_the_modified_file(self):
+        path = self._write('rack.txt', 'NAME')
+        self.assertEqual('a', render_file(path, {'NAME': 'a'}))
+        self._write('rack.txt', 'NAME NAME')
+        os.utime(path, (0, 0))
+        self.assertEqual('a a', render_file(path, {'NAME': 'a'}))
+
+    def test_cache_is_bounded(self):
+        self.addCleanup(setattr, config_template, 'MAX_TEMPLATES', config_template.MAX_TEMPLATES)
+        config_template.MAX_TEMPLATES = 2
+        for n in range(5):
+            render_file(self._write('t%d.txt' % n, 'N'), {'N': str(n)})
+        self.assertTrue(len(config_template._templates) <= 2)
+
+    def test_missing_file(self):
+        self.assertRaises((IOError, OSError), render_file, os.path.join(self.dir, 'missing.txt'), {})
+
+    def test_render_files(self):
+        path = self._write('acl.txt', 'permit NET')
+        configs = [(path, os.path.join(self.dir, 'out%d.txt' % n), {'NET': '10.0.%d.0/24' % n}) for n in range(4)]
+        configs.append((path, None, {'NET': 'any'}))
+        for workers in (None, 3):
+            texts = render_files(configs, workers)
+            self.assertEqual(['permit 10.0.%d.0/24' % n for n in range(4)] + ['permit any'], texts)
+            for n in range(4):
+                with open(os.path.join(self.dir, 'out%d.txt' % n)) as output:
+                    self.assertEqual(texts[n], output.read())
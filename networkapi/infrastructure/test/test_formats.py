@@ -0,0 +1,72 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from unittest import TestCase, skipIf
+
+from networkapi.infrastructure import formats, xml_utils
+
+
+# Maps as sent by the clients, and the force_list given to loads
+PARITY_CASES = [
+    ({'vlan': {'id': 1, 'nome': 'VLAN_1'}}, None),
+    ({'vlan': {'id': 1, 'descricao': ''}}, None),
+    ({'vlan': {'id': 1, 'descricao': None}}, None),
+    ({'vlan': {'id': 1, 'ambiente': {}}}, None),
+    ({'ip': [{'id': 1}, {'id': 2}]}, None),
+    ({'ip': {'id': 1}}, ['ip']),
+    ({'ip': [{'id': 1}]}, ['ip']),
+    ({'id': ['1', '2']}, None),
+    ({'id': 1}, ['id']),
+    ({'id': ''}, ['id']),
+    ({'id': None}, ['id']),
+    ({'ip': []}, ['ip']),
+    ({'vlan': {'redes': {'rede': {'id': 1}}}}, ['rede']),
+    ({'nome': u'Ação', 'ativo': True, 'valor': 1.5}, None),
+]
+
+
+class FormatsTestCase(TestCase):
+
+    def test_negotiate(self):
+        self.assertEqual(formats.XML, formats.negotiate(None))
+        self.assertEqual(formats.XML, formats.negotiate('text/html'))
+        self.assertEqual(formats.JSON, formats.negotiate('application/json'))
+        self.assertEqual(formats.XML, formats.negotiate('application/json;q=0.5, application/xml'))
+        self.assertEqual(formats.JSON, formats.negotiate('application/xml;q=0.2, application/json;q=0.9'))
+
+    def test_dumps_json(self):
+        content = formats.dumps({'id': 1, 'ips': (str(n) for n in range(2))}, 'networkapi', formats.JSON)
+        self.assertEqual('application/json', content.content_type)
+        self.assertEqual({'networkapi': {'id': 1, 'ips': ['0', '1']}}, json.loads(content))
+
+    def test_loads_rejects_non_objects(self):
+        self.assertRaises(ValueError, formats.loads, '[1, 2]', formats.JSON)
+
+    def _assert_parity(self, format, encode):
+        for map, force_list in PARITY_CASES:
+            xml_map, xml_attrs = xml_utils.loads(xml_utils.dumps(map, 'networkapi'), force_list)
+            map_loaded, attrs = formats.loads(encode({'networkapi': map}), format, force_list)
+            self.assertEqual(xml_map, map_loaded, map)
+            self.assertEqual(xml_attrs, attrs)
+
+    def test_json_loads_like_xml(self):
+        self._assert_parity(formats.JSON, json.dumps)
+
+    @skipIf(formats.msgpack is None, 'msgpack is not installed')
+    def test_msgpack_loads_like_xml(self):
+        self._assert_parity(formats.MSGPACK, formats.msgpack.packb)
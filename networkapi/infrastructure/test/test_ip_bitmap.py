@@ -0,0 +1,77 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+from unittest import TestCase
+
+from networkapi.infrastructure.ip_bitmap import AddressBitmap
+
+
+class AddressBitmapTestCase(TestCase):
+
+    def setUp(self):
+        self.bitmap = AddressBitmap.from_offsets(16, [0, 1, 2, 5, 15, 20, -1])
+
+    def test_from_offsets_ignores_offsets_out_of_the_network(self):
+        self.assertEqual(sorted([0, 1, 2, 5, 15]), [n for n in range(16) if self.bitmap.is_used(n)])
+
+    def test_first_and_last_free(self):
+        self.assertEqual(3, self.bitmap.first_free(1, 14))
+        self.assertEqual(14, self.bitmap.last_free(1, 15))
+        self.assertEqual(None, self.bitmap.first_free(0, 2))
+        self.assertEqual(None, self.bitmap.last_free(5, 5))
+        self.assertEqual(None, self.bitmap.first_free(10, 3))
+
+    def test_window_is_clipped_to_the_network(self):
+        self.assertEqual(3, self.bitmap.first_free(-10, 100))
+        self.assertEqual(14, self.bitmap.last_free(-10, 100))
+
+    def test_mark_and_unmark(self):
+        self.bitmap.mark(3)
+        self.assertEqual(4, self.bitmap.first_free(0, 15))
+        self.bitmap.unmark(0)
+        self.assertEqual(0, self.bitmap.first_free(0, 15))
+        self.bitmap.mark(16)
+        self.assertEqual(16, self.bitmap.size)
+        self.assertFalse(self.bitmap.is_used(16))
+
+    def test_free_count_and_offsets(self):
+        self.assertEqual(11, self.bitmap.free_count(0, 15))
+        self.assertEqual([3, 4, 6], self.bitmap.free_offsets(0, 15, limit=3))
+        self.assertEqual([12, 13, 14], self.bitmap.free_offsets(12, 15))
+        self.assertEqual([], self.bitmap.free_offsets(0, 2))
+
+    def test_nth_free(self):
+        self.assertEqual(3, self.bitmap.nth_free(0, 0, 15))
+        self.assertEqual(6, self.bitmap.nth_free(2, 0, 15))
+        self.assertEqual(14, self.bitmap.nth_free(10, 0, 15))
+        self.assertEqual(None, self.bitmap.nth_free(11, 0, 15))
+        self.assertEqual(None, self.bitmap.nth_free(-1, 0, 15))
+
+    def test_matches_a_walk_over_the_hosts(self):
+        rand = random.Random(7)
+        size = 3 * 4096 + 100
+        used = set(rand.sample(xrange(size), size - 300))
+        bitmap = AddressBitmap.from_offsets(size, used)
+        free = [n for n in xrange(1, size - 1) if n not in used]
+
+        self.assertEqual(free[0], bitmap.first_free(1, size - 2))
+        self.assertEqual(free[-1], bitmap.last_free(1, size - 2))
+        self.assertEqual(len(free), bitmap.free_count(1, size - 2))
+        self.assertEqual(free, bitmap.free_offsets(1, size - 2))
+        for n in (0, 1, 150, len(free) - 1):
+            self.assertEqual(free[n], bitmap.nth_free(n, 1, size - 2))
@@ -0,0 +1,93 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+from unittest import TestCase
+
+from networkapi.infrastructure.ip_ranges import RangeAllocator
+
+
+def _first_fit(used, size, low, high):
+    # Subnets in the order iter_subnets gives them, checked against every used address
+    start = low + (-low % size)
+    while start + size - 1 <= high:
+        if not any(start <= address < start + size for address in used):
+            return start
+        start += size
+    return None
+
+
+class RangeAllocatorTestCase(TestCase):
+
+    def test_from_addresses_merges_adjacent_addresses(self):
+        allocator = RangeAllocator.from_addresses([5, 3, 4, 9, 4, 10])
+        self.assertEqual([(3, 5), (9, 10)], allocator.ranges)
+
+    def test_from_ranges_merges_overlapping_and_adjacent_ranges(self):
+        allocator = RangeAllocator.from_ranges([(10, 20), (0, 4), (5, 6), (15, 30), (40, 41)])
+        self.assertEqual([(0, 6), (10, 30), (40, 41)], allocator.ranges)
+
+    def test_add(self):
+        allocator = RangeAllocator.from_ranges([(0, 4), (10, 14), (20, 24)])
+        allocator.add(7)
+        self.assertEqual([(0, 4), (7, 7), (10, 14), (20, 24)], allocator.ranges)
+        allocator.add(5, 6)
+        self.assertEqual([(0, 7), (10, 14), (20, 24)], allocator.ranges)
+        allocator.add(12, 21)
+        self.assertEqual([(0, 7), (10, 24)], allocator.ranges)
+        allocator.add(30, 31)
+        self.assertEqual([(0, 7), (10, 24), (30, 31)], allocator.ranges)
+
+    def test_remove(self):
+        allocator = RangeAllocator.from_ranges([(0, 4), (10, 10)])
+        allocator.remove(2)
+        self.assertEqual([(0, 1), (3, 4), (10, 10)], allocator.ranges)
+        allocator.remove(10)
+        allocator.remove(0)
+        allocator.remove(7)
+        self.assertEqual([(1, 1), (3, 4)], allocator.ranges)
+
+    def test_first_and_last_free(self):
+        allocator = RangeAllocator.from_ranges([(0, 4), (6, 9)])
+        self.assertEqual(5, allocator.first_free(0, 20))
+        self.assertEqual(10, allocator.first_free(6, 20))
+        self.assertEqual(None, allocator.first_free(6, 9))
+        self.assertEqual(20, allocator.last_free(0, 20))
+        self.assertEqual(5, allocator.last_free(0, 9))
+        self.assertEqual(None, allocator.last_free(0, 4))
+
+    def test_take(self):
+        allocator = RangeAllocator.from_ranges([(0, 4), (6, 9), (12, 12)])
+        self.assertEqual([5, 10, 11, 13, 14], allocator.take(5, 0, 20))
+        self.assertEqual([10, 11], allocator.take(5, 10, 12))
+        self.assertEqual([], allocator.take(5, 6, 9))
+        self.assertEqual([2 ** 100], RangeAllocator().take(1, 2 ** 100, 2 ** 101))
+
+    def test_first_free_block(self):
+        allocator = RangeAllocator.from_ranges([(0, 4), (16, 16)])
+        self.assertEqual(8, allocator.first_free_block(8, 0, 63))
+        self.assertEqual(32, allocator.first_free_block(16, 0, 63))
+        self.assertEqual(None, allocator.first_free_block(64, 0, 63))
+        self.assertEqual(None, allocator.first_free_block(32, 0, 40))
+
+    def test_first_free_block_matches_first_fit(self):
+        rand = random.Random(3)
+        for _ in range(50):
+            used = rand.sample(xrange(1024), rand.randint(0, 200))
+            allocator = RangeAllocator.from_addresses(used)
+            for size in (1, 4, 32, 128):
+                self.assertEqual(_first_fit(used, size, 0, 1023), allocator.first_free_block(size, 0, 1023))
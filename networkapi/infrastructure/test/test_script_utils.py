@@ -0,0 +1,130 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from networkapi.infrastructure.script_utils import ScriptExecutor, ScriptError
+
+
+def _is_running(pid):
+    try:
+        with open('/proc/%d/stat' % pid) as proc_stat:
+            return proc_stat.read().split(')')[-1].split()[0] != 'Z'
+    except IOError:
+        return False
+
+
+class ScriptsTestCase(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _script(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as script:
+            script.write(content)
+        os.chmod(path, stat.S_IRWXU)
+
+
+class ScriptExecutorTestCase(ScriptsTestCase):
+
+    def setUp(self):
+        super(ScriptExecutorTestCase, self).setUp()
+        self._script('echo_args', '#!/bin/sh\nfor arg in "$@"; do echo "$arg"; done\necho erro >&2\nexit 3\n')
+        self.executor = ScriptExecutor(self.dir)
+
+    def test_args_without_shell(self):
+        self.assertEqual(([self.dir + os.sep + 'gerador_vips', '--pool', 'a b'], False),
+                         self.executor.args(u"gerador_vips --pool 'a b'"))
+
+    def test_args_with_shell(self):
+        for command in ('script > /tmp/out', 'script | grep x', 'script $HOME', 'script; other'):
+            self.assertEqual((self.dir + os.sep + command, True), self.executor.args(command))
+
+    def test_run(self):
+        result = self.executor.run("echo_args 1 'dois tres'")
+        self.assertEqual((3, u'1\ndois tres\n', u'erro\n'), result)
+        self.assertEqual(3, result.code)
+        self.assertFalse(result.timed_out)
+        self.assertTrue(result.elapsed >= 0)
+
+    def test_run_with_shell(self):
+        self.assertEqual((0, u'2\n', u'erro\n'), self.executor.run('echo_args 1 2 | tail -n 1'))
+
+    def test_missing_script(self):
+        code, stdout, stderr = self.executor.run('missing')
+        self.assertNotEqual(0, code)
+        self.assertEqual('', stdout)
+
+    def test_invalid_command(self):
+        self.assertRaises(ScriptError, self.executor.run, "echo_args 'aberto")
+        self.assertRaises(ScriptError, self.executor.run, '')
+
+    def test_concurrency_is_limited(self):
+        self._script('slow', '#!/bin/sh\nsleep 0.3\n')
+        executor = ScriptExecutor(self.dir, max_concurrency=2)
+        threads = [threading.Thread(target=executor.run, args=('slow',)) for _ in range(4)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(time.time() - start >= 0.6)
+
+
+class ScriptTimeoutTestCase(ScriptsTestCase):
+
+    def setUp(self):
+        super(ScriptTimeoutTestCase, self).setUp()
+        self.pid_file = os.path.join(self.dir, 'pid')
+        self._script('spawn', '#!/bin/sh\nsleep 30 &\necho $! > %s\nwait\n' % self.pid_file)
+        self.executor = ScriptExecutor(self.dir)
+
+    def _assert_killed(self, result, start):
+        self.assertTrue(result.timed_out)
+        self.assertNotEqual(0, result.code)
+        self.assertTrue(time.time() - start < 10)
+        with open(self.pid_file) as pid_file:
+            pid = int(pid_file.read())
+        time.sleep(0.1)
+        self.assertFalse(_is_running(pid))
+
+    def test_timeout_kills_the_processes_of_the_script(self):
+        start = time.time()
+        self._assert_killed(self.executor.run('spawn', timeout=0.5), start)
+
+    def test_timeout_kills_the_processes_of_a_shell_command(self):
+        start = time.time()
+        result = self.executor.run('spawn | cat', timeout=0.5)
+        self._assert_killed(result, start)
+
+    def test_default_timeout(self):
+        start = time.time()
+        self._assert_killed(ScriptExecutor(self.dir, timeout=0.5).run('spawn'), start)
+
+    def test_script_that_ends_in_time_is_not_killed(self):
+        self._script('fast', '#!/bin/sh\necho ok\n')
+        result = self.executor.run('fast', timeout=5)
+        self.assertEqual((0, u'ok\n', u''), result)
+        self.assertFalse(result.timed_out)
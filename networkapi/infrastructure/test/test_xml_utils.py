@@ -0,0 +1,51 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from StringIO import StringIO
+from unittest import TestCase
+
+from networkapi.infrastructure import xml_utils
+from networkapi.infrastructure.test.xml_corpus import LOADS_CASES, LOADS_ERROR_CASES, DUMPS_CASES
+from networkapi.infrastructure.xml_utils import XMLError
+
+
+class XMLCorpusTestCase(TestCase):
+
+    def test_loads_matches_minidom(self):
+        for name, xml, force_list, expected in LOADS_CASES:
+            self.assertEqual(expected, xml_utils.loads(xml, force_list), name)
+
+    def test_loads_file_matches_minidom(self):
+        for name, xml, force_list, expected in LOADS_CASES:
+            self.assertEqual(expected, xml_utils.loads(StringIO(xml), force_list), name)
+
+    def test_loads_errors(self):
+        for name, xml in LOADS_ERROR_CASES:
+            self.assertRaises(XMLError, xml_utils.loads, xml)
+
+    def test_dumps_matches_minidom(self):
+        for name, map, root_name, root_attributes, expected in DUMPS_CASES:
+            self.assertEqual(expected, xml_utils.dumps(map, root_name, root_attributes), name)
+
+    def test_iterdumps_chunks_join_to_dumps(self):
+        for name, map, root_name, root_attributes, expected in DUMPS_CASES:
+            self.assertEqual(expected, ''.join(xml_utils.iterdumps(map, root_name, root_attributes)), name)
+
+    def test_round_trip(self):
+        for name, map, root_name, root_attributes, expected in DUMPS_CASES:
+            self.assertEqual(xml_utils.loads(expected), xml_utils.loads(xml_utils.dumps(map, root_name, root_attributes)), name)
@@ -0,0 +1,184 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+'''Compatibility corpus of the networkapi XML codec.
+
+The expected values were recorded from the minidom based loads and dumps that
+xml_utils used before the streaming codec, and must not be changed by hand.
+'''
+
+LOADS_CASES = [
+    ('empty_root',
+     '<networkapi/>',
+     None,
+     ({u'networkapi': None}, {})),
+    ('root_attributes',
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi versao="1.0"><id>1</id></networkapi>',
+     None,
+     ({u'networkapi': {u'id': u'1'}}, {u'versao': u'1.0'})),
+    ('nested_maps',
+     '<networkapi versao="1.0"><vlan><id>3</id><nome>VLAN_3</nome><ambiente><id>7</id></ambiente></vlan></networkapi>',
+     None,
+     ({u'networkapi': {u'vlan': {u'ambiente': {u'id': u'7'}, u'id': u'3', u'nome': u'VLAN_3'}}},
+       {u'versao': u'1.0'})),
+    ('repeated_tags',
+     '<networkapi><ambiente><id>1</id></ambiente><ambiente><id>2</id></ambiente></networkapi>',
+     None,
+     ({u'networkapi': {u'ambiente': [{u'id': u'1'}, {u'id': u'2'}]}}, {})),
+    ('force_list_single',
+     '<networkapi><ambiente><id>1</id></ambiente></networkapi>',
+     ['ambiente'],
+     ({u'networkapi': {u'ambiente': [{u'id': u'1'}]}}, {})),
+    ('force_list_nested',
+     '<networkapi><vlan><rede><id>1</id></rede></vlan></networkapi>',
+     ['rede'],
+     ({u'networkapi': {u'vlan': {u'rede': [{u'id': u'1'}]}}}, {})),
+    ('force_list_text',
+     '<networkapi><id>1</id></networkapi>',
+     ['id'],
+     ({u'networkapi': {u'id': [u'1']}}, {})),
+    ('empty_elements',
+     '<networkapi><equipamento><id ></id></equipamento><equipamento_grupo><id></id></equipamento_grupo></networkapi>',
+     None,
+     ({u'networkapi': {u'equipamento': {u'id': None}, u'equipamento_grupo': {u'id': None}}}, {})),
+    ('self_closing',
+     '<networkapi versao="1.0">\n    <x/>\n</networkapi>\n',
+     None,
+     ({u'networkapi': {u'x': None}}, {u'versao': u'1.0'})),
+    ('indented',
+     '<?xml version="1.0" encoding="UTF-8"?>\n<networkapi versao="1.0">\n<equipamento>\n    <id_tipo_equipamento>1</id_tipo_equipamento>\n    <nome>teste</nome>\n</equipamento>\n</networkapi>',
+     None,
+     ({u'networkapi': {u'equipamento': {u'id_tipo_equipamento': u'1', u'nome': u'teste'}}},
+       {u'versao': u'1.0'})),
+    ('comments',
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi versao="1.0"><!--Comentario--><ambiente><id><!--Comentario--></id></ambiente><ambiente><id>3 2 5</id></ambiente></networkapi>',
+     None,
+     ({u'networkapi': {u'ambiente': [{u'id': None}, {u'id': u'3 2 5'}]}}, {u'versao': u'1.0'})),
+    ('mixed_content',
+     '<networkapi><ambiente><id>3<teste>geovana</teste>2</id></ambiente></networkapi>',
+     None,
+     ({u'networkapi': {u'ambiente': {u'id': [u'3', u'2', {u'teste': u'geovana'}]}}}, {})),
+    ('processing_instruction',
+     '<networkapi><id>1<?pi data?>2</id></networkapi>',
+     None,
+     ({u'networkapi': {u'id': [u'1', u'2']}}, {})),
+    ('cdata',
+     '<networkapi><script><![CDATA[a < b && c]]></script></networkapi>',
+     None,
+     ({u'networkapi': {u'script': u'a < b && c'}}, {})),
+    ('cdata_and_text',
+     '<networkapi><script>x<![CDATA[<y>]]>z</script></networkapi>',
+     None,
+     ({u'networkapi': {u'script': [u'x', u'<y>', u'z']}}, {})),
+    ('entities',
+     '<networkapi><descricao>a &amp; b &lt;c&gt; &quot;d&quot; &#233;</descricao></networkapi>',
+     None,
+     ({u'networkapi': {u'descricao': u'a & b <c> "d" \xe9'}}, {})),
+    ('percent_escape',
+     '<networkapi><descricao>100%% livre</descricao></networkapi>',
+     None,
+     ({u'networkapi': {u'descricao': u'100% livre'}}, {})),
+    ('unicode',
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi><nome>A\xc3\xa7\xc3\xa3o</nome></networkapi>',
+     None,
+     ({u'networkapi': {u'nome': u'A\xe7\xe3o'}}, {})),
+    ('whitespace_text',
+     '<networkapi><nome>  espacos  </nome></networkapi>',
+     None,
+     ({u'networkapi': {u'nome': u'  espacos  '}}, {})),
+    ('namespaces',
+     '<n:networkapi xmlns:n="urn:x"><n:id>1</n:id></n:networkapi>',
+     None,
+     ({u'n:networkapi': {u'n:id': u'1'}}, {u'xmlns:n': u'urn:x'})),
+    ('default_namespace',
+     '<networkapi xmlns="urn:x" versao="1.0"><id>1</id></networkapi>',
+     None,
+     ({u'networkapi': {u'id': u'1'}}, {u'versao': u'1.0', 'xmlns': u'urn:x'})),
+    ('repeated_with_force_list',
+     '<networkapi><ip><id>1</id></ip><ip><id>2</id></ip><vlan><id>4</id></vlan></networkapi>',
+     ['ip', 'vlan'],
+     ({u'networkapi': {u'ip': [{u'id': u'1'}, {u'id': u'2'}], u'vlan': [{u'id': u'4'}]}}, {})),
+    ('list_of_texts',
+     '<networkapi><id>1</id><id>2</id><id>3</id></networkapi>',
+     None,
+     ({u'networkapi': {u'id': [u'1', u'2', u'3']}}, {})),
+]
+
+LOADS_ERROR_CASES = [
+    ('malformed', '<networkapi><id>1</networkapi>'),
+    ('not_xml', 'id=1'),
+    ('two_roots', '<a/><b/>'),
+]
+
+DUMPS_CASES = [
+    ('none_map',
+     None,
+     'networkapi',
+     {'versao': '1.0'},
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi versao="1.0"/>'),
+    ('empty_map',
+     {},
+     'networkapi',
+     None,
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi/>'),
+    ('text_values',
+     {'ativada': True, 'id': 1, 'nome': 'VLAN_1'},
+     'networkapi',
+     {'versao': '1.0'},
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi versao="1.0"><nome>VLAN_1</nome><ativada>True</ativada><id>1</id></networkapi>'),
+    ('none_value',
+     {'id': None},
+     'networkapi',
+     None,
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi><id/></networkapi>'),
+    ('nested_map',
+     {'vlan': {'ambiente': {'id': 7}, 'id': 3}},
+     'networkapi',
+     None,
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi><vlan><ambiente><id>7</id></ambiente><id>3</id></vlan></networkapi>'),
+    ('list_of_maps',
+     {'ambiente': [{'id': None}, {'id': (2, 6)}]},
+     'networkapi',
+     {'versao': '1.0'},
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi versao="1.0"><ambiente><id/></ambiente><ambiente><id>(2, 6)</id></ambiente></networkapi>'),
+    ('list_of_texts',
+     {'id': [1, 2, 3]},
+     'networkapi',
+     None,
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi><id>1</id><id>2</id><id>3</id></networkapi>'),
+    ('empty_list',
+     {'id': []},
+     'networkapi',
+     None,
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi><id></id></networkapi>'),
+    ('escaping',
+     {'descricao': u'a & b <c> "d" 100% livre'},
+     'networkapi',
+     None,
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi><descricao>a &amp; b &lt;c&gt; &quot;d&quot; 100%% livre</descricao></networkapi>'),
+    ('unicode',
+     {'nome': u'A\xe7\xe3o'},
+     'networkapi',
+     None,
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi><nome>A\xc3\xa7\xc3\xa3o</nome></networkapi>'),
+    ('long',
+     {'id': 10L, 'valor': 1.5},
+     'networkapi',
+     None,
+     '<?xml version="1.0" encoding="UTF-8"?><networkapi><id>10</id><valor>1.5</valor></networkapi>'),
+]
@@ -16,10 +16,15 @@
 # limitations under the License.
 
 
-from xml.dom import InvalidCharacterErr
-from xml.dom.minidom import *
+from types import GeneratorType
 from xml.dom.minicompat import StringTypes
+from xml.parsers import expat
 
+from networkapi.infrastructure import formats
+
+
+# Size in characters of the chunks produced by iterdumps
+CHUNK_SIZE = 16384
 
 class XMLError(Exception):
 
@@ -51,150 +56,231 @@ class InvalidNodeTypeXMLError(XMLError):
         XMLError.__init__(self, cause, message)
 
 
-def _add_text_node(value, node, doc):
-    if value is None:
-        return
+def _escape(data):
+    return data.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
 
-    if not isinstance(value, StringTypes):
-        text = '%s' % unicode(value)
-    else:
-        text = r'%s' % value.replace('%', '%%')
 
-    try:
-        textNode = doc.createTextNode(text)
-        node.appendChild(textNode)
-    except TypeError, t:
-        raise InvalidNodeTypeXMLError(
-            t, u'Conteúdo de um Nó do XML com tipo de dado inválido: %s ' % value)
-
-
-def _add_list_node(nodeName, list, parent, doc):
-    if list:
-        for value in list:
-            node = doc.createElement(nodeName)
-            parent.appendChild(node)
-            if isinstance(value, dict):
-                _add_nodes_to_parent(value, node, doc)
-            else:
-                _add_text_node(value, node, doc)
-    else:
-        node = doc.createElement(nodeName)
-        parent.appendChild(node)
-        _add_text_node('', node, doc)
+def _text(value):
+    if not isinstance(value, StringTypes):
+        return '%s' % unicode(value)
+    return r'%s' % value.replace('%', '%%')
 
 
-def _add_nodes_to_parent(map, parent, doc):
-    if map is None:
+def _iter_text_node(name, value):
+    if value is None:
+        yield '<%s/>' % name
+    else:
+        yield '<%s>%s</%s>' % (name, _escape(_text(value)), name)
+
+
+def _iter_list_node(name, values):
+    empty = True
+    for value in values:
+        empty = False
+        if isinstance(value, dict):
+            for piece in _iter_map_node(name, value):
+                yield piece
+        else:
+            for piece in _iter_text_node(name, value):
+                yield piece
+    if empty:
+        yield '<%s></%s>' % (name, name)
+
+
+def _iter_map_node(name, map):
+    if not map:
+        yield '<%s/>' % name
         return
+    yield '<%s>' % name
+    for piece in _iter_nodes(map):
+        yield piece
+    yield '</%s>' % name
 
-    for key, value in map.iteritems():
-        try:
-            if isinstance(value, dict):
-                node = doc.createElement(key)
-                parent.appendChild(node)
-                _add_nodes_to_parent(value, node, doc)
-            elif isinstance(value, type([])):
-                _add_list_node(key, value, parent, doc)
-            else:
-                node = doc.createElement(key)
-                parent.appendChild(node)
-                _add_text_node(value, node, doc)
-
-        except InvalidCharacterErr, i:
-            raise InvalidNodeNameXMLError(
-                i, u'Valor inválido para nome de uma TAG de XML: %s' % key)
 
+def _iter_nodes(map):
+    for key, value in map.iteritems():
+        if isinstance(value, dict):
+            nodes = _iter_map_node(key, value)
+        elif isinstance(value, (list, GeneratorType)):
+            nodes = _iter_list_node(key, value)
+        else:
+            nodes = _iter_text_node(key, value)
+        for piece in nodes:
+            yield piece
 
-def dumps(map, root_name, root_attributes=None):
-    '''Cria um string no formato XML a partir dos elementos do map.
 
-    Os elementos do mapa serão nós filhos do root_name.    
+def iterdumps(map, root_name, root_attributes=None):
+    '''Gera o XML de dumps em pedaços codificados em UTF-8, sem montar o documento inteiro.
 
-    Cada chave do map será um Nó no XML. E o valor da chave será o conteúdo do Nó.
+    Os valores das listas também podem ser generators, consumidos à medida que o XML é gerado.
+    O resultado pode ser usado como conteúdo de um HttpResponse.
 
-    Throws: XMLError, InvalidNodeNameXMLError, InvalidNodeTypeXMLError
+    Throws: XMLError
     '''
-    xml = ''
-    try:
-        implementation = getDOMImplementation()
-    except ImportError, i:
-        raise XMLError(i, u'Erro ao obter o DOMImplementation')
+    start = '<%s' % root_name
+    if root_attributes is not None:
+        for key in sorted(root_attributes):
+            start += ' %s="%s"' % (key, _escape(root_attributes[key]))
+
+    pieces = ['<?xml version="1.0" encoding="UTF-8"?>']
+    size = 0
+    if map:
+        pieces.append((start + '>').encode('utf-8'))
+        for piece in _iter_nodes(map):
+            piece = piece.encode('utf-8')
+            pieces.append(piece)
+            size += len(piece)
+            if size >= CHUNK_SIZE:
+                yield ''.join(pieces)
+                pieces = []
+                size = 0
+        pieces.append(('</%s>' % root_name).encode('utf-8'))
+    else:
+        pieces.append((start + '/>').encode('utf-8'))
 
-    doc = implementation.createDocument(None, root_name, None)
+    yield ''.join(pieces)
 
-    try:
-        root = doc.documentElement
 
-        if (root_attributes is not None):
-            for key, value in root_attributes.iteritems():
-                attribute = doc.createAttribute(key)
-                attribute.nodeValue = value
-                root.setAttributeNode(attribute)
+def dumps(map, root_name, root_attributes=None):
+    '''Cria um string no formato XML a partir dos elementos do map.
 
-        _add_nodes_to_parent(map, root, doc)
+    Os elementos do mapa serão nós filhos do root_name.    
 
-        xml = doc.toxml('UTF-8')
-    except InvalidCharacterErr, i:
-        raise InvalidNodeNameXMLError(
-            i, u'Valor inválido para nome de uma TAG de XML: %s' % root_name)
-    finally:
-        doc.unlink()
+    Cada chave do map será um Nó no XML. E o valor da chave será o conteúdo do Nó.
 
-    return xml
+    Throws: XMLError
+    '''
+    return ''.join(iterdumps(map, root_name, root_attributes))
 
 
 def dumps_networkapi(map, version='1.0'):
+    '''Cria o XML da resposta, ou o JSON/msgpack se este for o formato negociado para a requisição.'''
+    format = formats.response_format()
+    if format != formats.XML:
+        return formats.dumps(map, 'networkapi', format)
     return dumps(map, 'networkapi', {'versao': version})
 
 
-def _create_childs_map(parent, force_list):
-    if parent is None:
-        return None
-
-    if parent.hasChildNodes():
-        childs = parent.childNodes
-        childs_map = dict()
-        childs_values = []
-        for i in range(childs.length):
-            child = childs.item(i)
-            if child.nodeType == Node.ELEMENT_NODE:
-                if child.nodeName in childs_map:
-                    child_value = _create_childs_map(child, force_list)
-                    if child_value is not None:
-                        value = childs_map[child.nodeName]
-                        if not isinstance(value, type([])):
-                            value = [value]
-                        value.append(child_value)
-                        childs_map[child.nodeName] = value
-                elif child.nodeName in force_list:
-                    child_value = _create_childs_map(child, force_list)
-                    if child_value is None:
-                        child_value = []
-                    else:
-                        child_value = [child_value]
-                    childs_map[child.nodeName] = child_value
-                else:
-                    childs_map[child.nodeName] = _create_childs_map(
-                        child, force_list)
-            elif child.nodeType == Node.TEXT_NODE or child.nodeType == Node.CDATA_SECTION_NODE:
-                if child.data.strip() != '':
-                    childs_values.append(child.data.replace('%%', '%'))
-
-        if len(childs_values) == 0 and len(childs_map) == 0:
-            return None
-        if len(childs_values) != 0 and len(childs_map) != 0:
-            childs_values.append(childs_map)
-            return childs_values
-        if len(childs_values) != 0:
-            if len(childs_values) == 1:
-                return childs_values[0]
-            return childs_values
-        return childs_map
-    elif parent.nodeType == Node.TEXT_NODE or parent.nodeType == Node.CDATA_SECTION_NODE:
-        if parent.data.strip() != '':
-            return parent.data
-
-    return None
+def iterdumps_networkapi(map, version='1.0'):
+    format = formats.response_format()
+    if format != formats.XML:
+        return formats.dumps(map, 'networkapi', format)
+    return iterdumps(map, 'networkapi', {'versao': version})
+
+
+def _qualified_name(name):
+    # With namespaces, expat gives "uri local prefix" or "uri local"
+    parts = name.split(' ')
+    if len(parts) == 3:
+        return parts[2] + ':' + parts[1]
+    return parts[-1]
+
+
+class _Element(object):
+
+    __slots__ = ('name', 'map', 'values', 'text')
+
+    def __init__(self, name):
+        self.name = name
+        self.map = None
+        self.values = []
+        self.text = []
+
+    def end_text(self):
+        '''Fecha o texto corrente: textos separados por elementos, comentários ou CDATA são valores distintos.'''
+        if self.text:
+            data = ''.join(self.text)
+            self.text = []
+            if data.strip() != '':
+                self.values.append(data.replace('%%', '%'))
+
+    def add_child(self, name, child_value, force_list):
+        if self.map is None:
+            self.map = dict()
+        if name in self.map:
+            if child_value is not None:
+                value = self.map[name]
+                if not isinstance(value, type([])):
+                    value = [value]
+                value.append(child_value)
+                self.map[name] = value
+        elif name in force_list:
+            if child_value is None:
+                self.map[name] = []
+            else:
+                self.map[name] = [child_value]
+        else:
+            self.map[name] = child_value
+
+    def value(self):
+        if not self.values:
+            return self.map or None
+        if self.map:
+            self.values.append(self.map)
+            return self.values
+        if len(self.values) == 1:
+            return self.values[0]
+        return self.values
+
+
+class _Loader(object):
+
+    def __init__(self, force_list):
+        self.force_list = force_list
+        self.stack = []
+        self.namespaces = []
+        self.root_name = None
+        self.root_value = None
+        self.attrs_map = dict()
+
+    def _end_text(self, *args):
+        if self.stack:
+            self.stack[-1].end_text()
+
+    def start_namespace(self, prefix, uri):
+        self.namespaces.append((prefix, uri))
+
+    def start_element(self, name, attributes):
+        name = _qualified_name(name)
+        if self.stack:
+            self.stack[-1].end_text()
+        else:
+            self.root_name = name
+            for prefix, uri in self.namespaces:
+                self.attrs_map['xmlns:' + prefix if prefix else 'xmlns'] = uri or ''
+            for key, value in attributes.iteritems():
+                self.attrs_map[_qualified_name(key)] = value
+        self.namespaces = []
+        self.stack.append(_Element(name))
+
+    def end_element(self, name):
+        element = self.stack.pop()
+        element.end_text()
+        if self.stack:
+            self.stack[-1].add_child(element.name, element.value(), self.force_list)
+        else:
+            self.root_value = element.value()
+
+    def character_data(self, data):
+        if self.stack:
+            self.stack[-1].text.append(data)
+
+    def parse(self, xml):
+        parser = expat.ParserCreate(namespace_separator=' ')
+        parser.namespace_prefixes = True
+        parser.buffer_text = True
+        parser.StartNamespaceDeclHandler = self.start_namespace
+        parser.StartElementHandler = self.start_element
+        parser.EndElementHandler = self.end_element
+        parser.CharacterDataHandler = self.character_data
+        parser.CommentHandler = self._end_text
+        parser.ProcessingInstructionHandler = self._end_text
+        parser.StartCdataSectionHandler = self._end_text
+        parser.EndCdataSectionHandler = self._end_text
+        if hasattr(xml, 'read'):
+            parser.ParseFile(xml)
+        else:
+            parser.Parse(xml, True)
 
 
 def loads(xml, force_list=None):
@@ -208,30 +294,31 @@ def loads(xml, force_list=None):
 
     Se o element root tem atributo, então também retorna um dict com os atributos.
 
+    O XML (string ou arquivo) é lido com o expat, sem montar a árvore DOM.
+    Se a requisição foi enviada em JSON ou msgpack, o corpo é lido neste formato.
+
     Throws: XMLError
     '''
     if force_list is None:
         force_list = []
 
+    format = formats.request_format()
+    if format != formats.XML and isinstance(xml, basestring) and not xml.lstrip().startswith('<'):
+        try:
+            return formats.loads(xml, format, force_list)
+        except Exception, e:
+            raise XMLError(e, u'Falha ao realizar o parse do %s.' % format)
+
+    loader = _Loader(force_list)
     try:
-        doc = parseString(xml)
+        loader.parse(xml)
     except Exception, e:
         raise XMLError(e, u'Falha ao realizar o parse do xml.')
 
-    root = doc.documentElement
-
     map = dict()
-    attrs_map = dict()
-
-    if root.hasAttributes():
-        attributes = root.attributes
-        for i in range(attributes.length):
-            attr = attributes.item(i)
-            attrs_map[attr.nodeName] = attr.nodeValue
-
-    map[root.nodeName] = _create_childs_map(root, force_list)
+    map[loader.root_name] = loader.root_value
 
-    return map, attrs_map
+    return map, loader.attrs_map
 
 
 if __name__ == '__main__':
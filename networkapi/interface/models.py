@@ -16,7 +16,10 @@
 # limitations under the License.
 
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_save, post_delete
 from django.core.exceptions import ObjectDoesNotExist
 from networkapi.log import Log
 from networkapi.models.BaseModel import BaseModel
@@ -24,6 +27,7 @@ from networkapi.util import is_valid_regex
 from networkapi.exception import InvalidValueError
 from networkapi.equipamento.models import Equipamento, TipoEquipamento
 from networkapi.ambiente.models import Ambiente
+from networkapi.infrastructure import commit_hooks
 
 
 class InterfaceError(Exception):
@@ -265,24 +269,11 @@ class Interface(BaseModel):
 
         @raise InterfaceError: Falha na consulta de interfaces. 
         '''
-        interfaces = []
-
         try:
-            interface = self
-            while (interface is not None):
-                interfaces.append(interface)
-
-                if (interface.ligacao_back is not None) and (from_interface.id != interface.ligacao_back_id):
-                    from_interface = interface
-                    interface = interface.ligacao_back
-                elif (interface.ligacao_front is not None) and (from_interface.id != interface.ligacao_front_id):
-                    from_interface = interface
-                    interface = interface.ligacao_front
-                else:
-                    interface = None
-
-                if (interface is not None) and (interface in interfaces):
-                    break
+            ids = InterfaceGraph().load_interfaces([self]).chain(self.id, from_interface.id)
+            interfaces = Interface.objects.in_bulk(ids[1:])
+            interfaces[self.id] = self
+            interfaces = [interfaces[id] for id in ids]
         except Exception, e:
             self.log.error(
                 u'Falha ao pesquisar as interfaces de uma interface.')
@@ -329,31 +320,10 @@ class Interface(BaseModel):
 
         @raise InterfaceProtectedError: A interface do switch está com o campo protegida diferente do parâmetro.
         '''
-
-        interface_ids = []
-        from_interface = self
-        interface = self.ligacao_front
         try:
-            while (interface is not None) and (interface.equipamento.tipo_equipamento_id != TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH) \
-                    and (interface.equipamento.tipo_equipamento_id != TipoEquipamento.TIPO_EQUIPAMENTO_ROUTER)\
-                    and (interface.equipamento.tipo_equipamento_id != TipoEquipamento.TIPO_EQUIPAMENTO_SERVIDOR):
-                interface_ids.append(interface.id)
-
-                if (interface.ligacao_back is not None) and (from_interface.id != interface.ligacao_back_id):
-                    from_interface = interface
-                    interface = interface.ligacao_back
-                elif (interface.ligacao_front is not None) and (from_interface.id != interface.ligacao_front_id):
-                    from_interface = interface
-                    interface = interface.ligacao_front
-                else:
-                    interface = None
-
-                if interface is not None:
-                    if interface.id in interface_ids:
-                        raise InterfaceNotFoundError(
-                            None, u'Interface do tipo switch não encontrada a partir do front da interface %d.' % self.id)
-        except InterfaceNotFoundError, e:
-            raise e
+            interface = Interface.search_nearest_interfaces([self], (
+                TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH, TipoEquipamento.TIPO_EQUIPAMENTO_ROUTER,
+                TipoEquipamento.TIPO_EQUIPAMENTO_SERVIDOR)).get(self.id)
         except Exception, e:
             self.log.error(u'Falha ao pesquisar a interface do switch.')
             raise InterfaceError(
@@ -382,29 +352,9 @@ class Interface(BaseModel):
 
         @raise InterfaceProtectedError: A interface do switch está com o campo protegida diferente do parâmetro.
         '''
-
-        interface_ids = []
-        from_interface = self
-        interface = self.ligacao_front
         try:
-            while (interface is not None) and (interface.equipamento.tipo_equipamento_id != TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH) and (interface.equipamento.tipo_equipamento_id != TipoEquipamento.TIPO_EQUIPAMENTO_ROUTER):
-                interface_ids.append(interface.id)
-
-                if (interface.ligacao_back is not None) and (from_interface.id != interface.ligacao_back_id):
-                    from_interface = interface
-                    interface = interface.ligacao_back
-                elif (interface.ligacao_front is not None) and (from_interface.id != interface.ligacao_front_id):
-                    from_interface = interface
-                    interface = interface.ligacao_front
-                else:
-                    interface = None
-
-                if interface is not None:
-                    if interface.id in interface_ids:
-                        raise InterfaceNotFoundError(
-                            None, u'Interface do tipo switch não encontrada a partir do front da interface %d.' % self.id)
-        except InterfaceNotFoundError, e:
-            raise e
+            interface = Interface.search_nearest_interfaces([self], (
+                TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH, TipoEquipamento.TIPO_EQUIPAMENTO_ROUTER)).get(self.id)
         except Exception, e:
             self.log.error(u'Falha ao pesquisar a interface do switch.')
             raise InterfaceError(
@@ -429,28 +379,8 @@ class Interface(BaseModel):
         @raise InterfaceNotFoundError: Interface do switch não encontrada.
         @raise InterfaceProtectedError: A interface do switch está com o campo protegida diferente do parâmetr
         '''
-        interface_ids = []
-        from_interface = self
-        interface = self.ligacao_front
         try:
-            while (interface is not None) and (interface.equipamento.tipo_equipamento_id != TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH):
-                interface_ids.append(interface.id)
-
-                if (interface.ligacao_back is not None) and (from_interface.id != interface.ligacao_back_id):
-                    from_interface = interface
-                    interface = interface.ligacao_back
-                elif (interface.ligacao_front is not None) and (from_interface.id != interface.ligacao_front_id):
-                    from_interface = interface
-                    interface = interface.ligacao_front
-                else:
-                    interface = None
-
-                if interface is not None:
-                    if interface.id in interface_ids:
-                        raise InterfaceNotFoundError(
-                            None, u'Interface do tipo switch não encontrada a partir do front da interface %d.' % self.id)
-        except InterfaceNotFoundError, e:
-            raise e
+            interface = Interface.search_nearest_interfaces([self], (TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH,)).get(self.id)
         except Exception, e:
             self.log.error(u'Falha ao pesquisar a interface do switch.')
             raise InterfaceError(
@@ -466,6 +396,29 @@ class Interface(BaseModel):
 
         return interface
 
+    @classmethod
+    def search_nearest_interfaces(cls, interfaces, equipment_types):
+        '''Para cada interface, segue a ligacao_front até uma interface de equipamento de um dos tipos informados.
+
+        As ligações de todas as interfaces são carregadas de uma vez pelo InterfaceGraph.
+
+        @param interfaces: Interfaces de origem.
+        @param equipment_types: Ids dos tipos de equipamento procurados.
+
+        @return: Dict com o id da interface de origem e a interface encontrada. As interfaces
+                 sem interface encontrada (ou com loop nas ligações) não estão no dict.
+        '''
+        graph = InterfaceGraph().load_interfaces(interfaces)
+        found = dict()
+        for interface in interfaces:
+            nearest = graph.nearest(interface.id, equipment_types)
+            if nearest is not None:
+                found[interface.id] = nearest
+
+        nearest_interfaces = Interface.objects.select_related('equipamento').in_bulk(set(found.values()))
+        return dict((id, nearest_interfaces[nearest]) for id, nearest in found.iteritems()
+                    if nearest in nearest_interfaces)
+
     @classmethod
     def search(cls, equipment_id=None):
         try:
@@ -704,6 +657,120 @@ class Interface(BaseModel):
 
 
 
+INTERFACE_LINK_KEY = 'interface_link:%s'
+
+
+class InterfaceGraph(object):
+
+    '''Ligações entre interfaces, com o tipo do equipamento de cada interface.
+
+    As interfaces de uma cadeia são carregadas em lote, uma consulta por salto para
+    todas as cadeias de uma vez, e ficam em cache uma interface por chave. A chave
+    de uma interface é removida quando ela é salva ou removida, ou quando o seu
+    equipamento é salvo.
+    '''
+
+    def __init__(self):
+        # {id: (ligacao_front, ligacao_back, equipamento, tipo_equipamento)}
+        self.nodes = {}
+        self.missing = set()
+
+    def load(self, interface_ids):
+        '''Carrega as interfaces e todas as interfaces ligadas a elas, direta ou indiretamente.'''
+        pending = set(interface_ids) - set(self.nodes)
+        while pending:
+            keys = dict((INTERFACE_LINK_KEY % id, id) for id in pending)
+            found = dict((keys[key], node) for key, node in cache.get_many(keys.keys()).iteritems())
+
+            not_cached = pending - set(found)
+            if not_cached:
+                rows = Interface.objects.filter(id__in=not_cached).values_list(
+                    'id', 'ligacao_front', 'ligacao_back', 'equipamento', 'equipamento__tipo_equipamento')
+                loaded = dict((row[0], tuple(row[1:])) for row in rows)
+                cache.set_many(dict((INTERFACE_LINK_KEY % id, node) for id, node in loaded.iteritems()),
+                               settings.INTERFACE_GRAPH_CACHE_TIME)
+                found.update(loaded)
+                self.missing.update(not_cached - set(loaded))
+
+            self.nodes.update(found)
+            pending = set()
+            for front, back, equipment, equipment_type in found.itervalues():
+                for link in (front, back):
+                    if link is not None and link not in self.nodes and link not in self.missing:
+                        pending.add(link)
+        return self
+
+    def load_interfaces(self, interfaces):
+        '''Como load, mas as ligações das próprias interfaces são lidas dos objetos, que podem não estar salvos.'''
+        self.load([interface.id for interface in interfaces])
+        links = []
+        for interface in interfaces:
+            node = self.nodes.get(interface.id)
+            self.nodes[interface.id] = (interface.ligacao_front_id, interface.ligacao_back_id,
+                                        interface.equipamento_id, node[3] if node else None)
+            links.extend([interface.ligacao_front_id, interface.ligacao_back_id])
+        return self.load([link for link in links if link is not None])
+
+    def load_equipments(self, equipment_ids):
+        '''Carrega as interfaces dos equipamentos e as interfaces ligadas a elas.'''
+        return self.load(Interface.objects.filter(equipamento__in=equipment_ids).values_list('id', flat=True))
+
+    def _next(self, interface_id, from_id):
+        # Segue pelo back, ou pelo front, desde que não volte para a interface de origem
+        front, back = self.nodes[interface_id][:2]
+        if back is not None and back != from_id:
+            return back
+        if front is not None and front != from_id:
+            return front
+        return None
+
+    def chain(self, interface_id, from_id):
+        '''Ids da interface e das interfaces ligadas a ela, vindo da interface from_id, até o fim ou um loop.'''
+        ids = []
+        current = interface_id
+        while current is not None and current in self.nodes:
+            ids.append(current)
+            current, from_id = self._next(current, from_id), current
+            if current in ids:
+                break
+        return ids
+
+    def nearest(self, interface_id, equipment_types):
+        '''Id da primeira interface, a partir da ligacao_front, de um equipamento de um dos tipos, ou None.'''
+        if interface_id not in self.nodes:
+            return None
+        visited = []
+        from_id, current = interface_id, self.nodes[interface_id][0]
+        while current is not None:
+            if current not in self.nodes:
+                return None
+            if self.nodes[current][3] in equipment_types:
+                return current
+            visited.append(current)
+            current, from_id = self._next(current, from_id), current
+            if current in visited:
+                return None
+        return None
+
+
+def _delete_interface_links(keys):
+    # Deleted now, and again at the end of the transaction (commit or rollback), so a
+    # concurrent request does not cache again the links it read before the commit
+    cache.delete_many(keys)
+    commit_hooks.on_transaction_end(lambda: cache.delete_many(keys))
+
+
+def interface_link_post_change(sender, instance, **kwargs):
+    _delete_interface_links([INTERFACE_LINK_KEY % instance.id])
+
+
+def equipment_interface_link_post_save(sender, instance, created, **kwargs):
+    # The type of the equipment is kept with its interfaces
+    if not created:
+        _delete_interface_links([INTERFACE_LINK_KEY % id for id in
+                                 Interface.objects.filter(equipamento=instance.id).values_list('id', flat=True)])
+
+
 class EnvironmentInterface(BaseModel):
 
     log = Log('EnvironmentInterface')
@@ -736,4 +803,9 @@ class EnvironmentInterface(BaseModel):
                 e, u'Can not find a EnvironmentInterface with interface id = %s.' % id)
         except Exception, e:
             cls.log.error(u'Falha ao pesquisar interfaces neste ambiente.')
-            raise InterfaceError(e, u'Falha ao pesquisar interfaces neste ambiente.')
\ No newline at end of file
+            raise InterfaceError(e, u'Falha ao pesquisar interfaces neste ambiente.')
+
+
+post_save.connect(interface_link_post_change, sender=Interface)
+post_delete.connect(interface_link_post_change, sender=Interface)
+post_save.connect(equipment_interface_link_post_save, sender=Equipamento)
@@ -18,7 +18,7 @@
 
 from networkapi.admin_permission import AdminPermission
 from networkapi.auth import has_perm
-from networkapi.equipamento.models import EquipamentoError
+from networkapi.equipamento.models import EquipamentoError, TipoEquipamento
 from networkapi.grupo.models import GrupoError
 from networkapi.infrastructure.xml_utils import XMLError, dumps_networkapi
 from networkapi.interface.models import Interface, InterfaceError, InterfaceNotFoundError
@@ -119,11 +119,14 @@ class InterfaceGetResource(RestResource):
                         if interf.equipamento.id==int(equipamento):
                             int_server = interf.get_server_switch_or_router_interface_from_host_interface()
                             equipamento = int_server.equipamento.id
-                    interfaces_equip = Interface.objects.all().filter(equipamento__id=int(equipamento))
+                    interfaces_equip = list(Interface.objects.all().filter(equipamento__id=int(equipamento)))
+                    uplinks = Interface.search_nearest_interfaces(interfaces_equip, (
+                        TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH, TipoEquipamento.TIPO_EQUIPAMENTO_ROUTER))
                     for interf in interfaces_equip:
+                        if interf.id not in uplinks:
+                            continue
                         try:
-                            i = interf.get_switch_and_router_interface_from_host_interface()
-                            interface_list.append(get_new_interface_map(i))
+                            interface_list.append(get_new_interface_map(uplinks[interf.id]))
                         except:
                             pass
                     return self.response(dumps_networkapi({'interfaces': interface_list}))
@@ -23,7 +23,7 @@ from networkapi.log import Log
 from networkapi.infrastructure.xml_utils import dumps_networkapi
 from networkapi.grupo.models import GrupoError
 from networkapi.interface.models import Interface, InterfaceError, InterfaceNotFoundError, FrontLinkNotFoundError, BackLinkNotFoundError, InterfaceForEquipmentDuplicatedError, InterfaceUsedByOtherInterfaceError
-from networkapi.equipamento.models import Equipamento, EquipamentoError, EquipamentoNotFoundError
+from networkapi.equipamento.models import Equipamento, EquipamentoError, EquipamentoNotFoundError, TipoEquipamento
 from networkapi.exception import InvalidValueError
 from django.forms.models import model_to_dict
 
@@ -67,12 +67,18 @@ class InterfaceGetSwRouterResource(RestResource):
 
 
             interface = Interface()
-            equip_interface = interface.search(equip_id)
+            equip_interface = list(interface.search(equip_id))
             interface_list = []
-            
+
+            # Uplinks of all interfaces resolved at once
+            uplinks = Interface.search_nearest_interfaces(equip_interface, (
+                TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH, TipoEquipamento.TIPO_EQUIPAMENTO_ROUTER))
+
             for var in equip_interface:
+                if var.id not in uplinks:
+                    continue
                 try:
-                    interface_list.append(get_new_interface_map(var.get_switch_and_router_interface_from_host_interface(None)))
+                    interface_list.append(get_new_interface_map(uplinks[var.id]))
                 except:
                     pass
 
@@ -16,9 +16,17 @@
 # limitations under the License.
 
 
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save, post_delete
 from networkapi.equipamento.models import Equipamento, EquipamentoAmbiente, EquipamentoAmbienteNotFoundError, \
     EquipamentoAmbienteDuplicatedError, EquipamentoError
 from networkapi.log import Log
@@ -26,11 +34,16 @@ from networkapi.models.BaseModel import BaseModel
 from networkapi.vlan.models import Vlan, TipoRede
 from networkapi.ambiente.models import EnvironmentVip, ConfigEnvironment, IP_VERSION, ConfigEnvironmentInvalidError, Ambiente
 from _mysql_exceptions import OperationalError
-from networkapi.infrastructure.ipaddr import IPv4Network, IPv6Network, AddressValueError, IPv4Address, IPv6Address
+from networkapi.infrastructure.ipaddr import IPv4Network, IPv6Network, AddressValueError, IPv4Address, IPv6Address, \
+    IPNetwork, IPAddress
+from networkapi.infrastructure.ip_bitmap import AddressBitmap
+from networkapi.infrastructure.ip_ranges import RangeAllocator
 from networkapi.config.models import Configuration
 from networkapi.util import mount_ipv4_string, mount_ipv6_string
 from networkapi.filterequiptype.models import FilterEquipType
 from networkapi.equipamento.models import TipoEquipamento
+from networkapi.eventlog.models import EventLog
+from networkapi.infrastructure import commit_hooks
 from networkapi.exception import InvalidValueError
 from networkapi.distributedlock import distributedlock, LOCK_ENVIRONMENT
 from networkapi.queue_tools import queue_keys
@@ -255,6 +268,9 @@ class NetworkIPv4(BaseModel):
     ambient_vip = models.ForeignKey(
         EnvironmentVip, null=True, db_column='id_ambientevip')
     active = models.BooleanField()
+    # First and last addresses as integers, filled on save
+    start_int = models.PositiveIntegerField(null=True, db_index=True)
+    end_int = models.PositiveIntegerField(null=True, db_index=True)
 
     log = Log('NetworkIPv4')
 
@@ -376,11 +392,13 @@ class NetworkIPv4(BaseModel):
             #If not, it will allocate two networks with same range
             with distributedlock(LOCK_ENVIRONMENT % self.vlan.ambiente.id):
                 # Find all networks ralated to environment
-                nets = NetworkIPv4.objects.filter(vlan__ambiente__id=self.vlan.ambiente.id)
+                nets = NetworkIPv4.objects.filter(vlan__ambiente__id=self.vlan.ambiente.id).values_list(
+                    'oct1', 'oct2', 'oct3', 'oct4', 'block')
+                networksv4 = [(_ipv4_to_int(oct1, oct2, oct3, oct4), int(block))
+                              for oct1, oct2, oct3, oct4, block in nets]
 
-                # Cast to API class
-                networksv4 = set([(IPv4Network(
-                            '%d.%d.%d.%d/%d' % (net_ip.oct1, net_ip.oct2, net_ip.oct3, net_ip.oct4, net_ip.block))) for net_ip in nets])
+                # Networks of environments sharing equipments, loaded once for all configs
+                shared_networks = get_shared_networks(self.vlan, type_ipv4)
 
                 # For each configuration founded in environment
                 for config in configs:
@@ -400,38 +418,34 @@ class NetworkIPv4(BaseModel):
                             new_prefix = int(config.ip_config.new_prefix)
 
                         self.log.info(u"Prefix that will be used: %s" % new_prefix)
-                        # For each subnet generated with configs
-                        for subnet in net4.iter_subnets(new_prefix=new_prefix):
-
-                            net_found = True
-                            for network in networksv4:
-                                if subnet in network:
-                                    net_found = False
-
-                            # Checks if the network generated is UNUSED
-                            if net_found:
-
-                                #Checks if it is subnet/supernet of any existing network
-                                in_range = network_in_range(self.vlan, subnet, type_ipv4)
-                                if not in_range:
-                                    continue
-
-                                # If not this will be USED
-                                network_found = subnet
-
-                                if network_type:
-                                    internal_network_type = network_type
-                                elif config.ip_config.network_type is not None:
-                                    internal_network_type = config.ip_config.network_type
-                                else:
-                                    self.log.error(
-                                        u'Parameter tipo_rede is invalid. Value: %s', network_type)
-                                    raise InvalidValueError(
-                                        None, 'network_type', network_type)
-
-                                # Stop generation logic
-                                stop = True
-                                break
+
+                        # A subnet can not be inside a network of the environment,
+                        # nor be subnet/supernet of any network sharing equipments
+                        used_ranges = _networks_ranges(shared_networks, 32)
+                        for network in networksv4:
+                            if network[1] <= new_prefix:
+                                used_ranges.add(*_network_range(network, 32))
+
+                        # Finds the first subnet that is UNUSED
+                        subnet = first_available_subnet(net4, new_prefix, used_ranges)
+
+                        if subnet is not None:
+
+                            # If not this will be USED
+                            network_found = subnet
+
+                            if network_type:
+                                internal_network_type = network_type
+                            elif config.ip_config.network_type is not None:
+                                internal_network_type = config.ip_config.network_type
+                            else:
+                                self.log.error(
+                                    u'Parameter tipo_rede is invalid. Value: %s', network_type)
+                                raise InvalidValueError(
+                                    None, 'network_type', network_type)
+
+                            # Stop generation logic
+                            stop = True
 
                     # If not IPv4
                     else:
@@ -458,7 +472,9 @@ class NetworkIPv4(BaseModel):
                     self.network_type = internal_network_type
                     self.ambient_vip = evip
                     self.save(user)
+                    EventLog.flush_batch()
                     transaction.commit()
+                    commit_hooks.transaction_committed()
                 except Exception, e:
                     self.log.error(u'Error persisting a NetworkIPv4.')
                     raise NetworkIPv4Error(e, u'Error persisting a NetworkIPv4.')
@@ -523,6 +539,8 @@ class Ip(BaseModel):
     oct1 = models.IntegerField(unique=True)
     descricao = models.CharField(max_length=100, blank=True)
     networkipv4 = models.ForeignKey(NetworkIPv4, db_column='id_redeipv4')
+    # Address as an integer, filled on save
+    ip_int = models.PositiveIntegerField(null=True, db_index=True)
 
     log = Log('Ip')
 
@@ -622,43 +640,17 @@ class Ip(BaseModel):
 
         networkipv4 = NetworkIPv4().get_by_pk(id_network)
 
-        # Cast to API
-        net4 = IPv4Network('%d.%d.%d.%d/%d' % (networkipv4.oct1, networkipv4.oct2,
-                                               networkipv4.oct3, networkipv4.oct4, networkipv4.block))
-
-        # Find all ips ralated to network
-        ips = Ip.objects.filter(networkipv4__id=networkipv4.id)
-
-        # Cast all to API class
-        ipsv4 = set(
-            [(IPv4Address('%d.%d.%d.%d' % (ip.oct1, ip.oct2, ip.oct3, ip.oct4))) for ip in ips])
+        # Do not use some range of IPs (config)
+        low, high = _ipv4_host_bounds(networkipv4, Configuration.get())
 
-        # Get configuration
-        conf = Configuration.get()
-
-        selected_ip = None
-
-        # For each ip generated
-        i = 0
-        for ip in net4.iterhosts():
-
-            # Do not use some range of IPs (config)
-            i = i + 1
-            if i >= conf.IPv4_MIN and i < (net4.numhosts - conf.IPv4_MAX):
-
-                # If IP generated was not used
-                if ip not in ipsv4:
-
-                    # Use it
-                    selected_ip = ip
-
-                    # Stop generation
-                    return selected_ip
+        selected_ip = Ip._find_available_ip(networkipv4, low, high)
 
         if selected_ip is None:
             raise IpNotAvailableError(
                 None, u'No IP available to NETWORK %s.' % networkipv4.id)
 
+        return selected_ip
+
     @classmethod
     def get_first_available_ip(self, id_network, topdown=False):
         """Get a first available Ipv4 for networkIPv4
@@ -668,40 +660,17 @@ class Ip(BaseModel):
 
         networkipv4 = NetworkIPv4().get_by_pk(id_network)
 
-        # Cast to API
-        net4 = IPv4Network('%d.%d.%d.%d/%d' % (networkipv4.oct1, networkipv4.oct2,
-                                               networkipv4.oct3, networkipv4.oct4, networkipv4.block))
-
-        # Find all ips ralated to network
-        ips = Ip.objects.filter(networkipv4__id=networkipv4.id)
-
-        # Cast all to API class
-        ipsv4 = set(
-            [(IPv4Address('%d.%d.%d.%d' % (ip.oct1, ip.oct2, ip.oct3, ip.oct4))) for ip in ips])
-
-        selected_ip = None
-
-        if topdown:
-            method = net4.iterhostsTopDown
-        else:
-            method = net4.iterhosts
-            
-        # For each ip generated
-        for ip in method():
-
-            # If IP generated was not used
-            if ip not in ipsv4:
-
-                # Use it
-                selected_ip = ip
+        low, high = _ipv4_host_bounds(networkipv4)
 
-                # Stop generation
-                return selected_ip
+        selected_ip = Ip._find_available_ip(
+            networkipv4, low, high, topdown=topdown)
 
         if selected_ip is None:
             raise IpNotAvailableError(
                 None, u'No IP available to NETWORK %s.' % networkipv4.id)
 
+        return selected_ip
+
     @classmethod
     def get_last_available_ip(self, id_network):
         """Get an available Ipv4 for networkIPv4 from end of range
@@ -709,36 +678,40 @@ class Ip(BaseModel):
             @raise IpNotAvailableError: NetworkIPv4 does not has available Ipv4
         """
 
-        networkipv4 = NetworkIPv4().get_by_pk(id_network)
-
-        # Cast to API
-        net4 = IPv4Network('%d.%d.%d.%d/%d' % (networkipv4.oct1, networkipv4.oct2,
-                                               networkipv4.oct3, networkipv4.oct4, networkipv4.block))
+        return Ip.get_first_available_ip(id_network, topdown=True)
 
-        # Find all ips ralated to network
-        ips = Ip.objects.filter(networkipv4__id=networkipv4.id)
+    @classmethod
+    def _find_available_ip(self, networkipv4, low, high, topdown=False):
+        """Searches a free Ipv4 in the bitmap of used IPs of the network.
+            The cached bitmap may be stale, so the IP found is checked in database and the bitmap
+            is rebuilt once if it is already in use.
+            @param low: Lowest host offset allowed.
+            @param high: Highest host offset allowed.
+            @param topdown: Searches from the end of the network.
+            @return: IPv4Address or None if there is no IP available.
+        """
 
-        # Cast all to API class
-        ipsv4 = set(
-            [(IPv4Address('%d.%d.%d.%d' % (ip.oct1, ip.oct2, ip.oct3, ip.oct4))) for ip in ips])
+        first = _ipv4_to_int(networkipv4.oct1, networkipv4.oct2,
+                             networkipv4.oct3, networkipv4.oct4)
 
-        selected_ip = None
+        def pick(index):
+            if topdown:
+                return index.last_free(low, high)
+            return index.first_free(low, high)
 
-        # For each ip generated
-        for ip in net4.iterhosts():
+        offset = pick(get_ipv4_index(networkipv4))
 
-            # If IP generated was not used
-            if ip not in ipsv4:
+        if offset is None or Ip._exists_in_network(first + offset, networkipv4.id):
+            offset = pick(get_ipv4_index(networkipv4, refresh=True))
 
-                # Use it
-                selected_ip = ip
+        if offset is None:
+            return None
 
-                # Stop generation
-                return selected_ip
+        return IPv4Address(first + offset)
 
-        if selected_ip is None:
-            raise IpNotAvailableError(
-                None, u'No IP available to NETWORK %s.' % networkipv4.id)
+    @classmethod
+    def _exists_in_network(self, address, id_network):
+        return Ip.objects.filter(ip_int=address, networkipv4=id_network).exists()
 
     def edit_ipv4(self, user):
         try:
@@ -962,38 +935,10 @@ class Ip(BaseModel):
         else:
             self.networkipv4 = NetworkIPv4().get_by_pk(id)
 
-        # Cast to API
-        net4 = IPv4Network('%d.%d.%d.%d/%d' % (self.networkipv4.oct1, self.networkipv4.oct2,
-                                               self.networkipv4.oct3, self.networkipv4.oct4, self.networkipv4.block))
-
-        # Find all ips ralated to network
-        ips = Ip.objects.filter(networkipv4__id=self.networkipv4.id)
-
-        # Cast all to API class
-        ipsv4 = set(
-            [(IPv4Address('%d.%d.%d.%d' % (ip.oct1, ip.oct2, ip.oct3, ip.oct4))) for ip in ips])
-
-        # Get configuration
-        conf = Configuration.get()
-
-        selected_ip = None
-
-        # For each ip generated
-        i = 0
-        for ip in net4.iterhosts():
+        # Do not use some range of IPs (config)
+        low, high = _ipv4_host_bounds(self.networkipv4, Configuration.get())
 
-            # Do not use some range of IPs (config)
-            i = i + 1
-            if i >= conf.IPv4_MIN and i < (net4.numhosts - conf.IPv4_MAX):
-
-                # If IP generated was not used
-                if ip not in ipsv4:
-
-                    # Use it
-                    selected_ip = ip
-
-                    # Stop generation
-                    break
+        selected_ip = Ip._find_available_ip(self.networkipv4, low, high)
 
         if selected_ip is None:
             raise IpNotAvailableError(
@@ -1035,7 +980,7 @@ class Ip(BaseModel):
             @raise IpError: Failed to search for the IP.
         """
         try:
-            return Ip.objects.get(oct1=oct1, oct2=oct2, oct3=oct3, oct4=oct4, ipequipamento__equipamento__id=equip_id)
+            return Ip.objects.get(ipequipamento__equipamento__id=equip_id, **_ipv4_lookup(oct1, oct2, oct3, oct4))
         except ObjectDoesNotExist, e:
             raise IpNotFoundError(e, u'There is no IP %s.%s.%s.%s of the equipament %s.' % (
                 oct1, oct2, oct3, oct4, equip_id))
@@ -1051,7 +996,7 @@ class Ip(BaseModel):
             @raise IpError: Failed to search for the IP.
         """
         try:
-            return Ip.objects.get(oct1=oct1, oct2=oct2, oct3=oct3, oct4=oct4, networkipv4=id_network)
+            return Ip.objects.get(networkipv4=id_network, **_ipv4_lookup(oct1, oct2, oct3, oct4))
         except ObjectDoesNotExist, e:
             raise IpNotFoundError(
                 e, u'There is no IP = %s.%s.%s.%s.' % (oct1, oct2, oct3, oct4))
@@ -1068,24 +1013,29 @@ class Ip(BaseModel):
             @raise IpError: Failed to search for the IP.
         """
         try:
-            ips = Ip.objects.filter(oct1=oct1, oct2=oct2, oct3=oct3, oct4=oct4)
+            ips = Ip.objects.filter(**_ipv4_lookup(oct1, oct2, oct3, oct4))
             if ips.count() == 0:
                 raise IpNotFoundError(None)
 
             if valid == True:
-                    return Ip.objects.get(oct1=oct1, oct2=oct2, oct3=oct3, oct4=oct4,
-                                          networkipv4__ambient_vip__id=id_evip)
+                    return Ip.objects.get(networkipv4__ambient_vip__id=id_evip,
+                                          **_ipv4_lookup(oct1, oct2, oct3, oct4))
             else:
+                index = get_network_index(IP_VERSION.IPv4[0])
+                networks = index.get_many([ip.networkipv4_id for ip in ips])
+                vip_environments = None
                 for ip in ips:
-                    if ip.networkipv4.ambient_vip:
-                        if ip.networkipv4.ambient_vip.id == id_evip:
+                    network = networks.get(ip.networkipv4_id)
+                    if network is None:
+                        continue
+                    if network.environment_vip_id:
+                        if network.environment_vip_id == id_evip:
                             return ip
                     else:
-                        environments = Ambiente.objects.filter(vlan__networkipv4__ambient_vip__id=id_evip)
-                        for env in environments:
-                            if ip.networkipv4.vlan.ambiente.divisao_dc.id == env.divisao_dc.id \
-                                    and ip.networkipv4.vlan.ambiente.ambiente_logico.id == env.ambiente_logico.id:
-                                return ip
+                        if vip_environments is None:
+                            vip_environments = index.vip_environments(id_evip)
+                        if (network.division_id, network.logical_environment_id) in vip_environments:
+                            return ip
                 raise ObjectDoesNotExist()
         except ObjectDoesNotExist, e:
             evip = EnvironmentVip.get_by_pk(id_evip)
@@ -1108,7 +1058,7 @@ class Ip(BaseModel):
             @raise IpError: Failed to search for the IP.
         """
         try:
-            return Ip.objects.get(oct1=oct1, oct2=oct2, oct3=oct3, oct4=oct4, networkipv4__vlan__ambiente__id=id_environment)
+            return Ip.objects.get(networkipv4__vlan__ambiente__id=id_environment, **_ipv4_lookup(oct1, oct2, oct3, oct4))
         except ObjectDoesNotExist, e:
             raise IpNotFoundError(e, u'There is no IP %s.%s.%s.%s of the environment %s.' % (
                 oct1, oct2, oct3, oct4, id_environment))
@@ -1127,7 +1077,8 @@ class Ip(BaseModel):
         @todo:  arrruma tudo
         '''
         try:
-            return Ip.objects.get(oct1=oct1, oct2=oct2, oct3=oct3, oct4=oct4, networkipv4__ambient_vip__id=id_evip, ipequipamento__equipamento__nome=real_name)
+            return Ip.objects.get(networkipv4__ambient_vip__id=id_evip, ipequipamento__equipamento__nome=real_name,
+                                  **_ipv4_lookup(oct1, oct2, oct3, oct4))
         except ObjectDoesNotExist, e:
             raise IpNotFoundError(e, u'')
         except Exception, e:
@@ -1142,7 +1093,7 @@ class Ip(BaseModel):
             @raise IpError: Failed to search for the IP.
         """
         try:
-            ips = Ip.objects.filter(oct1=oct1, oct2=oct2, oct3=oct3, oct4=oct4)
+            ips = Ip.objects.filter(**_ipv4_lookup(oct1, oct2, oct3, oct4))
 
             if len(ips) == 0:
                 raise ObjectDoesNotExist()
@@ -1410,6 +1361,11 @@ class NetworkIPv6(BaseModel):
     mask7 = models.CharField(max_length=4, db_column='mask_bloco7')
     mask8 = models.CharField(max_length=4, db_column='mask_bloco8')
     active = models.BooleanField()
+    # First and last addresses as pairs of 64 bits integers, filled on save
+    start_high = models.BigIntegerField(null=True)
+    start_low = models.BigIntegerField(null=True)
+    end_high = models.BigIntegerField(null=True)
+    end_low = models.BigIntegerField(null=True)
 
     log = Log('NetworkIPv6')
 
@@ -1527,11 +1483,12 @@ class NetworkIPv6(BaseModel):
 
             # Find all networks ralated to environment
             nets = NetworkIPv6.objects.filter(
-                vlan__ambiente__id=self.vlan.ambiente.id)
+                vlan__ambiente__id=self.vlan.ambiente.id).values_list(
+                'block1', 'block2', 'block3', 'block4', 'block5', 'block6', 'block7', 'block8', 'block')
+            networksv6 = [(_ipv6_to_int(*net_ip[:8]), int(net_ip[8])) for net_ip in nets]
 
-            # Cast to API class
-            networksv6 = set([(IPv6Network('%s:%s:%s:%s:%s:%s:%s:%s/%s' % (net_ip.block1, net_ip.block2, net_ip.block3,
-                                                                           net_ip.block4, net_ip.block5, net_ip.block6, net_ip.block7, net_ip.block8, net_ip.block))) for net_ip in nets])
+            # Networks of environments sharing equipments, loaded once for all configs
+            shared_networks = get_shared_networks(self.vlan, type_ipv6)
 
             # For each configuration founded in environment
             for config in configs:
@@ -1552,32 +1509,33 @@ class NetworkIPv6(BaseModel):
 
                     self.log.info(u"Prefix that will be used: %s" % new_prefix)
 
-                    # For each subnet generated with configs
-                    for subnet in net6.iter_subnets(new_prefix=new_prefix):
+                    # A subnet can not be a network of the environment,
+                    # nor be subnet/supernet of any network sharing equipments
+                    used_ranges = _networks_ranges(shared_networks, 128)
+                    for network in networksv6:
+                        if network[1] == new_prefix:
+                            used_ranges.add(*_network_range(network, 128))
 
-                        # Checks if the network generated is UNUSED
-                        if subnet not in networksv6:
+                    # Finds the first subnet that is UNUSED
+                    subnet = first_available_subnet(net6, new_prefix, used_ranges)
 
-                            in_range = network_in_range(self.vlan, subnet, type_ipv6)
-                            if not in_range:
-                                continue
+                    if subnet is not None:
 
-                            # If not this will be USED
-                            network_found = subnet
+                        # If not this will be USED
+                        network_found = subnet
 
-                            if network_type:
-                                internal_network_type = network_type
-                            elif config.ip_config.network_type is not None:
-                                internal_network_type = config.ip_config.network_type
-                            else:
-                                self.log.error(
-                                    u'Parameter tipo_rede is invalid. Value: %s', network_type)
-                                raise InvalidValueError(
-                                    None, 'network_type', network_type)
+                        if network_type:
+                            internal_network_type = network_type
+                        elif config.ip_config.network_type is not None:
+                            internal_network_type = config.ip_config.network_type
+                        else:
+                            self.log.error(
+                                u'Parameter tipo_rede is invalid. Value: %s', network_type)
+                            raise InvalidValueError(
+                                None, 'network_type', network_type)
 
-                            # Stop generation logic
-                            stop = True
-                            break
+                        # Stop generation logic
+                        stop = True
 
                 # If not be IPv6
                 else:
@@ -1687,6 +1645,9 @@ class Ipv6(BaseModel):
     block6 = models.CharField(max_length=4, db_column='bloco6')
     block7 = models.CharField(max_length=4, db_column='bloco7')
     block8 = models.CharField(max_length=4, db_column='bloco8')
+    # Address as a pair of 64 bits integers, filled on save
+    ip_high = models.BigIntegerField(null=True)
+    ip_low = models.BigIntegerField(null=True)
 
     log = Log('Ipv6')
 
@@ -1730,7 +1691,7 @@ class Ipv6(BaseModel):
             @raise IpError: Failed to search for the IP.
         """
         try:
-            return Ipv6.objects.get(block1=block1, block2=block2, block3=block3, block4=block4, block5=block5, block6=block6, block7=block7, block8=block8, ipv6equipament__equipamento__id=equip_id)
+            return Ipv6.objects.get(ipv6equipament__equipamento__id=equip_id, **_ipv6_lookup(block1, block2, block3, block4, block5, block6, block7, block8))
         except ObjectDoesNotExist, e:
             raise IpNotFoundError(e, u'There is no IP %s:%s:%s:%s:%s:%s:%s:%s of the equipament %s.' % (
                 block1, block2, block3, block4, block5, block6, block7, block8, equip_id))
@@ -1789,46 +1750,18 @@ class Ipv6(BaseModel):
             @raise IpNotAvailableError: NetworkIPv6 does not has available Ip6
         """
 
-        self.networkipv6 = NetworkIPv6.get_by_pk(id_network)
-
-        # Cast to API
-        net6 = IPv6Network('%s:%s:%s:%s:%s:%s:%s:%s/%s' % (self.networkipv6.block1, self.networkipv6.block2, self.networkipv6.block3, self.networkipv6.block4,
-                                                           self.networkipv6.block5, self.networkipv6.block6, self.networkipv6.block7, self.networkipv6.block8, self.networkipv6.block))
-        # Find all ipv6s ralated to network
-        ips = Ipv6.objects.filter(networkipv6__id=self.networkipv6.id)
-
-        # Cast all to API class
-        ipsv6 = set([(IPv6Address('%s:%s:%s:%s:%s:%s:%s:%s' % (
-            ip.block1, ip.block2, ip.block3, ip.block4, ip.block5, ip.block6, ip.block7, ip.block8))) for ip in ips])
-
-        # Get configuration
-        conf = Configuration.get()
-
-        selected_ip = None
-
-        # For each ip generated
-        # For each ip generated
-        i = 0
-        for ip in net6.iterhosts():
-
-            # Do not use some range of IPs (config)
-            i = i + 1
-            if i >= conf.IPv6_MIN and i < (net6.numhosts - conf.IPv6_MAX):
-
-                # If IP generated was not used
-                if ip not in ipsv6:
-
-                    # Use it
-                    selected_ip = ip
+        networkipv6 = NetworkIPv6.get_by_pk(id_network)
 
-                    return selected_ip.exploded
+        # Do not use some range of IPs (config)
+        low, high = _ipv6_host_bounds(networkipv6, Configuration.get())
 
-                    # Stop generation
-                    break
+        selected_ip = Ipv6._find_available_ip6(networkipv6, low, high)
 
         if selected_ip is None:
             raise IpNotAvailableError(
-                None, u'No IP6 available to NETWORK %s.' % self.networkipv6.id)
+                None, u'No IP6 available to NETWORK %s.' % networkipv6.id)
+
+        return selected_ip.exploded
 
     @classmethod
     def get_first_available_ip6(self, id_network):
@@ -1837,37 +1770,45 @@ class Ipv6(BaseModel):
             @raise IpNotAvailableError: NetworkIPv6 does not has available Ip6
         """
 
-        self.networkipv6 = NetworkIPv6.get_by_pk(id_network)
+        networkipv6 = NetworkIPv6.get_by_pk(id_network)
 
-        # Cast to API
-        net6 = IPv6Network('%s:%s:%s:%s:%s:%s:%s:%s/%s' % (self.networkipv6.block1, self.networkipv6.block2, self.networkipv6.block3, self.networkipv6.block4,
-                                                           self.networkipv6.block5, self.networkipv6.block6, self.networkipv6.block7, self.networkipv6.block8, self.networkipv6.block))
-        # Find all ipv6s ralated to network
-        ips = Ipv6.objects.filter(networkipv6__id=self.networkipv6.id)
+        low, high = _ipv6_host_bounds(networkipv6)
 
-        # Cast all to API class
-        ipsv6 = set([(IPv6Address('%s:%s:%s:%s:%s:%s:%s:%s' % (
-            ip.block1, ip.block2, ip.block3, ip.block4, ip.block5, ip.block6, ip.block7, ip.block8))) for ip in ips])
+        selected_ip = Ipv6._find_available_ip6(networkipv6, low, high)
 
-        selected_ip = None
+        if selected_ip is None:
+            raise IpNotAvailableError(
+                None, u'No IP6 available to NETWORK %s.' % networkipv6.id)
 
-        # For each ip generated
-        for ip in net6.iterhosts():
+        return selected_ip.exploded
 
-            # If IP generated was not used
-            if ip not in ipsv6:
+    @classmethod
+    def _find_available_ip6(self, networkipv6, low, high):
+        """Searches the first free Ipv6 in the occupied ranges of the network.
+            The cached ranges may be stale, so the IP found is checked in database and the ranges
+            are rebuilt once if it is already in use.
+            @return: IPv6Address or None if there is no IP available.
+        """
 
-                # Use it
-                selected_ip = ip
+        address = get_ipv6_index(networkipv6).first_free(low, high)
 
-                return selected_ip.exploded
+        if address is None or Ipv6._count_in_network([address], networkipv6.id):
+            address = get_ipv6_index(networkipv6, refresh=True).first_free(low, high)
 
-                # Stop generation
-                break
+        if address is None:
+            return None
 
-        if selected_ip is None:
-            raise IpNotAvailableError(
-                None, u'No IP6 available to NETWORK %s.' % self.networkipv6.id)
+        return IPv6Address(address)
+
+    @classmethod
+    def _count_in_network(self, addresses, id_network):
+        query = None
+        for address in addresses:
+            condition = Q(ip_high=address >> 64, ip_low=address & _IPV6_HALF_MASK)
+            query = condition if query is None else query | condition
+        if query is None:
+            return 0
+        return Ipv6.objects.filter(query, networkipv6=id_network).count()
 
     def delete_ip6(self, user, id_ip):
         try:
@@ -2119,37 +2060,10 @@ class Ipv6(BaseModel):
 
         self.networkipv6 = NetworkIPv6().get_by_pk(id)
 
-        # Cast to API
-        net6 = IPv6Network('%s:%s:%s:%s:%s:%s:%s:%s/%s' % (self.networkipv6.block1, self.networkipv6.block2, self.networkipv6.block3, self.networkipv6.block4,
-                                                           self.networkipv6.block5, self.networkipv6.block6, self.networkipv6.block7, self.networkipv6.block8, self.networkipv6.block))
-        # Find all ipv6s ralated to network
-        ips = Ipv6.objects.filter(networkipv6__id=self.networkipv6.id)
-
-        # Cast all to API class
-        ipsv6 = set([(IPv6Address('%s:%s:%s:%s:%s:%s:%s:%s' % (
-            ip.block1, ip.block2, ip.block3, ip.block4, ip.block5, ip.block6, ip.block7, ip.block8))) for ip in ips])
+        # Do not use some range of IPs (config)
+        low, high = _ipv6_host_bounds(self.networkipv6, Configuration.get())
 
-        # Get configuration
-        conf = Configuration.get()
-
-        selected_ip = None
-
-        # For each ip generated
-        i = 0
-        for ip in net6.iterhosts():
-
-            # Do not use some range of IPs (config)
-            i = i + 1
-            if i >= conf.IPv6_MIN and i < (net6.numhosts - conf.IPv6_MAX):
-
-                # If IP generated was not used
-                if ip not in ipsv6:
-
-                    # Use it
-                    selected_ip = ip
-
-                    # Stop generation
-                    break
+        selected_ip = Ipv6._find_available_ip6(self.networkipv6, low, high)
 
         if selected_ip is None:
             raise IpNotAvailableError(
@@ -2192,7 +2106,7 @@ class Ipv6(BaseModel):
         @raise IpError: Failed to search for the Ipv6.
         '''
         try:
-            return Ipv6.objects.get(block1=block1, block2=block2, block3=block3, block4=block4, block5=block5, block6=block6, block7=block7, block8=block8, networkipv6=id_network)
+            return Ipv6.objects.get(networkipv6=id_network, **_ipv6_lookup(block1, block2, block3, block4, block5, block6, block7, block8))
         except ObjectDoesNotExist, e:
             raise IpNotFoundError(e, u'Dont there is a Ipv6 %s:%s:%s:%s:%s:%s:%s:%s  ' % (
                 block1, block2, block3, block4, block5, block6, block7, block8))
@@ -2208,8 +2122,7 @@ class Ipv6(BaseModel):
         @raise IpError: Failed to search for the Ipv6.
         '''
         try:
-            ips = Ipv6.objects.filter(block1=block1, block2=block2, block3=block3,
-                                      block4=block4, block5=block5, block6=block6, block7=block7, block8=block8)
+            ips = Ipv6.objects.filter(**_ipv6_lookup(block1, block2, block3, block4, block5, block6, block7, block8))
 
             if len(ips) == 0:
                 raise ObjectDoesNotExist()
@@ -2230,26 +2143,29 @@ class Ipv6(BaseModel):
         @raise IpError: Failed to search for the Ipv6.
         '''
         try:
-            ips = Ipv6.objects.filter(block1=block1, block2=block2, block3=block3,
-                                    block4=block4, block5=block5, block6=block6, block7=block7, block8=block8)
+            ips = Ipv6.objects.filter(**_ipv6_lookup(block1, block2, block3, block4, block5, block6, block7, block8))
             if ips.count() == 0:
                 raise IpNotFoundError(None)
 
             if valid == True:
-                return Ipv6.objects.get(block1=block1, block2=block2, block3=block3, block4=block4, block5=block5,
-                                    block6=block6, block7=block7, block8=block8, networkipv6__ambient_vip__id=id_evip)
+                return Ipv6.objects.get(networkipv6__ambient_vip__id=id_evip,
+                                        **_ipv6_lookup(block1, block2, block3, block4, block5, block6, block7, block8))
             else:
+                index = get_network_index(IP_VERSION.IPv6[0])
+                networks = index.get_many([ip.networkipv6_id for ip in ips])
+                vip_environments = None
                 for ip in ips:
-                    if ip.networkipv6.ambient_vip:
-                        if ip.networkipv6.ambient_vip.id == id_evip:
+                    network = networks.get(ip.networkipv6_id)
+                    if network is None:
+                        continue
+                    if network.environment_vip_id:
+                        if network.environment_vip_id == id_evip:
                             return ip
                     else:
-                        environments = Ambiente.objects.filter(
-                            vlan__networkipv6__ambient_vip__id=id_evip)
-                        for env in environments:
-                            if ip.networkipv6.vlan.ambiente.divisao_dc.id == env.divisao_dc.id \
-                                    and ip.networkipv6.vlan.ambiente.ambiente_logico.id == env.ambiente_logico.id:
-                                return ip
+                        if vip_environments is None:
+                            vip_environments = index.vip_environments(id_evip)
+                        if (network.division_id, network.logical_environment_id) in vip_environments:
+                            return ip
                 raise ObjectDoesNotExist()
 
         except ObjectDoesNotExist, e:
@@ -2276,7 +2192,7 @@ class Ipv6(BaseModel):
         @raise IpError: Failed to search for the Ipv6.
         '''
         try:
-            return Ipv6.objects.get(block1=block1, block2=block2, block3=block3, block4=block4, block5=block5, block6=block6, block7=block7, block8=block8, networkipv6__vlan__ambiente__id=id_environment)
+            return Ipv6.objects.get(networkipv6__vlan__ambiente__id=id_environment, **_ipv6_lookup(block1, block2, block3, block4, block5, block6, block7, block8))
         except ObjectDoesNotExist, e:
             raise IpNotFoundError(e, u'Dont there is a IPv6 %s:%s:%s:%s:%s:%s:%s:%s of the environment %s.' % (
                 block1, block2, block3, block4, block5, block6, block7, block8, id_environment))
@@ -2524,71 +2440,526 @@ class Ipv6Equipament(BaseModel):
         if self.ip.ipv6equipament_set.count() == 0:
             self.ip.delete(authenticated_user)
 
-def network_in_range(vlan, network, version):
-    # Get all vlans environments from equipments of the current
-    # environment
-
-    equips = list()
-    envs = list()
-    env_filters = list()
-    envs_aux = list()
-    ids_exclude = list()
-    ids_all = list()
+def get_shared_networks(vlan, version):
+    """Returns all networks of the environments that share equipments with the
+    environment of the vlan.
+    Equipments whose type is in the filter of the environment are not considered.
+        @param version: IP_VERSION.IPv4[0] or IP_VERSION.IPv6[0].
+        @return: List of (network address as integer, prefix length).
+    """
 
     ambiente = vlan.ambiente
-    filter = ambiente.filter
-    equipment_types = TipoEquipamento.objects.filter(filterequiptype__filter=filter)
+    equipment_types = TipoEquipamento.objects.filter(filterequiptype__filter=ambiente.filter)
 
-    #Get all equipments from the environment being tested
-    #that are not supposed to be filtered
-    #(not the same type of the equipment type of a filter of the environment)
-    for env in ambiente.equipamentoambiente_set.all().exclude(equipamento__tipo_equipamento__in=equipment_types).select_related('equipamento'):
-        equips.append(env.equipamento)
+    # Get all equipments from the environment being tested
+    # that are not supposed to be filtered
+    # (not the same type of the equipment type of a filter of the environment)
+    equips = EquipamentoAmbiente.objects.filter(ambiente=ambiente).exclude(
+        equipamento__tipo_equipamento__in=equipment_types).values_list('equipamento', flat=True)
 
-    #Get all environment that the equipments above are included
-    for equip in equips:
-        for env in equip.equipamentoambiente_set.all().select_related('ambiente'):
-            if not env.ambiente_id in envs_aux:
-                envs.append(env.ambiente)
-                envs_aux.append(env.ambiente_id)
+    # Get all environments that the equipments above are included
+    envs = EquipamentoAmbiente.objects.filter(
+        equipamento__in=list(equips)).values_list('ambiente', flat=True).distinct()
+    envs = list(envs)
 
-    #Check in all vlans from all environments above
-    #if there is a network that is sub or super network of the current
-    #network being tested
-    for env in envs:
-        for vlan in env.vlan_set.all().prefetch_related('networkipv4_set').prefetch_related('networkipv6_set'):
-            ids_all.append(vlan.id)
-            is_subnet = verify_subnet(vlan, network, version)
-            if is_subnet:
-                return False
+    if version == IP_VERSION.IPv4[0]:
+        nets = NetworkIPv4.objects.filter(vlan__ambiente__in=envs).values_list(
+            'oct1', 'oct2', 'oct3', 'oct4', 'block')
+        return [(_ipv4_to_int(oct1, oct2, oct3, oct4), int(block)) for oct1, oct2, oct3, oct4, block in nets]
 
-    return True
+    nets = NetworkIPv6.objects.filter(vlan__ambiente__in=envs).values_list(
+        'block1', 'block2', 'block3', 'block4', 'block5', 'block6', 'block7', 'block8', 'block')
+    return [(_ipv6_to_int(*net[:8]), int(net[8])) for net in nets]
 
 
-def verify_subnet(vlan, network, version):
+def _network_range(network, bits):
+    """Returns the first and last addresses of a (network address, prefix length) tuple."""
+    address, prefixlen = network
+    size = 1L << (bits - prefixlen)
+    start = address & ~(size - 1)
+    return start, start + size - 1
 
-    from networkapi.infrastructure.ipaddr import IPNetwork
 
-    if version == IP_VERSION.IPv4[0]:
-        vlan_net = vlan.networkipv4_set.all()
-    else:
-        vlan_net = vlan.networkipv6_set.all()
-
-    # One vlan may have many networks, iterate over it
-    for net in vlan_net:
-        if version == IP_VERSION.IPv4[0]:
-            ip = "%s.%s.%s.%s/%s" % (net.oct1,
-                                     net.oct2, net.oct3, net.oct4, net.block)
-        else:
-            ip = "%s:%s:%s:%s:%s:%s:%s:%s/%d" % (net.block1, net.block2, net.block3,
-                                                 net.block4, net.block5, net.block6, net.block7, net.block8, net.block)
-
-        ip_net = IPNetwork(ip)
-        # If some network, inside this vlan, is subnet of network search param
-        if ip_net in network or network in ip_net:
-            # This vlan must be in vlans founded, don't need to continue
-            # checking
-            return True
-
-    # If don't found any subnet return False
-    return False
+def _networks_ranges(networks, bits):
+    return RangeAllocator.from_ranges([_network_range(network, bits) for network in networks])
+
+
+def first_available_subnet(network, new_prefix, used_ranges):
+    """Returns the first subnet of network with prefix new_prefix that does not overlap
+    any of the used ranges. Subnets are tried in the same order of network.iter_subnets,
+    but the search jumps over each used range instead of testing every subnet.
+        @param network: IPv4Network or IPv6Network.
+        @param used_ranges: RangeAllocator with the addresses that can not be used.
+        @return: IPv4Network, IPv6Network or None if there is no subnet available.
+        @raise ValueError: new_prefix is invalid for network.
+    """
+
+    max_prefixlen = network.max_prefixlen
+
+    if network.prefixlen == max_prefixlen:
+        new_prefix = max_prefixlen
+    elif new_prefix < network.prefixlen or new_prefix > max_prefixlen:
+        raise ValueError('prefix length %d is invalid for netblock %s' % (new_prefix, network))
+
+    size = 1L << (max_prefixlen - new_prefix)
+    start = used_ranges.first_free_block(size, int(network.network), int(network.broadcast))
+
+    if start is None:
+        return None
+
+    return IPNetwork('%s/%d' % (IPAddress(start, version=network.version), new_prefix),
+                     version=network.version)
+
+
+IPV4_INDEX_KEY = 'ipv4_index:%s'
+
+
+def _ipv4_to_int(oct1, oct2, oct3, oct4):
+    return (int(oct1) << 24) | (int(oct2) << 16) | (int(oct3) << 8) | int(oct4)
+
+
+def _int_to_ipv4_octs(address):
+    return (address >> 24) & 0xFF, (address >> 16) & 0xFF, (address >> 8) & 0xFF, address & 0xFF
+
+
+def _ipv4_host_bounds(networkipv4, conf=None):
+    """Returns the first and last host offsets that can be allocated in a NetworkIPv4.
+    Network and broadcast addresses are never allocated. If a Configuration is given,
+    the first IPv4_MIN and last IPv4_MAX addresses are reserved too.
+    """
+    size = 1 << (32 - int(networkipv4.block))
+    low, high = 1, size - 2
+    if conf is not None:
+        low = max(low, conf.IPv4_MIN)
+        high = min(high, size - conf.IPv4_MAX - 1)
+    return low, high
+
+
+def get_ipv4_index(networkipv4, refresh=False):
+    """Returns an AddressBitmap with the Ipv4 used in a NetworkIPv4.
+    The bitmap is built with a single query and kept in cache, until the post_save
+    and post_delete signals of Ip discard it.
+        @param networkipv4: NetworkIPv4.
+        @param refresh: Ignores the cached bitmap and builds it again from database.
+        @return: AddressBitmap indexed by offset from the network address.
+    """
+    key = IPV4_INDEX_KEY % networkipv4.id
+    first = _ipv4_to_int(networkipv4.oct1, networkipv4.oct2,
+                         networkipv4.oct3, networkipv4.oct4)
+    size = 1 << (32 - int(networkipv4.block))
+
+    if not refresh:
+        cached = cache.get(key)
+        if cached is not None and cached[0] == first and cached[1] == size:
+            return AddressBitmap(size, cached[2])
+
+    octs = Ip.objects.filter(networkipv4=networkipv4.id).values_list(
+        'oct1', 'oct2', 'oct3', 'oct4')
+    index = AddressBitmap.from_offsets(
+        size, [_ipv4_to_int(*ip_octs) - first for ip_octs in octs])
+
+    cache.set(key, (first, size, index.bits), settings.IPV4_INDEX_CACHE_TIME)
+
+    return index
+
+
+def _discard_ipv4_index(id_network):
+    """Discards the cached bitmap of a NetworkIPv4, now and at the end of the transaction.
+    A bitmap rebuilt in the meantime sees rows that may still be rolled back.
+    """
+    key = IPV4_INDEX_KEY % id_network
+    cache.delete(key)
+    commit_hooks.on_transaction_end(lambda: cache.delete(key))
+
+
+def ipv4_index_post_save(sender, instance, created, **kwargs):
+    _discard_ipv4_index(instance.networkipv4_id)
+
+
+def ipv4_index_post_delete(sender, instance, **kwargs):
+    _discard_ipv4_index(instance.networkipv4_id)
+
+
+def networkipv4_index_post_delete(sender, instance, **kwargs):
+    _discard_ipv4_index(instance.id)
+
+
+IPV6_INDEX_KEY = 'ipv6_index:%s'
+_IPV6_HALF_MASK = (1L << 64) - 1
+
+
+def _ipv6_to_int(*blocks):
+    address = 0L
+    for block in blocks:
+        address = (address << 16) | int(block, 16)
+    return address
+
+
+def _int_to_ipv6_blocks(address):
+    return ['%04x' % ((address >> shift) & 0xFFFF) for shift in range(112, -1, -16)]
+
+
+def _ipv6_host_bounds(networkipv6, conf=None):
+    """Returns the first and last addresses that can be allocated in a NetworkIPv6.
+    Network and last addresses are never allocated. If a Configuration is given,
+    the first IPv6_MIN and last IPv6_MAX addresses are reserved too.
+    """
+    first = _ipv6_to_int(networkipv6.block1, networkipv6.block2, networkipv6.block3, networkipv6.block4,
+                         networkipv6.block5, networkipv6.block6, networkipv6.block7, networkipv6.block8)
+    size = 1L << (128 - int(networkipv6.block))
+    low, high = 1, size - 2
+    if conf is not None:
+        low = max(low, conf.IPv6_MIN)
+        high = min(high, size - conf.IPv6_MAX - 1)
+    return first + low, first + high
+
+
+def get_ipv6_index(networkipv6, refresh=False):
+    """Returns a RangeAllocator with the occupied ranges of Ipv6 of a NetworkIPv6.
+    The ranges are built with a single query and kept in cache, until the
+    post_save and post_delete signals of Ipv6 discard them.
+        @param networkipv6: NetworkIPv6.
+        @param refresh: Ignores the cached ranges and builds them again from database.
+        @return: RangeAllocator of 128 bits addresses.
+    """
+    key = IPV6_INDEX_KEY % networkipv6.id
+
+    if not refresh:
+        ranges = cache.get(key)
+        if ranges is not None:
+            return RangeAllocator(ranges)
+
+    blocks = Ipv6.objects.filter(networkipv6=networkipv6.id).values_list(
+        'block1', 'block2', 'block3', 'block4', 'block5', 'block6', 'block7', 'block8')
+    index = RangeAllocator.from_addresses(
+        [_ipv6_to_int(*ip_blocks) for ip_blocks in blocks])
+
+    cache.set(key, index.ranges, settings.IPV6_INDEX_CACHE_TIME)
+
+    return index
+
+
+def _discard_ipv6_index(id_network):
+    """Discards the cached ranges of a NetworkIPv6, now and at the end of the transaction.
+    Ranges rebuilt in the meantime see rows that may still be rolled back.
+    """
+    key = IPV6_INDEX_KEY % id_network
+    cache.delete(key)
+    commit_hooks.on_transaction_end(lambda: cache.delete(key))
+
+
+def ipv6_index_post_save(sender, instance, created, **kwargs):
+    _discard_ipv6_index(instance.networkipv6_id)
+
+
+def ipv6_index_post_delete(sender, instance, **kwargs):
+    _discard_ipv6_index(instance.networkipv6_id)
+
+
+def networkipv6_index_post_delete(sender, instance, **kwargs):
+    _discard_ipv6_index(instance.id)
+
+
+def _ipv4_lookup(oct1, oct2, oct3, oct4):
+    """Returns the filter of an Ipv4 by octs: by the packed address when the octs
+    are valid, by the octs columns otherwise.
+    """
+    try:
+        octs = [int(octet) for octet in (oct1, oct2, oct3, oct4)]
+    except (TypeError, ValueError):
+        octs = None
+    if octs is None or [octet for octet in octs if not 0 <= octet <= 255]:
+        return dict(oct1=oct1, oct2=oct2, oct3=oct3, oct4=oct4)
+    return dict(ip_int=_ipv4_to_int(*octs))
+
+
+def _ipv6_lookup(*blocks):
+    """Returns the filter of an Ipv6 by blocks: by the packed address when the blocks
+    are valid, by the blocks columns otherwise.
+    """
+    try:
+        if [block for block in blocks if not 0 <= int(block, 16) <= 0xFFFF]:
+            raise ValueError(blocks)
+        address = _ipv6_to_int(*blocks)
+    except (TypeError, ValueError):
+        return dict(('block%d' % (i + 1), block) for i, block in enumerate(blocks))
+    return dict(ip_high=address >> 64, ip_low=address & _IPV6_HALF_MASK)
+
+
+def ipv4_packed_pre_save(sender, instance, **kwargs):
+    try:
+        instance.ip_int = _ipv4_to_int(instance.oct1, instance.oct2, instance.oct3, instance.oct4)
+    except (TypeError, ValueError):
+        instance.ip_int = None
+
+
+def networkipv4_packed_pre_save(sender, instance, **kwargs):
+    try:
+        start = _ipv4_to_int(instance.oct1, instance.oct2, instance.oct3, instance.oct4)
+        instance.start_int = start
+        instance.end_int = start | ((1 << (32 - int(instance.block))) - 1)
+    except (TypeError, ValueError):
+        instance.start_int = instance.end_int = None
+
+
+def ipv6_packed_pre_save(sender, instance, **kwargs):
+    try:
+        address = _ipv6_to_int(instance.block1, instance.block2, instance.block3, instance.block4,
+                               instance.block5, instance.block6, instance.block7, instance.block8)
+        instance.ip_high, instance.ip_low = address >> 64, address & _IPV6_HALF_MASK
+    except (TypeError, ValueError):
+        instance.ip_high = instance.ip_low = None
+
+
+def networkipv6_packed_pre_save(sender, instance, **kwargs):
+    try:
+        start = _ipv6_to_int(instance.block1, instance.block2, instance.block3, instance.block4,
+                             instance.block5, instance.block6, instance.block7, instance.block8)
+        end = start | ((1L << (128 - int(instance.block))) - 1)
+        instance.start_high, instance.start_low = start >> 64, start & _IPV6_HALF_MASK
+        instance.end_high, instance.end_low = end >> 64, end & _IPV6_HALF_MASK
+    except (TypeError, ValueError):
+        instance.start_high = instance.start_low = instance.end_high = instance.end_low = None
+
+
+NETWORK_INDEX_SEQ_KEY = 'network_index_seq:%s'
+NETWORK_INDEX_CHANGE_KEY = 'network_index_change:%s:%s'
+
+# Above this number of pending changes the index is loaded again instead of replayed
+NETWORK_INDEX_MAX_REPLAY = 1000
+
+ContainingNetwork = namedtuple('ContainingNetwork', [
+    'network_id', 'network', 'prefixlen', 'vlan_id', 'environment_id',
+    'division_id', 'logical_environment_id', 'environment_vip_id'])
+
+
+class NetworkIndex(object):
+
+    '''Index of all the networks of one IP version, by id and by environment vip.
+
+    Each process keeps the index in memory. It is loaded with a single query, and the
+    networks created, changed or removed afterwards are announced in cache by the
+    signals of NetworkIPv4 and NetworkIPv6 once their transaction is committed, and
+    replayed by the other processes on their next lookup, so the index is never loaded
+    again because of one network.
+    '''
+
+    def __init__(self, version):
+        '''
+        @param version: IP_VERSION.IPv4[0] or IP_VERSION.IPv6[0].
+        '''
+        self.version = version
+        self.lock = threading.RLock()
+        self.networks = None
+        self.vip_networks = {}
+        self.seq = None
+        self.loaded_at = 0
+
+    def _query(self, **filters):
+        if self.version == IP_VERSION.IPv4[0]:
+            rows = NetworkIPv4.objects.filter(**filters).values_list(
+                'id', 'oct1', 'oct2', 'oct3', 'oct4', 'block', 'vlan', 'vlan__ambiente',
+                'vlan__ambiente__divisao_dc', 'vlan__ambiente__ambiente_logico', 'ambient_vip')
+            return [ContainingNetwork(row[0], _ipv4_to_int(*row[1:5]), int(row[5]), *row[6:]) for row in rows]
+
+        rows = NetworkIPv6.objects.filter(**filters).values_list(
+            'id', 'block1', 'block2', 'block3', 'block4', 'block5', 'block6', 'block7', 'block8',
+            'block', 'vlan', 'vlan__ambiente', 'vlan__ambiente__divisao_dc',
+            'vlan__ambiente__ambiente_logico', 'ambient_vip')
+        return [ContainingNetwork(row[0], _ipv6_to_int(*row[1:9]), int(row[9]), *row[10:]) for row in rows]
+
+    def _set(self, network):
+        self._remove(network.network_id)
+        self.networks[network.network_id] = network
+        if network.environment_vip_id is not None:
+            self.vip_networks.setdefault(network.environment_vip_id, set()).add(network.network_id)
+
+    def _remove(self, network_id):
+        network = self.networks.pop(network_id, None)
+        if network is None or network.environment_vip_id is None:
+            return
+        same_vip = self.vip_networks[network.environment_vip_id]
+        same_vip.discard(network_id)
+        if not same_vip:
+            del self.vip_networks[network.environment_vip_id]
+
+    def _load(self, seq):
+        self.networks = {}
+        self.vip_networks = {}
+        for network in self._query():
+            self._set(network)
+        self.seq = seq
+        self.loaded_at = time.time()
+
+    def _replay(self, seq):
+        keys = [NETWORK_INDEX_CHANGE_KEY % (self.version, number) for number in xrange(self.seq + 1, seq + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        for key in keys:
+            network_id, network = changes[key]
+            if network is None:
+                self._remove(network_id)
+            else:
+                self._set(ContainingNetwork(*network))
+        self.seq = seq
+        return True
+
+    def sync(self):
+        '''Brings the index up to date with the changes announced by all processes.'''
+        seq = _network_index_seq(self.version)
+        with self.lock:
+            if self.seq == seq:
+                if time.time() - self.loaded_at < settings.NETWORK_INDEX_MAX_AGE:
+                    return
+            elif self.networks is not None and self.seq < seq <= self.seq + NETWORK_INDEX_MAX_REPLAY:
+                if self._replay(seq):
+                    return
+            self._load(seq)
+
+    def get(self, network_id):
+        '''Returns the ContainingNetwork of a network id, or None.'''
+        return self.get_many([network_id]).get(network_id)
+
+    def get_many(self, network_ids):
+        '''Returns a dict of the ContainingNetwork of the network ids, by id.
+
+        The ids missing from the index, such as the networks created after its last sync
+        or in the current transaction, are loaded from the database with a single query,
+        and are not kept in the index.
+        '''
+        networks = {}
+        missing = set()
+        for network_id in network_ids:
+            network = self.networks.get(network_id)
+            if network is not None:
+                networks[network_id] = network
+            elif network_id is not None:
+                missing.add(network_id)
+        if missing:
+            for network in self._query(id__in=missing):
+                networks[network.network_id] = network
+        return networks
+
+    def vip_environments(self, environment_vip_id):
+        '''Returns the (division, logical environment) pairs of the networks of an environment vip.'''
+        with self.lock:
+            return set((self.networks[network_id].division_id, self.networks[network_id].logical_environment_id)
+                       for network_id in self.vip_networks.get(environment_vip_id, ()))
+
+
+_network_indexes = {
+    IP_VERSION.IPv4[0]: NetworkIndex(IP_VERSION.IPv4[0]),
+    IP_VERSION.IPv6[0]: NetworkIndex(IP_VERSION.IPv6[0]),
+}
+
+
+def _network_index_seq(version):
+    key = NETWORK_INDEX_SEQ_KEY % version
+    seq = cache.get(key)
+    if seq is None:
+        # Seeded with the clock, so a lost counter is never mistaken for an old one
+        cache.add(key, int(time.time() * 1000), settings.NETWORK_INDEX_MAX_AGE)
+        seq = cache.get(key)
+    return seq
+
+
+def get_network_index(version):
+    """Returns the NetworkIndex of the process, up to date.
+        @param version: IP_VERSION.IPv4[0] or IP_VERSION.IPv6[0].
+    """
+    index = _network_indexes[version]
+    index.sync()
+    return index
+
+
+def get_equipment_vlans(equipment_id):
+    """Returns the vlans of the networks of the IPs of an equipment, without following
+    the network and vlan of each IP.
+        @param equipment_id: Identifier of the equipment.
+        @return: List of Vlan, with their environments.
+    """
+    vlan_ids = set()
+    for version, network_ids in (
+            (IP_VERSION.IPv4[0], IpEquipamento.objects.filter(
+                equipamento=equipment_id).values_list('ip__networkipv4', flat=True)),
+            (IP_VERSION.IPv6[0], Ipv6Equipament.objects.filter(
+                equipamento=equipment_id).values_list('ip__networkipv6', flat=True))):
+        for network in get_network_index(version).get_many(network_ids).itervalues():
+            vlan_ids.add(network.vlan_id)
+    if not vlan_ids:
+        return []
+    return list(Vlan.objects.filter(id__in=vlan_ids).select_related('ambiente'))
+
+
+def _announce_network(version, network_id, network):
+    key = NETWORK_INDEX_SEQ_KEY % version
+    try:
+        seq = cache.incr(key)
+    except ValueError:
+        # A new counter makes every process load its index again
+        cache.add(key, int(time.time() * 1000), settings.NETWORK_INDEX_MAX_AGE)
+        return
+    cache.set(NETWORK_INDEX_CHANGE_KEY % (version, seq), (network_id, network and tuple(network)),
+              settings.NETWORK_INDEX_MAX_AGE)
+
+
+def _announce_networks(version, **filters):
+    """Announces the current data of the networks that match the filters, once the
+    transaction is committed, so the other processes never index uncommitted data."""
+    def announce():
+        for network in _network_indexes[version]._query(**filters):
+            _announce_network(version, network.network_id, network)
+    commit_hooks.on_commit(announce)
+
+
+def _announce_network_removal(version, network_id):
+    commit_hooks.on_commit(lambda: _announce_network(version, network_id, None))
+
+
+def networkipv4_containing_post_save(sender, instance, **kwargs):
+    _announce_networks(IP_VERSION.IPv4[0], id=instance.id)
+
+
+def networkipv4_containing_post_delete(sender, instance, **kwargs):
+    _announce_network_removal(IP_VERSION.IPv4[0], instance.id)
+
+
+def networkipv6_containing_post_save(sender, instance, **kwargs):
+    _announce_networks(IP_VERSION.IPv6[0], id=instance.id)
+
+
+def networkipv6_containing_post_delete(sender, instance, **kwargs):
+    _announce_network_removal(IP_VERSION.IPv6[0], instance.id)
+
+
+def vlan_containing_post_save(sender, instance, created, **kwargs):
+    # The environment of the networks of the vlan may have changed
+    if not created:
+        for version in _network_indexes:
+            _announce_networks(version, vlan=instance.id)
+
+
+def environment_containing_post_save(sender, instance, created, **kwargs):
+    # The division and logical environment of its networks may have changed
+    if not created:
+        for version in _network_indexes:
+            _announce_networks(version, vlan__ambiente=instance.id)
+
+
+pre_save.connect(ipv4_packed_pre_save, sender=Ip)
+pre_save.connect(networkipv4_packed_pre_save, sender=NetworkIPv4)
+pre_save.connect(ipv6_packed_pre_save, sender=Ipv6)
+pre_save.connect(networkipv6_packed_pre_save, sender=NetworkIPv6)
+post_save.connect(ipv4_index_post_save, sender=Ip)
+post_delete.connect(ipv4_index_post_delete, sender=Ip)
+post_delete.connect(networkipv4_index_post_delete, sender=NetworkIPv4)
+post_save.connect(ipv6_index_post_save, sender=Ipv6)
+post_delete.connect(ipv6_index_post_delete, sender=Ipv6)
+post_delete.connect(networkipv6_index_post_delete, sender=NetworkIPv6)
+post_save.connect(networkipv4_containing_post_save, sender=NetworkIPv4)
+post_delete.connect(networkipv4_containing_post_delete, sender=NetworkIPv4)
+post_save.connect(networkipv6_containing_post_save, sender=NetworkIPv6)
+post_delete.connect(networkipv6_containing_post_delete, sender=NetworkIPv6)
+post_save.connect(vlan_containing_post_save, sender=Vlan)
+post_save.connect(environment_containing_post_save, sender=Ambiente)
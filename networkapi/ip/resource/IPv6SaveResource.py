@@ -24,7 +24,7 @@ from networkapi.filterequiptype.models import FilterEquipType
 from networkapi.infrastructure.xml_utils import loads, XMLError, dumps_networkapi
 from networkapi.ip.models import   IpNotAvailableError, IpEquipmentAlreadyAssociation,\
     NetworkIPv6NotFoundError, Ipv6, NetworkIPv6, IpError, NetworkIPv6Error,\
-    Ipv6Equipament, IpRangeAlreadyAssociation
+    Ipv6Equipament, IpRangeAlreadyAssociation, get_equipment_vlans
 from networkapi.log import Log
 from networkapi.rest import RestResource, UserNotAuthorizedError
 from networkapi.exception import InvalidValueError
@@ -133,17 +133,7 @@ class IPv6SaveResource(RestResource):
 
                 equip = Equipamento.get_by_pk(equip_id)
 
-                listaVlansDoEquip = []
-
-                for ipequip in equip.ipv6equipament_set.all():
-                    vlan = ipequip.ip.networkipv6.vlan
-                    if vlan not in listaVlansDoEquip:
-                        listaVlansDoEquip.append(vlan)
-
-                for ipequip in equip.ipequipamento_set.all():
-                    vlan = ipequip.ip.networkipv4.vlan
-                    if vlan not in listaVlansDoEquip:
-                        listaVlansDoEquip.append(vlan)
+                listaVlansDoEquip = get_equipment_vlans(equip.id)
 
                 vlan_atual = net.vlan
 
@@ -283,7 +283,7 @@ class IpResource(RestResource):
                 equipament = Equipamento.get_by_pk(equip_id)
 
                 # Delete vlan's cache
-                destroy_cache_function([ipv4])
+                destroy_cache_function([ipv4.networkipv4.vlan_id])
 
                 # delete equipment's cache
                 destroy_cache_function([equip_id], True)
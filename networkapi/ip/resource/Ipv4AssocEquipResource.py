@@ -24,7 +24,8 @@ from networkapi.grupo.models import GrupoError
 from networkapi.filterequiptype.models import FilterEquipType
 from networkapi.infrastructure.xml_utils import loads, XMLError, dumps_networkapi
 from networkapi.ip.models import NetworkIPv4NotFoundError, Ip, IpNotAvailableError, IpError, NetworkIPv4Error, \
-    NetworkIPv4, IpEquipmentAlreadyAssociation, IpEquipamento, IpEquipmentNotFoundError, IpNotFoundError, IpRangeAlreadyAssociation
+    NetworkIPv4, IpEquipmentAlreadyAssociation, IpEquipamento, IpEquipmentNotFoundError, IpNotFoundError, IpRangeAlreadyAssociation, \
+    get_equipment_vlans
 from networkapi.log import Log
 from networkapi.rest import RestResource, UserNotAuthorizedError
 from networkapi.exception import InvalidValueError
@@ -111,17 +112,7 @@ class Ipv4AssocEquipResource(RestResource):
                 # Get equipment
                 equip = Equipamento.get_by_pk(equip_id)
 
-                listaVlansDoEquip = []
-
-                for ipequip in equip.ipequipamento_set.all():
-                    vlan = ipequip.ip.networkipv4.vlan
-                    if vlan not in listaVlansDoEquip:
-                        listaVlansDoEquip.append(vlan)
-
-                for ipequip in equip.ipv6equipament_set.all():
-                    vlan = ipequip.ip.networkipv6.vlan
-                    if vlan not in listaVlansDoEquip:
-                        listaVlansDoEquip.append(vlan)
+                listaVlansDoEquip = get_equipment_vlans(equip.id)
 
                 vlan_atual = net.vlan
                 vlan_aux = None
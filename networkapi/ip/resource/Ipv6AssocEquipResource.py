@@ -29,7 +29,8 @@ from networkapi.filterequiptype.models import FilterEquipType
 
 from networkapi.infrastructure.xml_utils import loads, XMLError, dumps_networkapi
 
-from networkapi.ip.models import NetworkIPv6, NetworkIPv6NotFoundError, Ipv6, IpNotAvailableError, IpError, NetworkIPv6Error, IpEquipmentAlreadyAssociation, Ipv6Equipament, IpEquipmentNotFoundError, IpNotFoundError, IpRangeAlreadyAssociation
+from networkapi.ip.models import NetworkIPv6, NetworkIPv6NotFoundError, Ipv6, IpNotAvailableError, IpError, NetworkIPv6Error, IpEquipmentAlreadyAssociation, Ipv6Equipament, IpEquipmentNotFoundError, IpNotFoundError, IpRangeAlreadyAssociation, \
+    get_equipment_vlans
 
 from networkapi.log import Log
 
@@ -121,17 +122,7 @@ class Ipv6AssocEquipResource(RestResource):
                 # Get equipment
                 equip = Equipamento.get_by_pk(equip_id)
 
-                listaVlansDoEquip = []
-
-                for ipequip in equip.ipequipamento_set.all():
-                    vlan = ipequip.ip.networkipv4.vlan
-                    if vlan not in listaVlansDoEquip:
-                        listaVlansDoEquip.append(vlan)
-
-                for ipequip in equip.ipv6equipament_set.all():
-                    vlan = ipequip.ip.networkipv6.vlan
-                    if vlan not in listaVlansDoEquip:
-                        listaVlansDoEquip.append(vlan)
+                listaVlansDoEquip = get_equipment_vlans(equip.id)
 
                 vlan_atual = net.vlan
                 vlan_aux = None
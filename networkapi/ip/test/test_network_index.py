@@ -0,0 +1,52 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+from mock import patch
+
+from networkapi.ip.models import ContainingNetwork, NetworkIndex
+
+
+def _network(network_id, vlan_id=1):
+    return ContainingNetwork(network_id, 0, 24, vlan_id, 1, 1, 1, None)
+
+
+class NetworkIndexGetManyTestCase(TestCase):
+
+    def setUp(self):
+        self.index = NetworkIndex(4)
+        self.index.networks = {}
+        self.index._set(_network(1))
+
+    def test_indexed_networks_do_not_query(self):
+        with patch.object(NetworkIndex, '_query') as query:
+            self.assertEqual({1: _network(1)}, self.index.get_many([1, None]))
+        self.assertFalse(query.called)
+
+    def test_missing_networks_are_loaded_in_one_query(self):
+        with patch.object(NetworkIndex, '_query', return_value=[_network(2), _network(3)]) as query:
+            networks = self.index.get_many([1, 2, 3, 2])
+        query.assert_called_once_with(id__in=set([2, 3]))
+        self.assertEqual([1, 2, 3], sorted(networks))
+        self.assertEqual(None, self.index.networks.get(2))
+
+    def test_get_loads_a_missing_network(self):
+        with patch.object(NetworkIndex, '_query', return_value=[_network(2, vlan_id=7)]):
+            self.assertEqual(7, self.index.get(2).vlan_id)
+        with patch.object(NetworkIndex, '_query', return_value=[]):
+            self.assertEqual(None, self.index.get(5))
@@ -16,11 +16,14 @@
 # limitations under the License.
 
 
+import fcntl
 import glob
 import os
 import logging
+import Queue
+import threading
 import traceback
-from logging.handlers import TimedRotatingFileHandler, codecs
+from logging.handlers import TimedRotatingFileHandler, WatchedFileHandler, codecs
 import re
 from django.conf import settings
 
@@ -37,37 +40,24 @@ def convert_to_utf8(object):
     return unicode(str(object), 'utf-8', 'replace')
 
 
-def get_lock():
-    """Obtém lock para evitar que várias mensagens sejam sobrepostas no log"""
-    try:
-        from django.core.cache import cache
-        cache.default_timeout = 0
-
-        if cache._cache and hasattr(cache._cache, 'get_stats'):
-            stats = cache._cache.get_stats()
-        else:
-            stats = []
+def get_lock(file_name):
+    """Obtém lock para evitar que dois processos rodem o mesmo arquivo de log ao mesmo tempo.
 
-        if stats:
-            while cache.add('logger_lock', 1, 1) == 0:
-                time.sleep(0.1)
-                pass
+    O lock é um arquivo local travado com flock, liberado pelo sistema se o processo morrer.
 
-    except ImportError:
-        dump_file = open('/tmp/networkapi_log_error_dump', 'a')
-        traceback.print_exc(file=dump_file)
-        dump_file.close()
-        pass
+    @return: Arquivo do lock, a ser passado para release_lock.
+    """
+    lock_file = open(file_name + '.lock', 'a')
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
 
 
-def release_lock():
-    """Obtém lock para evitar que várias mensagens sejam sobrepostas no log"""
+def release_lock(lock_file):
+    """Libera o lock obtido por get_lock"""
     try:
-        from django.core.cache import cache
-        cache.default_timeout = 0
-        cache.delete('logger_lock')
-    except ImportError:
-        pass
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        lock_file.close()
 
 
 class NetworkAPILogFormatter(logging.Formatter):
@@ -88,7 +78,7 @@ class MultiprocessTimedRotatingFileHandler(TimedRotatingFileHandler):
         the one with the oldest suffix.
         """
         # evita que seja rodado o log ao mesmo tempo por dois processos.
-        get_lock()
+        lock_file = get_lock(self.baseFilename)
         try:
             self.stream.close()
             # get the time that this sequence started at and make it a
@@ -116,7 +106,126 @@ class MultiprocessTimedRotatingFileHandler(TimedRotatingFileHandler):
             traceback.print_exc(file=dump_file)
             dump_file.close()
         finally:
-            release_lock()
+            release_lock(lock_file)
+
+
+class LogWriter(threading.Thread):
+
+    """Thread que grava no handler de destino os registros enfileirados por um AsyncLogHandler."""
+
+    def __init__(self, handler):
+        threading.Thread.__init__(self, name='LogWriter')
+        self.daemon = True
+        self.handler = handler
+        self.queue = Queue.Queue(handler.max_queue_size)
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            self.handler.write(record)
+
+
+class AsyncLogHandler(logging.Handler):
+
+    """Handler que só enfileira os registros de log, sem bloquear quem loga.
+
+    Os registros são gravados nos handlers de destino por uma thread de cada
+    processo, criada no primeiro registro depois do fork. Se a fila está cheia
+    o registro é descartado, e a quantidade descartada é logada depois.
+    """
+
+    def __init__(self, *targets, **kwargs):
+        logging.Handler.__init__(self)
+        self.targets = list(targets)
+        self.max_queue_size = kwargs.get('max_queue_size', 10000)
+        self.dropped = 0
+        self._writer = None
+        self._pid = None
+        self._writer_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        logging.Handler.setFormatter(self, fmt)
+        for target in self.targets:
+            target.setFormatter(fmt)
+
+    def start(self):
+        """Retorna a thread de gravação deste processo, criando se preciso."""
+        with self._writer_lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._writer = LogWriter(self)
+                self._writer.start()
+            return self._writer
+
+    def prepare(self, record):
+        # O registro é formatado na thread de gravação: a mensagem e o traceback
+        # são resolvidos antes, enquanto os argumentos e o traceback existem
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = (self.formatter or logging._defaultFormatter).formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.start().queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def write(self, record):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            self.handle_targets(logging.makeLogRecord(dict(
+                record.__dict__, levelno=logging.WARNING, levelname='WARNING', exc_text=None,
+                msg=u'%d mensagens de log descartadas, fila cheia.' % dropped)))
+        self.handle_targets(record)
+
+    def handle_targets(self, record):
+        for target in self.targets:
+            if record.levelno >= target.level:
+                target.handle(record)
+
+    def close(self):
+        # Grava o que estiver na fila antes de fechar os destinos
+        writer = self._writer
+        if writer is not None and self._pid == os.getpid() and writer.is_alive():
+            writer.queue.put(None)
+            writer.join(5)
+        for target in self.targets:
+            target.close()
+        logging.Handler.close(self)
+
+
+class AsyncFileHandler(AsyncLogHandler):
+
+    """AsyncLogHandler que grava em um arquivo, para ser usado na configuração LOGGING.
+
+    Com per_process o arquivo de cada processo tem o pid no nome, e os processos
+    não disputam o mesmo arquivo.
+    """
+
+    def __init__(self, filename, mode='a', encoding=None, per_process=False, max_queue_size=10000):
+        AsyncLogHandler.__init__(self, max_queue_size=max_queue_size)
+        self.filename = filename
+        self.mode = mode
+        self.encoding = encoding
+        self.per_process = per_process
+        if not per_process:
+            self.targets = [WatchedFileHandler(filename, mode, encoding)]
+
+    def start(self):
+        if self.per_process and self._pid != os.getpid():
+            with self._writer_lock:
+                if self._pid != os.getpid():
+                    target = WatchedFileHandler('%s.%d' % (self.filename, os.getpid()), self.mode, self.encoding)
+                    target.setFormatter(self.formatter)
+                    self.targets = [target]
+        return AsyncLogHandler.start(self)
 
 
 class Log(object):
@@ -145,6 +254,10 @@ class Log(object):
     _PATTERN_XML_PASSWORD = [
         "<password>(.*?)</password>", "<enable_pass>(.*?)</enable_pass>", "<pass>(.*?)</pass>"]
 
+    _PATTERN_JSON_PASSWORD = [
+        r'"password"\s*:\s*"((?:[^"\\]|\\.)*)"', r'"enable_pass"\s*:\s*"((?:[^"\\]|\\.)*)"',
+        r'"pass"\s*:\s*"((?:[^"\\]|\\.)*)"']
+
     def __init__(self, module_name):
         """Cria um logger para o módulo informado."""
         self.module_name = module_name
@@ -190,15 +303,14 @@ class Log(object):
                                                       encoding='utf-8')
             fmt = NetworkAPILogFormatter(log_format)
 
-            fh.addFilter(my_filter)
-            fh.setFormatter(fmt)
-            self.logger.setLevel(log_level)
-            self.logger.addHandler(fh)
+            targets = [fh]
             if use_stdout:
-                sh = logging.StreamHandler(sys.stdout)
-                sh.addFilter(my_filter)
-                sh.setFormatter(fmt)
-                self.logger.addHandler(sh)
+                targets.append(logging.StreamHandler(sys.stdout))
+            handler = AsyncLogHandler(*targets)
+            handler.addFilter(my_filter)
+            handler.setFormatter(fmt)
+            self.logger.setLevel(log_level)
+            self.logger.addHandler(handler)
 
     @classmethod
     def init_log(cls,
@@ -217,14 +329,10 @@ class Log(object):
 
     def __emit(self, method, msg, args):
         """Emite uma mensagem de log"""
-        try:
-            get_lock()
-            msg = (msg % args)
-            if len(msg) > self._MAX_LINE_SIZE:
-                msg = msg[0:self._MAX_LINE_SIZE] + '...'
-            method(msg, extra={'module_name': self.module_name})
-        finally:
-            release_lock()
+        msg = (msg % args)
+        if len(msg) > self._MAX_LINE_SIZE:
+            msg = msg[0:self._MAX_LINE_SIZE] + '...'
+        method(msg, extra={'module_name': self.module_name})
 
     def rest(self, msg, *args):
         msg = self._search_hide_password(msg)
@@ -244,25 +352,19 @@ class Log(object):
 
     def error(self, msg, *args):
         """Imprime uma mensagem de erro no log"""
-        try:
-            get_lock()
-            msg = str(msg) % args
+        msg = str(msg) % args
 
-            show_traceback = getattr(settings, "LOG_SHOW_TRACEBACK", True)
+        show_traceback = getattr(settings, "LOG_SHOW_TRACEBACK", True)
 
-            self.logger.error(
-                msg, extra={'module_name': self.module_name}, exc_info=show_traceback)
-        finally:
-            release_lock()
+        self.logger.error(
+            msg, extra={'module_name': self.module_name}, exc_info=show_traceback)
 
     def _search_hide_password(self, msg):
 
-        for text in self. _PATTERN_XML_PASSWORD:
-            r = re.compile(text)
-            m = r.search(msg)
-            if m:
-                password = m.group(1)
-                msg = msg.replace(password, "****")
+        for text in self._PATTERN_XML_PASSWORD + self._PATTERN_JSON_PASSWORD:
+            for password in re.findall(text, msg):
+                if password:
+                    msg = msg.replace(password, "****")
 
         return msg
 
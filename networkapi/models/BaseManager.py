@@ -21,10 +21,20 @@ from django.db.models.query import QuerySet
 from django.core.exceptions import ObjectDoesNotExist
 
 
+def _audit_snapshot(instance):
+    # BaseModel instances keep the state loaded, to be logged as the previous one on save
+    if hasattr(instance, 'audit_snapshot'):
+        instance.audit_snapshot()
+    return instance
+
+
 class BaseQuerySet(QuerySet):
 
     """Base class for operations to database"""
 
+    def get(self, *args, **kwargs):
+        return _audit_snapshot(super(BaseQuerySet, self).get(*args, **kwargs))
+
     def group_by(self, column):
         """ Returns query, rewrited to use SELECT ... GROUP BY [column].
             Note that you MUST use the database column name, not the ORM model field.
@@ -52,7 +62,7 @@ class BaseQuerySet(QuerySet):
             sql.rstrip() + ' FOR UPDATE', params)
 
         try:
-            return query[0]
+            return _audit_snapshot(query[0])
         except IndexError, e:
             raise ObjectDoesNotExist
 
@@ -61,7 +71,7 @@ class BaseQuerySet(QuerySet):
         query = self.model._default_manager.raw(sql.rstrip(), params)
 
         try:
-            return query[0]
+            return _audit_snapshot(query[0])
         except IndexError, e:
             raise ObjectDoesNotExist
 
@@ -19,6 +19,7 @@
 from django.db import models, transaction, router
 from networkapi.models.BaseManager import BaseManager
 from django.db.models.deletion import Collector
+from networkapi.infrastructure import commit_hooks
 
 
 class BaseModel(models.Model):
@@ -38,11 +39,24 @@ class BaseModel(models.Model):
     def set_authenticated_user(self, user):
         self.authenticated_user = user
 
+    def audit_snapshot(self):
+        '''Guarda os campos da instância como estado anterior do log da próxima alteração.
+
+        Chamado quando uma única instância é carregada (get, uniqueResult, for_update), evitando
+        a consulta ao último log do objeto quando ela for alterada.
+        '''
+        self._audit_previous = dict((name, value) for name, value in self.__dict__.iteritems()
+                                    if not name.startswith('_') and name != 'authenticated_user')
+
     def save(self, user, force_insert=False, force_update=False, commit=False):
         self.set_authenticated_user(user)
         super(BaseModel, self).save(force_insert, force_update)
         if commit == True:
+            from networkapi.eventlog.models import EventLog
+            # Logs of the request batch go in the same commit as the data
+            EventLog.flush_batch()
             transaction.commit()
+            commit_hooks.transaction_committed()
 
     def delete(self, user):
         '''
@@ -34,6 +34,20 @@ class MissingUserError(Exception):
         msg = u'Causa: %s, Mensagem: A instância não possui o atributo "authenticated_user" ou o valor do mesmo está vazio.' % self.cause
         return msg.encode('utf-8', 'replace')
 
+
+def _format_values(values_map):
+    parametros = ''
+    for val in values_map:
+        if not (str(val) == '_state'):
+            if not str(val)[0] == '_':
+                if str(val) == 'pwd' or str(val) == 'password' or str(val) == 'enable_pass':
+                    parametros += str(val) + ' = ******** / '
+                else:
+                    parametros += str(val) + \
+                        ' = ' + str(values_map[val]) + ' / '
+    return parametros
+
+
 # Método que processará o signal enviado após a invocação do método save
 # dos models
 
@@ -60,24 +74,16 @@ def networkapi_post_save(sender, instance, created, **kwargs):
 
     values_map = dict(instance.__dict__)
     del values_map['authenticated_user']
+    previous = values_map.pop('_audit_previous', None)
 
     if (values_map['id']):
         id_objeto = values_map['id']
     else:
         id_objeto = 0
 
-    parametro_atual = ''
+    parametro_atual = _format_values(values_map)
     parametro_anterior = ''
 
-    for val in values_map:
-        if not (str(val) == '_state'):
-            if not str(val)[0] == '_':
-                if str(val) == 'pwd' or str(val) == 'password' or str(val) == 'enable_pass':
-                    parametro_atual += str(val) + ' = ******** / '
-                else:
-                    parametro_atual += str(val) + \
-                        ' = ' + str(values_map[val]) + ' / '
-
     if created:
 
         event['acao'] = 'Cadastrar'
@@ -94,11 +100,18 @@ def networkapi_post_save(sender, instance, created, **kwargs):
 
         if (values_map['id']):
             id_objeto = values_map['id']
-            try:
-                parametro_anterior = EventLog.objects.values_list('parametro_atual', flat=True).filter(
-                    id_objeto=id_objeto, funcionalidade=classe.__name__).order_by("-id")[0]
-            except:
-                parametro_anterior = ''
+            # Um log ainda não gravado do mesmo objeto é mais recente que o estado carregado
+            pending = EventLog.pending_value(classe.__name__, id_objeto)
+            if pending is not None:
+                parametro_anterior = pending
+            elif previous is not None and previous.get('id') == id_objeto:
+                parametro_anterior = _format_values(previous)
+            else:
+                try:
+                    parametro_anterior = EventLog.objects.values_list('parametro_atual', flat=True).filter(
+                        id_objeto=id_objeto, funcionalidade=classe.__name__).order_by("-id")[0]
+                except:
+                    parametro_anterior = ''
 
         else:
             parametro_anterior = "parametro anterior"
@@ -113,6 +126,9 @@ def networkapi_post_save(sender, instance, created, **kwargs):
 
     EventLog.log(user, event)
 
+    # O estado salvo é o anterior da próxima alteração desta instância
+    instance._audit_previous = values_map
+
 # Método que processará o signal enviado após a invocação do método delete
 # dos models
 
@@ -137,16 +153,7 @@ def networkapi_post_delete(sender, instance, **kwargs):
     else:
         id_objeto = 0
 
-    parametro_anterior = ''
-
-    for val in values_map:
-        if not (str(val) == '_state'):
-            if not str(val)[0] == '_':
-                if str(val) == 'pwd' or str(val) == 'password' or str(val) == 'enable_pass':
-                    parametro_anterior += str(val) + ' = ******** / '
-                else:
-                    parametro_anterior += str(val) + \
-                        ' = ' + str(values_map[val]) + ' / '
+    parametro_anterior = _format_values(values_map)
 
     event['acao'] = 'Remover'
     event['funcionalidade'] = instance.__class__.__name__
@@ -32,10 +32,9 @@ class IOS(BasePlugin):
 		'''
 		Create SVI in switch
 		'''
-		self.ensure_privilege_level(self)
-		self.channel.send("terminal length 0\nconfigure terminal\n \
-			interface Vlan%s \n description %s \n end \n" % (svi_number, svi_description))
-		recv = self.waitString("#")
+		self.ensure_privilege_level()
+		recv = self.send_commands(["terminal length 0", "configure terminal", "interface Vlan%s" % svi_number,
+			"description %s" % svi_description, "end"])
 
 		return recv
 
@@ -52,7 +51,8 @@ class IOS(BasePlugin):
 		log.info("sending command: %s" % command)
 
 		self.channel.send("%s\n" % command)
-		recv = self.waitString(self.VALID_TFTP_PUT_MESSAGE)
+		#the session goes back to the pool, so the prompt after the copy is read too
+		recv = self.waitString("%s.*%s" % (self.VALID_TFTP_PUT_MESSAGE, self.PROMPT_REGEX))
 
 		return recv
 
@@ -62,25 +62,23 @@ class IOS(BasePlugin):
 			privilege_level = self.admin_privileges
 
 		self.channel.send("\n")
-		recv = self.waitString(">|#")
-		self.channel.send("show privilege\n")
-		recv = self.waitString("Current privilege level is")
-		level = re.search('Current privilege level is ([0-9]+?).*', recv, re.DOTALL ).group(1)
+		recv = self.waitString(self.PROMPT_REGEX)
+		#a prompt left by the previous command must not end the wait
+		recv = self.send_commands(["show privilege"], "Current privilege level is.*%s" % self.PROMPT_REGEX)
+		level = re.search('Current privilege level is ([0-9]+)', recv, re.DOTALL ).group(1)
 
 		level = (level.split(' '))[-1]
 		if int(level) < privilege_level:
 			self.channel.send("enable\n")
 			recv = self.waitString("Password:")
 			self.channel.send("%s\n" % self.equipment_access.enable_pass)
-			recv = self.waitString("#")
+			recv = self.waitString(self.PROMPT_REGEX)
 
 	def remove_svi(self, svi_number):
 		'''
 		Delete SVI from switch
 		'''
 		self.ensure_privilege_level()
-		self.channel.send("terminal length 0\nconfigure terminal\n \
-			no interface Vlan%s \n end \n" % (svi_number))
-		recv = self.waitString("#")
+		recv = self.send_commands(["terminal length 0", "configure terminal", "no interface Vlan%s" % svi_number, "end"])
 
 		return recv
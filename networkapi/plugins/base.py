@@ -19,9 +19,11 @@ from networkapi.api_rest import exceptions as api_exceptions
 from networkapi.log import Log
 from . import exceptions
 from networkapi.equipamento.models import Equipamento, EquipamentoAcesso
-from networkapi.settings import TFTP_SERVER_ADDR
+from networkapi.settings import TFTP_SERVER_ADDR, SSH_POOL_IDLE_TIMEOUT, SSH_POOL_MAX_IDLE, SSH_PROMPT_TIMEOUT
+from .ssh_pool import SSHSession, get_pool
 import re
-from time import sleep
+import select
+import time
 import unicodedata, string
 import paramiko
 
@@ -33,6 +35,8 @@ class BasePlugin(object):
 	'''
 	ERROR_REGEX = '[Ee][Rr][Rr][Oo][Rr]|[Ff]ail|\%|utility is occupied'
 	INVALID_REGEX = '([Ii]nvalid)'
+	#prompt at the end of the output, waiting for the next command
+	PROMPT_REGEX = '[>#] ?\Z'
 	VALID_TFTP_GET_MESSAGE = 'Copy complete, now saving to disk'
 	VALID_TFTP_PUT_MESSAGE = 'bytes copied in'
 	VALID_OUTPUT_CHARS = "-_.():/#\\\r\n %s%s" % (string.ascii_letters, string.digits)
@@ -45,6 +49,7 @@ class BasePlugin(object):
 	equipment_access = None
 	channel = None
 	remote_conn = None
+	session = None
 	tftpserver = TFTP_SERVER_ADDR
 	management_vrf = ''
 
@@ -68,7 +73,8 @@ class BasePlugin(object):
 
 	def connect(self):
 		'''Connects to equipment via ssh using paramiko.SSHClient  and
-			sets channel variable with invoked shell object
+			sets channel variable with invoked shell object.
+			Reuses an idle session of the process to the same equipment access, if there is one
 
 		Raises:
 			IOError: if cannot connect to host
@@ -86,6 +92,16 @@ class BasePlugin(object):
 		username = self.equipment_access.user
 		password = self.equipment_access.password
 
+		key = (device, self.connect_port, username, password)
+		self.session = get_pool(SSH_POOL_IDLE_TIMEOUT, SSH_POOL_MAX_IDLE).acquire(key)
+		if self.session is not None:
+			log.info("Reusing ssh session to host %s" % device)
+			self.remote_conn = self.session.client
+			self.channel = self.session.channel
+			#a reused shell shows no prompt by itself
+			self.channel.send("\n")
+			return
+
 		self.remote_conn=paramiko.SSHClient()
 		self.remote_conn.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
@@ -99,14 +115,26 @@ class BasePlugin(object):
 			log.error("Error connecting to host %s: %s" % (device, e))
 			raise e
 
+		self.session = SSHSession(key, self.remote_conn, self.channel)
+
 	def create_svi(self, svi_number, svi_description='no description'):
 		'''
 		Delete SVI in switch
 		'''
 		raise NotImplementedError()
 
-	def close(self):
-		self.channel.close()
+	def close(self, reuse=True):
+		'''Gives the session back to the pool of the process, to be reused by the next
+			connection to the equipment. With reuse False, after an error leaves the
+			shell in an unknown state, the session is closed
+		'''
+		if self.session is None:
+			self.channel.close()
+		elif reuse:
+			get_pool(SSH_POOL_IDLE_TIMEOUT, SSH_POOL_MAX_IDLE).release(self.session)
+		else:
+			self.session.close()
+		self.session = None
 
 	def ensure_privilege_level(self, privilege_level=None):
 		'''
@@ -136,6 +164,22 @@ class BasePlugin(object):
 		else:
 			raise exceptions.UnableToVerifyResponse()
 
+	def send_commands(self, commands, prompt_regex=None):
+		'''Sends the commands one at a time, waiting for the prompt after each one,
+			so no output is left in the shell when the last command returns
+
+		Returns:
+			output of all commands
+		'''
+		if prompt_regex is None:
+			prompt_regex = self.PROMPT_REGEX
+
+		output = ''
+		for command in commands:
+			self.channel.send("%s\n" % command)
+			output += self.waitString(prompt_regex)
+		return output
+
 	def removeDisallowedChars(self, data):
 		data = u'%s' % data
 		cleanedStr = unicodedata.normalize('NFKD', data).encode('ASCII', 'ignore')
@@ -157,10 +201,18 @@ class BasePlugin(object):
 
 		string_ok = 0
 		recv_string = ''
+		deadline = time.time() + SSH_PROMPT_TIMEOUT
 		while not string_ok:
 			while not self.channel.recv_ready():
-				sleep(1)
-			recv_string = self.channel.recv(9999)
+				if self.channel.closed or self.channel.eof_received:
+					raise exceptions.ConnectionException()
+				remaining = deadline - time.time()
+				if remaining <= 0:
+					raise exceptions.ResponseTimeoutException(SSH_PROMPT_TIMEOUT)
+				#returns as soon as the equipment sends something
+				select.select([self.channel], [], [], remaining)
+			#the output may arrive in pieces, so it is matched as a whole
+			recv_string += self.channel.recv(9999)
 			file_name_string = self.removeDisallowedChars(recv_string)
 			if re.search(wait_str_invalid_regex, recv_string, re.DOTALL ):
 				raise exceptions.CommandErrorException(file_name_string)
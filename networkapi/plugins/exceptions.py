@@ -54,6 +54,13 @@ class LoadEquipmentModuleException(APIException):
     def __init__(self, module_name=None):
 	    self.detail = u'Could not load equipment module: ' % (module_name)
 
+class ResponseTimeoutException(APIException):
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    default_detail = 'Timeout waiting for equipment response.'
+
+    def __init__(self, timeout=None):
+        self.detail = u'Equipment did not answer as expected in %s seconds.' % (timeout)
+
 class UnableToVerifyResponse(APIException):
     status_code = status.HTTP_400_BAD_REQUEST
     default_detail = 'Error: Could not match equipment response in any known behavior. Please check config for status.'
@@ -0,0 +1,182 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+import time
+
+from networkapi.log import Log
+
+log = Log(__name__)
+
+
+class SSHSession(object):
+	'''
+	SSH connection to an equipment and the shell opened in it
+	'''
+
+	def __init__(self, key, client, channel):
+		self.key = key
+		self.client = client
+		self.channel = channel
+		self.last_used = time.time()
+
+	def is_alive(self):
+		'''Checks that the connection and the shell are still open'''
+		transport = self.client.get_transport()
+		return transport is not None and transport.is_active() and \
+			not self.channel.closed and not self.channel.exit_status_ready()
+
+	def drain(self):
+		'''Discards the output left in the shell by the previous user of the session'''
+		while self.channel.recv_ready():
+			self.channel.recv(9999)
+
+	def close(self):
+		try:
+			self.channel.close()
+			self.client.close()
+		except Exception, e:
+			log.error("Error closing ssh session to %s: %s" % (self.key[0], e))
+
+
+class SSHSessionPool(object):
+	'''
+	Idle SSH sessions of the process, by equipment access, to be reused by the
+	next deploy in the same equipment without a new handshake and login.
+
+	A session is used by one plugin at a time: it leaves the pool on acquire
+	and comes back on release.
+
+	Expired sessions are closed on acquire and release, and by a reaper thread
+	that runs while there are idle sessions.
+	'''
+
+	def __init__(self, idle_timeout, max_idle, reap_interval=None):
+		'''
+		Args:
+			idle_timeout: seconds an idle session is kept open
+			max_idle: idle sessions kept by equipment access
+			reap_interval: seconds between the checks of the reaper, a quarter of idle_timeout when None
+		'''
+		self.idle_timeout = idle_timeout
+		self.max_idle = max_idle
+		if reap_interval is None:
+			reap_interval = idle_timeout / 4.0
+		self.reap_interval = reap_interval
+		self.sessions = dict()
+		self.lock = threading.Lock()
+		self.reaper = None
+
+	def acquire(self, key):
+		'''
+		Returns an open idle session for the key, or None
+		'''
+		with self.lock:
+			expired = self._expire()
+			idle = self.sessions.get(key, [])
+			session = None
+			while idle and session is None:
+				candidate = idle.pop()
+				if candidate.is_alive():
+					session = candidate
+				else:
+					expired.append(candidate)
+
+		for old_session in expired:
+			old_session.close()
+
+		if session is not None:
+			session.drain()
+		return session
+
+	def release(self, session):
+		'''
+		Gives back a session that is not in use, closing it if it is dead or
+		if there are enough idle sessions for its key
+		'''
+		session.last_used = time.time()
+		with self.lock:
+			expired = self._expire()
+			idle = self.sessions.setdefault(session.key, [])
+			if session.is_alive() and len(idle) < self.max_idle:
+				idle.append(session)
+				self._start_reaper()
+			else:
+				if not idle:
+					del self.sessions[session.key]
+				expired.append(session)
+
+		for old_session in expired:
+			old_session.close()
+
+	def clear(self):
+		'''Closes all idle sessions'''
+		with self.lock:
+			sessions = [session for idle in self.sessions.values() for session in idle]
+			self.sessions = dict()
+		for session in sessions:
+			session.close()
+
+	def _start_reaper(self):
+		#must be called with the lock
+		if self.reaper is None:
+			self.reaper = threading.Thread(target=self._reap, name="ssh-pool-reaper")
+			self.reaper.daemon = True
+			self.reaper.start()
+
+	def _reap(self):
+		'''Closes the expired sessions until the pool has no idle session'''
+		while True:
+			time.sleep(self.reap_interval)
+			with self.lock:
+				expired = self._expire()
+				finished = not self.sessions
+				if finished:
+					#the next release starts a new reaper
+					self.reaper = None
+			for session in expired:
+				session.close()
+			if finished:
+				return
+
+	def _expire(self):
+		#must be called with the lock
+		limit = time.time() - self.idle_timeout
+		expired = []
+		for key, idle in self.sessions.items():
+			expired.extend(session for session in idle if session.last_used < limit)
+			idle[:] = [session for session in idle if session.last_used >= limit]
+			if not idle:
+				del self.sessions[key]
+		return expired
+
+
+_pool = [None, None]
+_pool_lock = threading.Lock()
+
+
+def get_pool(idle_timeout, max_idle):
+	'''
+	Returns the session pool of the process. A forked process gets a new pool,
+	the sockets of the parent can not be shared.
+	'''
+	with _pool_lock:
+		if _pool[0] is None or _pool[1] != os.getpid():
+			_pool[0] = SSHSessionPool(idle_timeout, max_idle)
+			_pool[1] = os.getpid()
+		return _pool[0]
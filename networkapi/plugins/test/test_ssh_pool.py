@@ -0,0 +1,304 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import threading
+import time
+from unittest import TestCase
+
+import paramiko
+from mock import Mock, patch
+
+from networkapi.plugins import base, exceptions
+from networkapi.plugins.Cisco.IOS.plugin import IOS
+from networkapi.plugins.ssh_pool import SSHSessionPool
+
+HOST_KEY = paramiko.RSAKey.generate(1024)
+
+
+class _ShellServer(paramiko.ServerInterface):
+
+    def __init__(self):
+        self.shell_requested = threading.Event()
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell_requested.set()
+        return True
+
+
+class FakeSwitch(object):
+    """SSH server with a shell that answers like an IOS switch.
+
+    Each command is echoed, answered and followed by the prompt, in separate
+    packets. Commands answered with None never get an answer.
+    """
+
+    def __init__(self, answers=None):
+        self.answers = {'show privilege': 'Current privilege level is 15\r\n'}
+        self.answers.update(answers or {})
+        self.commands = []
+        self.transports = []
+        self.channels = []
+        self.stopped = threading.Event()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self._start(self._accept)
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while not self.stopped.isSet():
+            try:
+                conn = self.sock.accept()[0]
+            except socket.timeout:
+                continue
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(HOST_KEY)
+            self.transports.append(transport)
+            server = _ShellServer()
+            transport.start_server(server=server)
+            channel = transport.accept(5)
+            if channel is not None and server.shell_requested.wait(5):
+                self._start(self._shell, channel)
+
+    def _shell(self, channel):
+        prompt = 'switch# '
+        self.channels.append(channel)
+        channel.send(prompt)
+        buf = ''
+        while True:
+            data = channel.recv(1024)
+            if not data:
+                return
+            buf += data
+            while '\n' in buf:
+                line, buf = buf.split('\n', 1)
+                command = line.strip()
+                self.commands.append(command)
+                answer = self.answers.get(command, '')
+                if answer is None:
+                    continue
+                if command == 'configure terminal':
+                    prompt = 'switch(config)# '
+                elif command.startswith('interface '):
+                    prompt = 'switch(config-if)# '
+                elif command == 'end':
+                    prompt = 'switch# '
+                for packet in (line + '\r\n', answer, prompt):
+                    time.sleep(0.01)
+                    channel.send(packet)
+
+    def connections(self):
+        return len(self.transports)
+
+    def open_connections(self):
+        return len([transport for transport in self.transports if transport.is_active()])
+
+    def close(self):
+        self.stopped.set()
+        self.sock.close()
+        for transport in self.transports:
+            transport.close()
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class SSHSessionPoolTestCase(TestCase):
+
+    def setUp(self):
+        self.switch = FakeSwitch()
+        self.addCleanup(self.switch.close)
+        self.pool = SSHSessionPool(idle_timeout=60, max_idle=2)
+        self.addCleanup(self.pool.clear)
+        pool_patch = patch.object(base, 'get_pool', return_value=self.pool)
+        pool_patch.start()
+        self.addCleanup(pool_patch.stop)
+        self.access = Mock(fqdn='127.0.0.1', user='user', password='password', enable_pass='enable')
+
+    def _plugin(self):
+        plugin = IOS(equipment_access=self.access, connect_port=self.switch.port)
+        plugin.connect()
+        return plugin
+
+    def test_reuses_the_session_of_the_same_access(self):
+        plugin = self._plugin()
+        plugin.ensure_privilege_level()
+        plugin.close()
+
+        plugin = self._plugin()
+        plugin.ensure_privilege_level()
+        plugin.close()
+
+        self.assertEqual(1, self.switch.connections())
+        self.assertEqual(['', 'show privilege', '', '', 'show privilege'], self.switch.commands)
+
+    def test_session_in_use_is_not_shared(self):
+        first = self._plugin()
+        second = self._plugin()
+        first.close()
+        second.close()
+
+        self.assertEqual(2, self.switch.connections())
+        self.assertEqual(2, len(self.pool.sessions.values()[0]))
+
+    def test_closed_session_is_not_reused(self):
+        plugin = self._plugin()
+        plugin.close(reuse=False)
+
+        self.assertTrue(_wait_for(lambda: self.switch.open_connections() == 0))
+        self.assertEqual({}, self.pool.sessions)
+
+    def test_dead_session_is_not_reused(self):
+        plugin = self._plugin()
+        plugin.close()
+        #the equipment ends the shell of the idle session
+        self.assertTrue(_wait_for(lambda: self.switch.channels))
+        self.switch.channels[0].close()
+        session = self.pool.sessions.values()[0][0]
+        self.assertTrue(_wait_for(lambda: not session.is_alive()))
+
+        plugin = self._plugin()
+        plugin.close()
+
+        self.assertEqual(2, self.switch.connections())
+
+    def test_create_svi_waits_for_the_prompt_of_the_last_command(self):
+        plugin = self._plugin()
+        output = plugin.create_svi(10, 'web')
+
+        self.assertEqual(['', 'show privilege', 'terminal length 0', 'configure terminal', 'interface Vlan10',
+                          'description web', 'end'], self.switch.commands)
+        self.assertTrue(output.endswith('end\r\nswitch# '))
+        time.sleep(0.1)
+        self.assertFalse(plugin.channel.recv_ready())
+        plugin.close()
+
+    def test_remove_svi_waits_for_the_prompt_of_the_last_command(self):
+        plugin = self._plugin()
+        output = plugin.remove_svi(10)
+
+        self.assertEqual('end', self.switch.commands[-1])
+        self.assertTrue(output.endswith('end\r\nswitch# '))
+        plugin.close()
+
+    def test_drains_the_output_left_in_an_idle_session(self):
+        plugin = self._plugin()
+        plugin.ensure_privilege_level()
+        plugin.close()
+        session = self.pool.sessions.values()[0][0]
+        #a late answer that would pass for the privilege level of the next user
+        self.switch.channels[0].send('Current privilege level is 1\r\nswitch# ')
+        self.assertTrue(_wait_for(session.channel.recv_ready))
+
+        plugin = self._plugin()
+        plugin.ensure_privilege_level()
+        plugin.close()
+
+        self.assertEqual(['', 'show privilege', '', '', 'show privilege'], self.switch.commands)
+
+    def test_prompt_timeout(self):
+        self.switch.answers['hang'] = None
+        plugin = self._plugin()
+        plugin.ensure_privilege_level()
+
+        with patch.object(base, 'SSH_PROMPT_TIMEOUT', 0.2):
+            start = time.time()
+            self.assertRaises(exceptions.ResponseTimeoutException, plugin.send_commands, ['hang'])
+
+        self.assertTrue(time.time() - start < 2)
+        plugin.close(reuse=False)
+        self.assertEqual({}, self.pool.sessions)
+
+    def test_expired_sessions_are_closed_by_the_reaper(self):
+        self.pool = SSHSessionPool(idle_timeout=0.2, max_idle=2, reap_interval=0.05)
+        base.get_pool.return_value = self.pool
+
+        plugin = self._plugin()
+        plugin.close()
+
+        self.assertEqual(1, self.switch.open_connections())
+        self.assertTrue(_wait_for(lambda: self.switch.open_connections() == 0))
+        self.assertEqual({}, self.pool.sessions)
+        self.assertTrue(_wait_for(lambda: self.pool.reaper is None))
+
+
+class SSHSessionPoolExpiryTestCase(TestCase):
+
+    def _session(self, key, alive=True):
+        session = Mock(key=key)
+        session.is_alive.return_value = alive
+        return session
+
+    def test_release_closes_expired_sessions(self):
+        pool = SSHSessionPool(idle_timeout=60, max_idle=2, reap_interval=60)
+        old = self._session('a')
+        pool.release(old)
+        old.last_used = time.time() - 120
+
+        pool.release(self._session('b'))
+
+        old.close.assert_called_once_with()
+        self.assertEqual(['b'], pool.sessions.keys())
+
+    def test_acquire_skips_expired_sessions(self):
+        pool = SSHSessionPool(idle_timeout=60, max_idle=2, reap_interval=60)
+        old = self._session('a')
+        pool.release(old)
+        old.last_used = time.time() - 120
+
+        self.assertEqual(None, pool.acquire('a'))
+        old.close.assert_called_once_with()
+
+    def test_release_keeps_at_most_max_idle(self):
+        pool = SSHSessionPool(idle_timeout=60, max_idle=1, reap_interval=60)
+        first, second = self._session('a'), self._session('a')
+        pool.release(first)
+        pool.release(second)
+
+        self.assertEqual([first], pool.sessions['a'])
+        second.close.assert_called_once_with()
+
+    def test_release_closes_dead_session(self):
+        pool = SSHSessionPool(idle_timeout=60, max_idle=1, reap_interval=60)
+        dead = self._session('a', alive=False)
+        pool.release(dead)
+
+        dead.close.assert_called_once_with()
+        self.assertEqual({}, pool.sessions)
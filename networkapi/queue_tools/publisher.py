@@ -0,0 +1,205 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fcntl
+import json
+import os
+import threading
+import time
+
+from networkapi.log import Log
+
+from django.conf import settings
+from stompest.config import StompConfig
+from stompest.sync import Stomp
+
+
+# Messages of the current thread waiting for the commit, None when there is no batch
+_batch = threading.local()
+
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+
+class QueuePublisher(object):
+    """
+        Keeps one STOMP connection to the broker for the whole process.
+
+        When the broker can not be reached the messages are appended to a spool
+        file, and new connections are only tried after a growing delay, so the
+        requests do not wait the connect timeout one message after another.
+        The spool is sent before any new message once the broker is back.
+    """
+    log = Log(__name__)
+
+    def __init__(self, broker_uri, connect_timeout, spool_file=None, max_backoff=60):
+        self._broker_uri = broker_uri
+        self._connect_timeout = connect_timeout
+        self._spool_file = spool_file
+        self._max_backoff = max_backoff
+        self._client = None
+        self._backoff = 0
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._client is None:
+            client = Stomp(StompConfig(uri=self._broker_uri))
+            client.connect(connectTimeout=self._connect_timeout)
+            self._client = client
+        return self._client
+
+    def _disconnect(self):
+        client, self._client = self._client, None
+        if client is not None:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    def _send_all(self, messages):
+        client = self._connect()
+        for destination, body in messages:
+            client.send(destination, body)
+
+    def publish(self, messages):
+        """
+            Sends the messages, a list of (destination, body) tuples, to the broker.
+            The messages go to the spool file if the broker is down.
+        """
+        with self._lock:
+            if time.time() >= self._retry_at:
+                spooled = []
+                try:
+                    spooled = self._take_spool()
+                    try:
+                        self._send_all(spooled + messages)
+                    except Exception:
+                        # The broker may have dropped an idle connection, so try once more with a new one
+                        self._disconnect()
+                        self._send_all(spooled + messages)
+                    self._backoff = 0
+                    self._retry_at = 0
+                    return
+                except Exception, e:
+                    # The spooled messages taken go back to the spool with the new ones
+                    messages = spooled + messages
+                    self._disconnect()
+                    self._backoff = min(max(self._backoff * 2, 1), self._max_backoff)
+                    self._retry_at = time.time() + self._backoff
+                    self.log.error(u"QueueManagerError - Broker unavailable, retrying in %s seconds." % self._backoff)
+                    self.log.debug(e)
+
+            self._write_spool(messages)
+
+    def _take_spool(self):
+        """
+            Returns the spooled messages and empties the spool file.
+        """
+        if not self._spool_file or not os.path.exists(self._spool_file) or not os.path.getsize(self._spool_file):
+            return []
+        messages = []
+        with open(self._spool_file, 'r+') as spool:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+            for line in spool:
+                if not line.strip():
+                    continue
+                try:
+                    messages.append(tuple(json.loads(line)))
+                except ValueError:
+                    # A line cut by a crash while writing, the other messages are kept
+                    self.log.error(u"QueueManagerError - Invalid message in spool file: %s" % line)
+            spool.seek(0)
+            spool.truncate()
+        return messages
+
+    def _write_spool(self, messages):
+        if not self._spool_file:
+            self.log.error(u"QueueManagerError - %d messages lost, no spool file configured." % len(messages))
+            return
+        try:
+            with open(self._spool_file, 'a') as spool:
+                fcntl.flock(spool, fcntl.LOCK_EX)
+                for message in messages:
+                    spool.write(json.dumps(message) + '\n')
+        except Exception, e:
+            self.log.error(u"QueueManagerError - Error writing %d messages to spool file." % len(messages))
+            self.log.error(e)
+
+
+def get_publisher(broker_uri, connect_timeout):
+    """
+        Returns the publisher of the process for the broker.
+    """
+    with _publishers_lock:
+        if broker_uri not in _publishers:
+            _publishers[broker_uri] = QueuePublisher(
+                broker_uri, connect_timeout,
+                getattr(settings, 'BROKER_SPOOL_FILE', None),
+                getattr(settings, 'BROKER_MAX_BACKOFF', 60))
+        return _publishers[broker_uri]
+
+
+def start_batch():
+    """
+        Holds the messages of this thread until flush_batch or discard_batch.
+    """
+    _batch.messages = []
+
+
+def add_to_batch(publisher, messages):
+    """
+        Adds the messages to the batch of this thread. Returns False if there is no batch.
+    """
+    pending = getattr(_batch, 'messages', None)
+    if pending is None:
+        return False
+    pending.append((publisher, messages))
+    return True
+
+
+def discard_batch():
+    """
+        Drops the held messages, used when the transaction is rolled back.
+    """
+    _batch.messages = None
+
+
+def flush_batch():
+    """
+        Sends the held messages, once per broker. Must be called after the commit,
+        so consumers find the data of the messages in the database.
+    """
+    pending = getattr(_batch, 'messages', None)
+    _batch.messages = None
+    if not pending:
+        return
+
+    by_publisher = {}
+    order = []
+    for publisher, messages in pending:
+        if publisher not in by_publisher:
+            by_publisher[publisher] = []
+            order.append(publisher)
+        by_publisher[publisher].extend(messages)
+
+    for publisher in order:
+        try:
+            publisher.publish(by_publisher[publisher])
+        except Exception, e:
+            publisher.log.error(u"QueueManagerError - Error on sending objects from queue.")
+            publisher.log.debug(e)
@@ -22,8 +22,7 @@ import logging
 from networkapi.log import Log
 
 from django.conf import settings
-from stompest.config import StompConfig
-from stompest.sync import Stomp
+from networkapi.queue_tools import publisher
 
 
 LOGGER = logging.getLogger(__name__)
@@ -70,23 +69,22 @@ class QueueManager(object):
     def send(self):
 
         """
-            Create a new stomp configuration client, connect and
-            then serializes message by message posting
-            them to your consumers in TOPIC standard
-            and disconnect.
+            Serializes message by message and posts them to your
+            consumers in TOPIC standard, through the connection to
+            the broker kept by the process.
+
+            Inside a request the messages are only posted after the
+            commit, and are dropped if the transaction is rolled back.
         """
 
         try:
 
-            configuration = StompConfig(uri=self._broker_uri)
-            client = Stomp(configuration)
-            client.connect(connectTimeout=self._broker_timeout)
-
-            for message in self._queue:
-                serialized_message = json.dumps(message, ensure_ascii=False)
-                client.send(self._queue_destination, serialized_message)
+            messages = [(self._queue_destination, json.dumps(message, ensure_ascii=False))
+                        for message in self._queue]
+            queue_publisher = publisher.get_publisher(self._broker_uri, self._broker_timeout)
 
-            client.disconnect()
+            if not publisher.add_to_batch(queue_publisher, messages):
+                queue_publisher.publish(messages)
 
         except Exception, e:
             self.log.error(u"QueueManagerError - Error on sending objects from queue.")
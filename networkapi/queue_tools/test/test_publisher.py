@@ -0,0 +1,117 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+from networkapi.queue_tools import publisher
+from networkapi.queue_tools.publisher import QueuePublisher
+
+
+class FakeBroker(object):
+
+    """Stands for stompest's Stomp: keeps the messages sent while it is up."""
+
+    up = True
+    fail_after = None
+    sent = []
+    connections = 0
+
+    def __init__(self, config):
+        pass
+
+    def connect(self, connectTimeout=None):
+        if not FakeBroker.up:
+            raise IOError('broker down')
+        FakeBroker.connections += 1
+
+    def send(self, destination, body):
+        if not FakeBroker.up or FakeBroker.fail_after == len(FakeBroker.sent):
+            raise IOError('connection lost')
+        FakeBroker.sent.append((destination, body))
+
+    def disconnect(self):
+        pass
+
+
+@patch.object(publisher, 'Stomp', FakeBroker)
+@patch.object(QueuePublisher, 'log')
+class QueuePublisherTestCase(TestCase):
+
+    def setUp(self):
+        FakeBroker.up = True
+        FakeBroker.fail_after = None
+        FakeBroker.sent = []
+        FakeBroker.connections = 0
+        self.dir = tempfile.mkdtemp()
+        self.spool_file = os.path.join(self.dir, 'spool')
+        self.publisher = QueuePublisher('tcp://broker:61613', 1, self.spool_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def spooled(self):
+        return self.publisher._take_spool()
+
+    def test_connection_is_reused(self, log):
+        self.publisher.publish([('/queue/a', '1')])
+        self.publisher.publish([('/queue/a', '2')])
+        self.assertEqual([('/queue/a', '1'), ('/queue/a', '2')], FakeBroker.sent)
+        self.assertEqual(1, FakeBroker.connections)
+
+    def test_broker_down_spools_and_backs_off(self, log):
+        FakeBroker.up = False
+        self.publisher.publish([('/queue/a', '1')])
+        FakeBroker.up = True
+
+        # Still in backoff, so the broker is not tried again
+        self.publisher.publish([('/queue/a', '2')])
+        self.assertEqual([], FakeBroker.sent)
+        self.assertEqual([(u'/queue/a', u'1'), (u'/queue/a', u'2')], self.spooled())
+
+    def test_spool_is_sent_first_when_broker_is_back(self, log):
+        FakeBroker.up = False
+        self.publisher.publish([('/queue/a', '1')])
+        FakeBroker.up = True
+        self.publisher._retry_at = 0
+
+        self.publisher.publish([('/queue/a', '2')])
+        self.assertEqual([('/queue/a', '1'), ('/queue/a', '2')], FakeBroker.sent)
+        self.assertEqual([], self.spooled())
+
+    def test_failure_keeps_the_spooled_messages(self, log):
+        FakeBroker.up = False
+        self.publisher.publish([('/queue/a', '1')])
+        FakeBroker.up = True
+        self.publisher._retry_at = 0
+
+        # The broker fails again while the spool is being sent
+        FakeBroker.fail_after = 0
+        self.publisher.publish([('/queue/a', '2')])
+        self.assertEqual([(u'/queue/a', u'1'), (u'/queue/a', u'2')], self.spooled())
+
+    def test_invalid_spool_line_is_skipped(self, log):
+        with open(self.spool_file, 'w') as spool:
+            spool.write('["/queue/a", "1"]\n["/queue/a", \n')
+        self.publisher.publish([('/queue/a', '2')])
+        self.assertEqual([(u'/queue/a', u'1'), ('/queue/a', '2')], FakeBroker.sent)
+        self.assertEqual(1, log.error.call_count)
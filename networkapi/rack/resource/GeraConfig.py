@@ -1,33 +1,52 @@
 #coding=utf-8
-from netaddr import IPNetwork
-import re
+import time
+from contextlib import contextmanager
+from netaddr import IPNetwork, IPAddress
+from networkapi.infrastructure.config_template import render_files
 from networkapi.rack.models import RackConfigError
 from networkapi import settings
 
 
 def replace(filein,fileout, dicionario):
+    replace_many([(filein, fileout, dicionario)])
+
+
+def replace_many(arquivos, workers=None):
+    # Gera todos os arquivos de uma vez, cada template eh compilado uma unica vez
+    # arquivos: lista de (template, arquivo de saida, dicionario)
+    # workers: numero de threads que geram os arquivos
     try:
-        # Read contents from file as a single string
-        file_handle = open(filein, 'r')
-        file_string = file_handle.read()
-        file_handle.close()
-        #
-        for key in dicionario:
-        # Use RE package to allow for replacement (also allowing for (multiline) REGEX)
-            file_string = (re.sub(key, dicionario[key], file_string))
-
-        # Write contents to file.
-        # Using mode 'w' truncates the file.
-        file_handle = open(fileout, 'w')
-        file_handle.write(file_string)
-        file_handle.close()
-    except:
+        render_files(arquivos, workers)
+    except Exception, e:
+        filein = getattr(e, 'filename', None) or ', '.join([arquivo[0] for arquivo in arquivos])
         raise RackConfigError(None,None, "Erro no template. Arquivo de entrada %s nao encontrado." %(filein))
 
 
+class Etapas(object):
+    """Tempo gasto, em segundos, em cada etapa do provisionamento de um rack."""
+
+    def __init__(self):
+        self.etapas = []
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.time()
+        try:
+            yield
+        finally:
+            self.etapas.append((nome, round(time.time() - inicio, 3)))
+
+    def tempos(self):
+        return dict(self.etapas)
+
+
 def splitnetworkbyrack(net,bloco,posicao):
-    subnets=list(net.subnet(bloco))
-    return subnets[posicao]
+    # Calcula a subrede da posicao direto, sem gerar a lista de todas as subredes
+    quantidade = 2 ** (bloco - net.prefixlen)
+    if not 0 <= posicao < quantidade:
+        raise IndexError("list index out of range")
+    rede = IPAddress(net.first + posicao * (net.size // quantidade), net.version)
+    return IPNetwork("%s/%s" % (rede, bloco))
 
 def dic_vlan_core(variablestochangecore, rack, name_core, name_rack):
     """
@@ -511,7 +530,7 @@ def dic_fe_prod(rack):
     ipv6['REDE']=str(subnetsRackFEipv6[rack])
     return redes, ranges, ipv6
 
-def autoprovision_coreoob(rack, FILEINCR1, FILEINCR2, FILEINOOB, name_core1, name_core2, name_oob, name_lf1, name_lf2, ip_mgmtoob, int_oob_core1, int_oob_core2, int_core1_oob, int_core2_oob ):
+def planejar_coreoob(rack, FILEINCR1, FILEINCR2, FILEINOOB, name_core1, name_core2, name_oob, name_lf1, name_lf2, ip_mgmtoob, int_oob_core1, int_oob_core2, int_core1_oob, int_core2_oob ):
 
     #roteiro para configuracao de core
     fileincore1=settings.PATH_TO_GUIDE+FILEINCR1
@@ -586,13 +605,11 @@ def autoprovision_coreoob(rack, FILEINCR1, FILEINCR2, FILEINOOB, name_core1, nam
     fileoutoob=settings.PATH_TO_CONFIG+HOSTNAME_OOB+".cfg"
 
     #gerando arquivos de saida
-    replace(fileincore1,fileoutcore1,variablestochangecore1)
-    replace(fileincore2,fileoutcore2,variablestochangecore2)
-    replace(fileinoob,fileoutoob,variablestochangeoob)
+    return [(fileincore1,fileoutcore1,variablestochangecore1),
+            (fileincore2,fileoutcore2,variablestochangecore2),
+            (fileinoob,fileoutoob,variablestochangeoob)]
 
-    return True
-
-def autoprovision_splf(rack,FILEINLF1, FILEINLF2,FILEINSP1, FILEINSP2, FILEINSP3, FILEINSP4,name_lf1, name_lf2, name_oob, name_sp1, name_sp2, name_sp3, name_sp4, ip_mgmtlf1, ip_mgmtlf2, int_oob_mgmtlf1, int_oob_mgmtlf2, int_sp1, int_sp2, int_sp3, int_sp4, int_lf1_sp1,int_lf1_sp2,int_lf2_sp3,int_lf2_sp4):
+def planejar_splf(rack,FILEINLF1, FILEINLF2,FILEINSP1, FILEINSP2, FILEINSP3, FILEINSP4,name_lf1, name_lf2, name_oob, name_sp1, name_sp2, name_sp3, name_sp4, ip_mgmtlf1, ip_mgmtlf2, int_oob_mgmtlf1, int_oob_mgmtlf2, int_sp1, int_sp2, int_sp3, int_sp4, int_lf1_sp1,int_lf1_sp2,int_lf2_sp3,int_lf2_sp4):
 
 
     fileinleaf1=settings.PATH_TO_GUIDE+FILEINLF1
@@ -1007,12 +1024,10 @@ def autoprovision_splf(rack,FILEINLF1, FILEINLF2,FILEINSP1, FILEINSP2, FILEINSP3
     fileoutleaf1=settings.PATH_TO_CONFIG+HOSTNAME_LF1+".cfg"
     fileoutleaf2=settings.PATH_TO_CONFIG+HOSTNAME_LF2+".cfg"
 
-    replace(fileinspine1,fileoutspine1,variablestochangespine1)
-    replace(fileinspine2,fileoutspine2,variablestochangespine2)
-    replace(fileinspine3,fileoutspine3,variablestochangespine3)
-    replace(fileinspine4,fileoutspine4,variablestochangespine4)
-    replace(fileinleaf1,fileoutleaf1,variablestochangeleaf1)
-    replace(fileinleaf2,fileoutleaf2,variablestochangeleaf2)
-
-    return True
+    return [(fileinspine1,fileoutspine1,variablestochangespine1),
+            (fileinspine2,fileoutspine2,variablestochangespine2),
+            (fileinspine3,fileoutspine3,variablestochangespine3),
+            (fileinspine4,fileoutspine4,variablestochangespine4),
+            (fileinleaf1,fileoutleaf1,variablestochangeleaf1),
+            (fileinleaf2,fileoutleaf2,variablestochangeleaf2)]
 
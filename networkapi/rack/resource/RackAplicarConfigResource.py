@@ -23,15 +23,16 @@ from networkapi.rack.models import RackAplError, RackConfigError, RackNumberNotF
 from networkapi.infrastructure.xml_utils import dumps_networkapi
 from networkapi.log import Log
 from networkapi.rest import RestResource, UserNotAuthorizedError
-from networkapi.equipamento.models import Equipamento, EquipamentoAmbiente
-from networkapi.rack.resource.GeraConfig import dic_fe_prod, dic_lf_spn, dic_vlan_core, dic_pods, dic_hosts_cloud
+from networkapi.equipamento.models import Equipamento, EquipamentoAmbiente, TipoEquipamento
+from networkapi.rack.resource.GeraConfig import dic_fe_prod, dic_lf_spn, dic_vlan_core, dic_pods, dic_hosts_cloud, Etapas
 from networkapi.ip.models import NetworkIPv4, NetworkIPv6, Ip
 from networkapi.interface.models import Interface, InterfaceNotFoundError
 from networkapi.vlan.models import TipoRede, Vlan
 from networkapi.ambiente.models import IP_VERSION, ConfigEnvironment, IPConfig, AmbienteLogico, DivisaoDc, GrupoL3, Ambiente
-from networkapi.util import destroy_cache_function
+from networkapi.util import destroy_cache_function, convert_string_or_int_to_boolean
 from networkapi.filter.models import Filter
 from networkapi import settings
+import copy
 import glob
 import commands
 
@@ -41,19 +42,19 @@ def get_core_name(rack):
     name_core2 = None
 
     try:
-        interfaces2 = Interface.search(rack.id_ilo.id)
+        interfaces2 = list(Interface.search(rack.id_ilo.id))
+        uplinks = Interface.search_nearest_interfaces(interfaces2, (
+            TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH, TipoEquipamento.TIPO_EQUIPAMENTO_ROUTER))
         for interface2 in interfaces2:
-            try:
-                sw = interface2.get_switch_and_router_interface_from_host_interface(None)
-
-                if sw.equipamento.nome.split('-')[0]=='OOB':
-                    if sw.equipamento.nome.split('-')[2]=='01':
-                        name_core1 = sw.equipamento.nome
-                    elif sw.equipamento.nome.split('-')[2]=='02':
-                        name_core2 = sw.equipamento.nome
+            sw = uplinks.get(interface2.id)
+            if sw is None:
+                continue
 
-            except InterfaceNotFoundError:
-                next
+            if sw.equipamento.nome.split('-')[0]=='OOB':
+                if sw.equipamento.nome.split('-')[2]=='01':
+                    name_core1 = sw.equipamento.nome
+                elif sw.equipamento.nome.split('-')[2]=='02':
+                    name_core2 = sw.equipamento.nome
 
     except e:
         raise RackAplError(None,rack.nome,"Erro ao buscar os nomes do Core associado ao Switch de gerencia %s" % rack.id_ilo.id)
@@ -233,17 +234,53 @@ def inserir_equip(user, variablestochangecore, rede_id):
 
     return 0
 
-def ambiente_spn_lf(user, rack, environment_list):
+class PlanoRack(object):
+    """Grupo L3, ambientes, vlans, redes e ips a criar para um rack, na ordem em que
+    devem ser criados. O plano eh todo calculado antes de gravar qualquer coisa.
+
+    Cada passo eh um dict com o tipo do passo, a mensagem de erro caso ele falhe
+    e os dados usados para criar o objeto.
+    """
+
+    def __init__(self):
+        self.passos = []
+
+    def adicionar(self, tipo, erro, **dados):
+        # Os dicionarios de ambientes, ranges e hosts sao reaproveitados pelos loops
+        passo = copy.deepcopy(dados)
+        passo['tipo'] = tipo
+        passo['erro'] = erro
+        self.passos.append(passo)
+
+def _config(hosts):
+    return dict((key, hosts.get(key)) for key in ('REDE', 'PREFIX', 'VERSION', 'TIPO'))
+
+def planejar_vlan_so(plano, variablestochangecore1, variablestochangecore2):
+
+    ambientes=dict()
+    ambientes['DC']=settings.DIVISAODC_MGMT
+    ambientes['LOG']=settings.AMBLOG_MGMT
+    ambientes['L3']=settings.GRPL3_MGMT
+
+    #criar e ativar a vlan e a rede
+    plano.adicionar('vlan', "Erro ao criar a VLAN_SO.", variaveis=variablestochangecore1, ambientes=ambientes)
+    plano.adicionar('rede', "Erro ao criar a rede da VLAN_SO", versao="ipv4",
+                    tipo_rede="Rede invalida equipamentos", variaveis=variablestochangecore1)
+    #inserir os Core
+    plano.adicionar('equipamento', "Erro ao inserir o core 1 e 2", variaveis=variablestochangecore1)
+    plano.adicionar('equipamento', "Erro ao inserir o core 1 e 2", variaveis=variablestochangecore2)
+
+def planejar_spn_lf(plano, rack):
 
-    vlans, redes, ipv6 = dic_lf_spn(user, rack.numero)
+    erro = "Erro ao criar os ambientes e alocar as vlans do Spine-leaf."
+
+    vlans, redes, ipv6 = dic_lf_spn(None, rack.numero)
 
     divisaoDC = ['BE', 'FE', 'BORDA', 'BORDACACHOS']
     vrfNames = ['BEVrf', 'FEVrf', 'BordaVrf', 'BordaCachosVrf']
     spines = ['01', '02', '03', '04']
 
-    grupol3 = GrupoL3()
-    grupol3.nome = rack.nome
-    grupol3.save(user)
+    plano.adicionar('grupo_l3', erro, nome=rack.nome)
 
     ambientes= dict()   
     ambientes['L3']= rack.nome
@@ -266,14 +303,13 @@ def ambiente_spn_lf(user, rack, environment_list):
             ranges['MAX'] = vlans.get(vlan_name)[rack.numero][int(i[1])-1]+119 
             ranges['MIN'] = vlans.get(vlan_name)[rack.numero][int(i[1])-1]
 
-            env = criar_ambiente(user, ambientes, ranges, None, None, vrf)
-            environment_list.append(env)
+            plano.adicionar('ambiente', erro, ambientes=ambientes, ranges=ranges, acl_path=None, filter=None, vrf=vrf)
             vlan = dict()
             vlan['VLAN_NUM'] = vlans.get(vlan_name)[rack.numero][int(i[1])-1]
             vlan['VLAN_NAME'] = "VLAN_"+"SPN"+i[1]+'LF'+"_"+divisaodc
-            vlan = criar_vlan(user, vlan, ambientes)
-            criar_rede(user, hosts['TIPO'], redes.get(rede+'_net'), vlan)
-            criar_rede_ipv6(user, ipv6['TIPO'], ipv6.get(rede_ipv6+'_net'), vlan)
+            plano.adicionar('vlan', erro, variaveis=vlan, ambientes=ambientes)
+            plano.adicionar('rede', erro, versao="ipv4", tipo_rede=hosts['TIPO'], variaveis=redes.get(rede+'_net'))
+            plano.adicionar('rede', erro, versao="ipv6", tipo_rede=ipv6['TIPO'], variaveis=ipv6.get(rede_ipv6+'_net'))
 
             #configuracao do ambiente
             hosts['REDE'] = redes.get(rede)
@@ -281,16 +317,16 @@ def ambiente_spn_lf(user, rack, environment_list):
 
             ambientes['LOG']= "SPINE"+i+"LEAF"
             hosts['VERSION']="ipv4"
-            config_ambiente(user, hosts, ambientes)
+            plano.adicionar('config_ambiente', erro, hosts=_config(hosts), ambientes=ambientes)
 
             ipv6['REDE']= ipv6.get(rede_ipv6)
             ipv6['PREFIX']="127"
             ipv6['VERSION']="ipv6"
-            config_ambiente(user, ipv6, ambientes)
+            plano.adicionar('config_ambiente', erro, hosts=_config(ipv6), ambientes=ambientes)
 
-    return environment_list
+def planejar_prod(plano, rack):
 
-def ambiente_prod(user, rack, environment_list):
+    erro = "Erro ao criar os ambientes de produção."
 
     redes, ipv6 = dic_pods(rack.numero)
 
@@ -320,8 +356,7 @@ def ambiente_prod(user, rack, environment_list):
         ranges['MAX']= redes.get(vlan_max)
         ranges['MIN']= redes.get(vlan_min)
 
-        env = criar_ambiente(user, ambientes, ranges, acl_path, "Servidores", "BEVrf")
-        environment_list.append(env)
+        plano.adicionar('ambiente', erro, ambientes=ambientes, ranges=ranges, acl_path=acl_path, filter="Servidores", vrf="BEVrf")
 
         #configuracao dos ambientes
         prefix = divisaodc+"_PREFIX"
@@ -330,16 +365,16 @@ def ambiente_prod(user, rack, environment_list):
         hosts['PREFIX']= redes.get(prefix)
         hosts['REDE']= redes.get(rede)
         hosts['VERSION']="ipv4"
-        config_ambiente(user, hosts, ambientes)
+        plano.adicionar('config_ambiente', erro, hosts=_config(hosts), ambientes=ambientes)
 
         ipv6['PREFIX']=ipv6.get(prefix)
         ipv6['REDE']=ipv6.get(rede)
         ipv6['VERSION']="ipv6"
-        config_ambiente(user, ipv6, ambientes)
+        plano.adicionar('config_ambiente', erro, hosts=_config(ipv6), ambientes=ambientes)
 
-    return environment_list
+def planejar_cloud(plano, rack):
 
-def ambiente_cloud(user, rack, environment_list):
+    erro = "Erro ao criar os ambientes e alocar as vlans da Cloud."
 
     hosts, ipv6 = dic_hosts_cloud(rack.numero)
 
@@ -354,17 +389,16 @@ def ambiente_cloud(user, rack, environment_list):
     aclpath = 'BECLOUD'
 
     #criar ambiente cloud
-    env = criar_ambiente(user, ambientes, ranges, aclpath, "Servidores")
-    environment_list.append(env)
+    plano.adicionar('ambiente', erro, ambientes=ambientes, ranges=ranges, acl_path=aclpath, filter="Servidores", vrf=None)
 
     #configuracao do ambiente
     hosts['TIPO']= "Rede invalida equipamentos"
     hosts['VERSION']= "ipv4"
-    config_ambiente(user, hosts, ambientes)
+    plano.adicionar('config_ambiente', erro, hosts=_config(hosts), ambientes=ambientes)
     #ipv6
     ipv6['TIPO']= "Rede invalida equipamentos"
     ipv6['VERSION']="ipv6"
-    config_ambiente(user, ipv6, ambientes)
+    plano.adicionar('config_ambiente', erro, hosts=_config(ipv6), ambientes=ambientes)
 
     #inserir vlans
     amb_cloud = ['BE','FE','BO','CA','FILER']
@@ -374,14 +408,14 @@ def ambiente_cloud(user, rack, environment_list):
         variables['VLAN_NUM'] = hosts.get(numero)
         variables['VLAN_NAME'] = "MNGT_"+amb+"_"+rack.nome
         
-        vlan = criar_vlan(user, variables, ambientes)
+        plano.adicionar('vlan', erro, variaveis=variables, ambientes=ambientes)
         #criar rede
-        criar_rede(user, "Rede invalida equipamentos", hosts.get(amb), vlan)
-        criar_rede_ipv6(user, "Rede invalida equipamentos", ipv6.get(amb), vlan)
+        plano.adicionar('rede', erro, versao="ipv4", tipo_rede="Rede invalida equipamentos", variaveis=hosts.get(amb))
+        plano.adicionar('rede', erro, versao="ipv6", tipo_rede="Rede invalida equipamentos", variaveis=ipv6.get(amb))
 
-    return environment_list
+def planejar_prod_fe(plano, rack):
 
-def ambiente_prod_fe(user, rack, environment_list):
+    erro = "Erro ao criar os ambientes de FE."
 
     redes, ranges, ipv6 = dic_fe_prod(rack.numero)
 
@@ -396,19 +430,18 @@ def ambiente_prod_fe(user, rack, environment_list):
     acl_path = 'FECLOUD'
 
     #criar ambiente
-    env = criar_ambiente(user, ambientes, ranges, acl_path, "Servidores", "FEVrf")
-    environment_list.append(env)
+    plano.adicionar('ambiente', erro, ambientes=ambientes, ranges=ranges, acl_path=acl_path, filter="Servidores", vrf="FEVrf")
 
     #configuracao dos ambientes
     redes['VERSION']="ipv4"
-    config_ambiente(user, redes, ambientes)
+    plano.adicionar('config_ambiente', erro, hosts=_config(redes), ambientes=ambientes)
 
     ipv6['VERSION']="ipv6"
-    config_ambiente(user, ipv6, ambientes)
+    plano.adicionar('config_ambiente', erro, hosts=_config(ipv6), ambientes=ambientes)
 
-    return environment_list
+def planejar_borda(plano, rack):
 
-def ambiente_borda(user,rack, environment_list):
+    erro = "Erro ao criar os ambientes de Borda."
 
     ranges=dict()
     ranges['MAX']=None
@@ -437,8 +470,57 @@ def ambiente_borda(user,rack, environment_list):
         ranges['MIN']= ranges_vlans.get(vlan_min)
 
         ambientes['DC']= divisaodc
-        env = criar_ambiente(user, ambientes,ranges, acl_path, "Servidores", vrf)
-        environment_list.append(env)
+        plano.adicionar('ambiente', erro, ambientes=ambientes, ranges=ranges, acl_path=acl_path, filter="Servidores", vrf=vrf)
+
+def planejar_rack(rack, name_core1, name_core2):
+    """Calcula, sem gravar nada, tudo o que deve ser criado para o rack: a VLAN de
+    gerencia SO, os ambientes do Spine-leaf, de produção, da Cloud, de FE e de Borda.
+    """
+    plano = PlanoRack()
+
+    variablestochangecore1 = dic_vlan_core({}, rack.numero, name_core1, rack.nome)
+    variablestochangecore2 = dic_vlan_core({}, rack.numero, name_core2, rack.nome)
+
+    planejar_vlan_so(plano, variablestochangecore1, variablestochangecore2)
+    planejar_spn_lf(plano, rack)
+    planejar_prod(plano, rack)
+    planejar_cloud(plano, rack)
+    planejar_prod_fe(plano, rack)
+    planejar_borda(plano, rack)
+
+    return plano
+
+def criar_plano(user, rack, plano):
+    """Cria os objetos do plano, na ordem, dentro da transação da requisição.
+
+    @return: Lista dos ambientes criados.
+    """
+    environment_list = []
+    vlan = None
+    network = None
+
+    for passo in plano.passos:
+        try:
+            tipo = passo['tipo']
+            if tipo == 'grupo_l3':
+                grupol3 = GrupoL3()
+                grupol3.nome = passo['nome']
+                grupol3.save(user)
+            elif tipo == 'ambiente':
+                env = criar_ambiente(user, passo['ambientes'], passo['ranges'], passo['acl_path'], passo['filter'], passo['vrf'])
+                environment_list.append(env)
+            elif tipo == 'config_ambiente':
+                config_ambiente(user, passo['hosts'], passo['ambientes'])
+            elif tipo == 'vlan':
+                vlan = criar_vlan(user, passo['variaveis'], passo['ambientes'])
+            elif tipo == 'rede' and passo['versao'] == "ipv4":
+                network = criar_rede(user, passo['tipo_rede'], passo['variaveis'], vlan)
+            elif tipo == 'rede':
+                criar_rede_ipv6(user, passo['tipo_rede'], passo['variaveis'], vlan)
+            elif tipo == 'equipamento':
+                inserir_equip(user, passo['variaveis'], network.id)
+        except:
+            raise RackAplError(None, rack.nome, passo['erro'])
 
     return environment_list
 
@@ -522,81 +604,35 @@ class RackAplicarConfigResource(RestResource):
             if rack.create_vlan_amb:
                 raise RackAplError(None, rack.nome, "As vlans, redes e ambientes ja foram criados.")
 
-            #variaveis
-            name_core1, name_core2 =  get_core_name(rack)
+            # Com dry_run=1 so retorna o plano, sem gravar nada
+            dry_run = convert_string_or_int_to_boolean(request.REQUEST.get('dry_run', '0'))
+            etapas = Etapas()
 
-            environment_list = []
+            #######################################################################                   Plano
+            with etapas.etapa('plano'):
+                name_core1, name_core2 =  get_core_name(rack)
+                plano = planejar_rack(rack, name_core1, name_core2)
 
-            variablestochangecore1 = {}
-            variablestochangecore2 = {}
-            variablestochangecore1 = dic_vlan_core(variablestochangecore1, rack.numero, name_core1, rack.nome)
-            variablestochangecore2 = dic_vlan_core(variablestochangecore2, rack.numero, name_core2, rack.nome)
+            if dry_run:
+                return self.response(dumps_networkapi({'plano': {'passos': plano.passos, 'tempos': etapas.tempos()}}))
 
-            #######################################################################           VLAN Gerencia SO
-            ambientes=dict()
-            ambientes['DC']=settings.DIVISAODC_MGMT
-            ambientes['LOG']=settings.AMBLOG_MGMT
-            ambientes['L3']=settings.GRPL3_MGMT
-    
-            try:
-                #criar e ativar a vlan
-                vlan = criar_vlan(user, variablestochangecore1, ambientes)
-            except:
-                raise RackAplError(None, rack.nome, "Erro ao criar a VLAN_SO.")
-            try:
-                #criar e ativar a rede
-                network = criar_rede(user, "Rede invalida equipamentos", variablestochangecore1, vlan)
-            except:
-                raise RackAplError(None, rack.nome, "Erro ao criar a rede da VLAN_SO")
-            try:
-                #inserir os Core
-                inserir_equip(user, variablestochangecore1, network.id)           
-                inserir_equip(user, variablestochangecore2, network.id)            
-            except:
-                raise RackAplError(None, rack.nome, "Erro ao inserir o core 1 e 2")
-                
-            #######################################################################                   Ambientes
-
-            #BE - SPINE - LEAF
-            try:
-                environment_list = ambiente_spn_lf(user, rack, environment_list)
-            except:
-                raise RackAplError(None, rack.nome, "Erro ao criar os ambientes e alocar as vlans do Spine-leaf.")
-
-            #BE - PRODUCAO
-            try:
-                environment_list = ambiente_prod(user, rack, environment_list)
-            except:
-                raise RackAplError(None, rack.nome, "Erro ao criar os ambientes de produção.")
-
-            #BE - Hosts - CLOUD
-            try:
-                environment_list = ambiente_cloud(user, rack, environment_list)
-            except:
-                raise RackAplError(None, rack.nome, "Erro ao criar os ambientes e alocar as vlans da Cloud.")
-
-            #FE
-            try:
-                environment_list = ambiente_prod_fe(user, rack, environment_list)
-            except:
-                raise RackAplError(None, rack.nome, "Erro ao criar os ambientes de FE.")
-
-            #Borda
-            try:
-                environment_list = ambiente_borda(user, rack, environment_list)
-            except:
-                raise RackAplError(None, rack.nome, "Erro ao criar os ambientes de Borda.")
+            #######################################################################                   Ambientes, vlans e redes
+            with etapas.etapa('banco'):
+                environment_list = criar_plano(user, rack, plano)
+                environment_rack(user, environment_list, rack)
 
             #######################################################################                   Backuper
-
-            aplicar(rack)
-            environment_rack(user, environment_list, rack)
+            with etapas.etapa('aplicar'):
+                aplicar(rack)
 
             rack.__dict__.update(id=rack.id, create_vlan_amb=True)
             rack.save(user)
 
+            self.log.info(u'Tempos da aplicacao da configuracao do rack %s: %s' % (rack.nome, etapas.tempos()))
+
             success_map = dict()
             success_map['rack_conf'] = True
+            success_map['tempos'] = etapas.tempos()
             map = dict()
             map['sucesso'] = success_map
 
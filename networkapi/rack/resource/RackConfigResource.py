@@ -22,9 +22,11 @@ from networkapi.rack.models import RackConfigError, RackNumberNotFoundError, Rac
 from networkapi.infrastructure.xml_utils import dumps_networkapi
 from networkapi.log import Log
 from networkapi.rest import RestResource, UserNotAuthorizedError
+from networkapi.util import convert_string_or_int_to_boolean
 from networkapi.equipamento.models import EquipamentoRoteiro
 from networkapi.interface.models import Interface, InterfaceNotFoundError
-from networkapi.rack.resource.GeraConfig import autoprovision_splf, autoprovision_coreoob
+from networkapi.equipamento.models import TipoEquipamento
+from networkapi.rack.resource.GeraConfig import planejar_splf, planejar_coreoob, replace_many, Etapas
 from networkapi.ip.models import Ip, IpEquipamento
 from networkapi import settings
 from netaddr import IPNetwork
@@ -59,7 +61,15 @@ def buscar_ip(id_sw):
 
     return ip_sw
 
-def gera_config(rack):
+def buscar_uplinks(interfaces):
+    # Interfaces de switch ou roteador ligadas as interfaces, buscadas de uma vez
+    return Interface.search_nearest_interfaces(interfaces, (
+        TipoEquipamento.TIPO_EQUIPAMENTO_SWITCH, TipoEquipamento.TIPO_EQUIPAMENTO_ROUTER))
+
+def planejar_config(rack):
+    """Busca os dados do rack e retorna os arquivos de configuracao a gerar,
+    uma lista de (roteiro, arquivo de saida, variaveis), sem gravar nada.
+    """
 
     num_rack=None
     id_lf1=None
@@ -114,10 +124,11 @@ def gera_config(rack):
 
     #Interface leaf01
     try:
-        interfaces = Interface.search(id_lf1)
+        interfaces = list(Interface.search(id_lf1))
+        uplinks = buscar_uplinks(interfaces)
         for interface in interfaces:
             try: 
-                sw = interface.get_switch_and_router_interface_from_host_interface(None)
+                sw = uplinks[interface.id]
                 if sw.equipamento.nome.split('-')[2]=='01' or sw.equipamento.nome.split('-')[2]=='1': 
                     int_lf1_sp1 = interface.interface
                     name_sp1 = sw.equipamento.nome
@@ -140,10 +151,11 @@ def gera_config(rack):
 
     #Interface leaf02
     try:
-        interfaces1 = Interface.search(id_lf2)
+        interfaces1 = list(Interface.search(id_lf2))
+        uplinks = buscar_uplinks(interfaces1)
         for interface1 in interfaces1:
             try:
-                sw = interface1.get_switch_and_router_interface_from_host_interface(None)
+                sw = uplinks[interface1.id]
                 if sw.equipamento.nome.split('-')[2]=='03' or sw.equipamento.nome.split('-')[2]=='3':
                     int_lf2_sp3 = interface1.interface
                     name_sp3 = sw.equipamento.nome
@@ -166,10 +178,11 @@ def gera_config(rack):
 
     #Interface OOB
     try:
-        interfaces2 = Interface.search(id_oob)
+        interfaces2 = list(Interface.search(id_oob))
+        uplinks = buscar_uplinks(interfaces2)
         for interface2 in interfaces2:
             try:
-                sw = interface2.get_switch_and_router_interface_from_host_interface(None)
+                sw = uplinks[interface2.id]
                 if sw.equipamento.nome.split('-')[0]=='OOB':
                     if sw.equipamento.nome.split('-')[2]=='01' or sw.equipamento.nome.split('-')[2]=='1':
                         int_oob_core1 = interface2.interface
@@ -268,6 +281,14 @@ def gera_config(rack):
         raise RackConfigError(None,rack.nome,"Erro ao buscar o ip de gerencia do oob.")
 
 
+    arquivos = planejar_splf(num_rack, FILEINLF1, FILEINLF2, FILEINSP1, FILEINSP2, FILEINSP3, FILEINSP4, name_lf1, name_lf2, name_oob, name_sp1, name_sp2, name_sp3, name_sp4, ip_mgmtlf1, ip_mgmtlf2, int_oob_mgmtlf1, int_oob_mgmtlf2, int_sp1, int_sp2, int_sp3, int_sp4, int_lf1_sp1, int_lf1_sp2, int_lf2_sp3, int_lf2_sp4)
+
+    arquivos.extend(planejar_coreoob(num_rack, FILEINCR1, FILEINCR2, FILEINOOB, name_core1, name_core2, name_oob, name_lf1, name_lf2, ip_mgmtoob, int_oob_core1, int_oob_core2, int_core1_oob, int_core2_oob))
+
+    return arquivos
+
+def cadastrar_foreman(rack):
+
     #begin - Create Foreman entries for rack switches
     if settings.USE_FOREMAN:
         foreman = Foreman(settings.FOREMAN_URL, (settings.FOREMAN_USERNAME, settings.FOREMAN_PASSWORD), api_version=2)
@@ -311,14 +332,29 @@ def gera_config(rack):
             if not switch_cadastrado:
                 raise RackConfigError(None, rack.nome, "Unknown error. Could not create entry for %s in foreman." % (switch.nome))
     #end - Create Foreman entries for rack switches
-    var1 = autoprovision_splf(num_rack, FILEINLF1, FILEINLF2, FILEINSP1, FILEINSP2, FILEINSP3, FILEINSP4, name_lf1, name_lf2, name_oob, name_sp1, name_sp2, name_sp3, name_sp4, ip_mgmtlf1, ip_mgmtlf2, int_oob_mgmtlf1, int_oob_mgmtlf2, int_sp1, int_sp2, int_sp3, int_sp4, int_lf1_sp1, int_lf1_sp2, int_lf2_sp3, int_lf2_sp4)
 
-    var2 = autoprovision_coreoob(num_rack, FILEINCR1, FILEINCR2, FILEINOOB, name_core1, name_core2, name_oob, name_lf1, name_lf2, ip_mgmtoob, int_oob_core1, int_oob_core2, int_core1_oob, int_core2_oob )
+def gera_config(rack, etapas, dry_run=False):
+    """Gera os arquivos de configuracao do rack em etapas: o plano com todos os
+    arquivos, o cadastro no Foreman e a geracao dos arquivos em paralelo.
+
+    @param etapas: Etapas onde sao registrados os tempos de cada etapa.
+    @param dry_run: Se True, so retorna o plano, sem gravar nada.
 
-    if var1 and var2:
-        return True
+    @return: Lista de (roteiro, arquivo de saida, variaveis) dos arquivos.
+    """
+    with etapas.etapa('plano'):
+        arquivos = planejar_config(rack)
 
-    return False
+    if dry_run:
+        return arquivos
+
+    with etapas.etapa('foreman'):
+        cadastrar_foreman(rack)
+
+    with etapas.etapa('arquivos'):
+        replace_many(arquivos, settings.RACK_CONFIG_WORKERS)
+
+    return arquivos
 
 class RackConfigResource(RestResource):
 
@@ -343,14 +379,27 @@ class RackConfigResource(RestResource):
             rack = rack.get_by_pk(rack_id)
             var = False
 
+            # Com dry_run=1 so retorna os arquivos que seriam gerados
+            dry_run = convert_string_or_int_to_boolean(request.REQUEST.get('dry_run', '0'))
+            etapas = Etapas()
+
             #Chama o script para gerar os arquivos de configuracao
-            var = gera_config(rack)
+            arquivos = gera_config(rack, etapas, dry_run)
+
+            if dry_run:
+                plano = [{'roteiro': filein, 'arquivo': fileout, 'variaveis': variaveis}
+                         for filein, fileout, variaveis in arquivos]
+                return self.response(dumps_networkapi({'plano': {'arquivos': plano, 'tempos': etapas.tempos()}}))
 
+            var = True
             rack.__dict__.update(id=rack_id, config=var)
             rack.save(user) 
 
+            self.log.info(u'Tempos da geracao da configuracao do rack %s: %s' % (rack.nome, etapas.tempos()))
+
             success_map = dict()
             success_map['rack_conf'] = var
+            success_map['tempos'] = etapas.tempos()
             map = dict()
             map['sucesso'] = success_map
                         
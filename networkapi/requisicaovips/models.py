@@ -19,7 +19,7 @@ from __future__ import with_statement
 from django.db import models
 from django.db.models import Q
 from networkapi.healthcheckexpect.models import HealthcheckExpect
-from networkapi.ip.models import Ip, Ipv6, IpNotFoundByEquipAndVipError
+from networkapi.ip.models import Ip, Ipv6, IpNotFoundByEquipAndVipError, get_network_index
 from networkapi.ambiente.models import EnvironmentVip, IP_VERSION, Ambiente
 from django.core.exceptions import ObjectDoesNotExist
 from _mysql_exceptions import OperationalError
@@ -1422,31 +1422,11 @@ class RequisicaoVips(BaseModel):
             ip = Ip.get_by_octs_and_environment_vip(
                 ip_list[0], ip_list[1], ip_list[2], ip_list[3], evip.id, valid)
 
-            lista_ips_equip = list()
-            lista_amb_div_4 = list()
-
-            # GET DIVISAO DC AND AMBIENTE_LOGICO OF NET4
-            for net in evip.networkipv4_set.select_related().all():
-
-                dict_div_4 = dict()
-                dict_div_4['divisao_dc'] = net.vlan.ambiente.divisao_dc_id
-                dict_div_4['ambiente_logico'] = net.vlan.ambiente.ambiente_logico_id
-
-                if dict_div_4 not in lista_amb_div_4:
-                    lista_amb_div_4.append(dict_div_4)
-
-            # Get all IPV4's Equipment
-            for ipequip in equip.ipequipamento_set.select_related().all():
-                if ipequip.ip not in lista_ips_equip:
-                    for dict_div_amb in lista_amb_div_4:
-                        if ipequip.ip.networkipv4.ambient_vip is not None and ipequip.ip.networkipv4.ambient_vip.id == evip.id:
-                            if (ipequip.ip.networkipv4.vlan.ambiente.divisao_dc_id == dict_div_amb.get(
-                                    'divisao_dc') and ipequip.ip.networkipv4.vlan.ambiente.ambiente_logico_id == dict_div_amb.get(
-                                'ambiente_logico')):
-                                lista_ips_equip.append(ipequip.ip)
-
             if valid == True:
-                if not ip in lista_ips_equip:
+                # The IP must be of a network of the environment vip, and of the equipment
+                network = get_network_index(IP_VERSION.IPv4[0]).get(ip.networkipv4_id)
+                if network is None or network.environment_vip_id != evip.id \
+                        or not equip.ipequipamento_set.filter(ip=ip.id).exists():
                     raise IpNotFoundByEquipAndVipError(None,
                                                        'Ipv4 não está relacionado com equipamento %s e Ambiente Vip: %s' % (
                                                            equip.name, evip.show_environment_vip()))
@@ -1457,31 +1437,10 @@ class RequisicaoVips(BaseModel):
             ip = Ipv6.get_by_octs_and_environment_vip(ip_list[0], ip_list[1], ip_list[
                 2], ip_list[3], ip_list[4], ip_list[5], ip_list[6], ip_list[7], evip.id, valid)
 
-            lista_amb_div_6 = list()
-            lista_ipsv6_equip = list()
-
-            # GET DIVISAO DC AND AMBIENTE_LOGICO OF NET6
-            for net in evip.networkipv6_set.select_related().all():
-
-                dict_div_6 = dict()
-                dict_div_6['divisao_dc'] = net.vlan.ambiente.divisao_dc
-                dict_div_6[
-                    'ambiente_logico'] = net.vlan.ambiente.ambiente_logico
-                if dict_div_6 not in lista_amb_div_6:
-                    lista_amb_div_6.append(dict_div_6)
-
-            # Get all IPV6'S Equipment
-            for ipequip in equip.ipv6equipament_set.select_related().all():
-                if ipequip.ip not in lista_ipsv6_equip:
-                    for dict_div_amb in lista_amb_div_6:
-                        if ipequip.ip.networkipv6.ambient_vip is not None and ipequip.ip.networkipv6.ambient_vip.id == evip.id:
-                            if (ipequip.ip.networkipv6.vlan.ambiente.divisao_dc == dict_div_amb.get(
-                                    'divisao_dc') and ipequip.ip.networkipv6.vlan.ambiente.ambiente_logico == dict_div_amb.get(
-                                'ambiente_logico')):
-                                lista_ipsv6_equip.append(ipequip.ip)
-
             if valid == True:
-                if not ip in lista_ipsv6_equip:
+                network = get_network_index(IP_VERSION.IPv6[0]).get(ip.networkipv6_id)
+                if network is None or network.environment_vip_id != evip.id \
+                        or not equip.ipv6equipament_set.filter(ip=ip.id).exists():
                     raise IpNotFoundByEquipAndVipError(None,
                                                        'Ipv6 não está relacionado com equipamento %s e Ambiente Vip: %s' % (
                                                            equip.name, evip.show_environment_vip()))
@@ -47,6 +47,8 @@ from networkapi.util import is_valid_int_greater_zero_param, clone, \
 from networkapi.ambiente.models import EnvironmentVip, IP_VERSION
 from django.db.utils import IntegrityError
 from django.db import transaction
+from networkapi.eventlog.models import EventLog
+from networkapi.infrastructure import commit_hooks
 
 
 class RequestVipRealEditResource(RestResource):
@@ -651,7 +653,9 @@ def remove_reals_after_script(port_vip, ip_type, vip, port_real, priority, weigh
                                                           weight=weight,
                                                           ipv6=id_ip)
     server_pool_member.delete(user)
+    EventLog.flush_batch()
     transaction.commit()
+    commit_hooks.transaction_committed()
 
 
 def diff_reals(old_map, new_map):
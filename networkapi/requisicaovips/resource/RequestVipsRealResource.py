@@ -41,6 +41,8 @@ from networkapi.distributedlock import distributedlock, LOCK_VIP_IP_EQUIP
 from django.db.utils import IntegrityError
 from networkapi.requisicaovips.models import ServerPoolMember
 from django.db import transaction
+from networkapi.eventlog.models import EventLog
+from networkapi.infrastructure import commit_hooks
 
 
 class RequestVipsRealResource(RestResource):
@@ -492,4 +494,6 @@ URLs: /real/equip/<id_equip>/vip/<id_vip>/ip/<id_ip>/
                         [pool_member.delete(user)
                          for pool_member in pool_members]
             # commit to rollback when script return error
+            EventLog.flush_batch()
             transaction.commit()
+            commit_hooks.transaction_committed()
@@ -23,6 +23,10 @@ from rest_framework.exceptions import AuthenticationFailed
 from networkapi.api_rest.authentication import BasicAuthentication
 from networkapi.auth import authenticate
 from networkapi.error_message_utils import error_dumps
+from networkapi.eventlog.models import EventLog, EventLogError
+from networkapi.infrastructure import commit_hooks
+from networkapi.infrastructure import formats
+from networkapi.queue_tools import publisher
 from networkapi.usuario.models import UsuarioError
 from urllib2 import *
 from networkapi.log import Log
@@ -69,8 +73,19 @@ class RestResource(object):
         """Recebe a requisição e redireciona para o método apropriado.
 
         Antes de redirecionar para o método, é feita a autenticação do usuário.
+
+        Os logs de auditoria da requisição são acumulados e gravados de uma vez antes do commit,
+        e as mensagens para a fila e as funções de commit_hooks.on_commit só são executadas
+        depois do commit.
+
+        A resposta é gerada em XML, ou em JSON/msgpack conforme o header Accept, e o corpo
+        da requisição pode ser enviado nestes formatos informando o Content-Type.
         """
         response = None
+        formats.activate(request)
+        EventLog.start_batch()
+        publisher.start_batch()
+        commit_hooks.start_batch()
         try:
             user = self.authenticate_user(request)
 
@@ -103,12 +118,28 @@ class RestResource(object):
             password = '****'
             if response is not None:
                 if response.status_code == 200:
-                    transaction.commit()
+                    try:
+                        EventLog.flush_batch()
+                        transaction.commit()
+                        commit_hooks.run_batch()
+                        publisher.flush_batch()
+                    except EventLogError, e:
+                        transaction.rollback()
+                        commit_hooks.discard_batch()
+                        publisher.discard_batch()
+                        response = self.response_error(1)
                 else:
+                    EventLog.discard_batch()
+                    publisher.discard_batch()
                     transaction.rollback()
+                    commit_hooks.discard_batch()
             else:
+                EventLog.discard_batch()
+                publisher.discard_batch()
                 transaction.rollback()
+                commit_hooks.discard_batch()
                 self.log.debug(u'Requisição concluída com falha.')
+            formats.deactivate()
 
         return response
 
@@ -166,10 +197,12 @@ class RestResource(object):
 
     def response_error(self, code, *args):
         """Cria um HttpResponse com o XML de erro."""
-        return HttpResponse(error_dumps(code, *args), status=500, content_type='text/plain')
+        return self.response(error_dumps(code, *args), status=500)
 
     def response(self, content, status=200, content_type='text/plain'):
         """Cria um HttpResponse com os dados informados"""
+        # Maps in JSON or msgpack carry their own content type
+        content_type = getattr(content, 'content_type', content_type)
         return HttpResponse(content, status=status,
                             content_type=content_type)
 
@@ -16,8 +16,15 @@
 # limitations under the License.
 
 
+import time
+
+from django.conf import settings
 from django.db import models
 
+from networkapi.distributedlock import DEFAULT_TIMEOUT, LOCK_SEMAFORO
+from networkapi.distributedlock.metrics import metrics
+from networkapi.distributedlock.mysqllock import MySQLLock
+from networkapi.infrastructure import commit_hooks
 from networkapi.log import Log
 
 
@@ -50,12 +57,49 @@ class Semaforo(models.Model):
 
     @classmethod
     def lock(cls, id):
-        try:
-            semaforo = Semaforo.objects.get(pk=id)
-            semaforo.descricao = semaforo.descricao
-            semaforo.save()
-        except Exception, e:
-            cls.log.error(
-                u'Falha ao realizar o lock para o identificador %s.' % id)
-            raise SemaforoError(
-                e, u'Falha ao realizar o lock para o identificador %s.' % id)
+        '''Serializes the callers of the same identifier until the end of the transaction.
+
+        With the 'mysql' LOCK_BACKEND a named lock is used instead of the row update,
+        so waiters block in MySQL instead of in InnoDB lock waits. A named lock belongs
+        to the connection and not to the transaction, so it is released explicitly when
+        the transaction of the request (or job) is committed or rolled back. Out of a
+        commit_hooks batch it is only released when the connection is closed.
+
+        The wait and hold times go to the distributedlock metrics in both backends.
+        '''
+        key = LOCK_SEMAFORO % id
+        start = time.time()
+
+        if getattr(settings, 'LOCK_BACKEND', 'memcached') == 'mysql':
+            lock = MySQLLock(key, DEFAULT_TIMEOUT)
+            acquired = lock.acquire(True)
+            metrics.waited(key, time.time() - start, acquired)
+            if not acquired:
+                cls.log.error(
+                    u'Falha ao realizar o lock para o identificador %s.' % id)
+                raise SemaforoError(
+                    None, u'Falha ao realizar o lock para o identificador %s.' % id)
+        else:
+            lock = None
+            try:
+                semaforo = Semaforo.objects.get(pk=id)
+                semaforo.descricao = semaforo.descricao
+                semaforo.save()
+            except Exception, e:
+                metrics.waited(key, time.time() - start, False)
+                cls.log.error(
+                    u'Falha ao realizar o lock para o identificador %s.' % id)
+                raise SemaforoError(
+                    e, u'Falha ao realizar o lock para o identificador %s.' % id)
+            metrics.waited(key, time.time() - start, True)
+
+        acquired_at = time.time()
+
+        def release():
+            if lock is not None:
+                lock.release()
+            metrics.held(key, time.time() - acquired_at)
+
+        if not commit_hooks.on_transaction_end(release):
+            cls.log.warning(
+                u'Lock do identificador %s fora de uma requisição, liberado só ao fechar a conexão.' % id)
@@ -0,0 +1,66 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from unittest import TestCase
+
+from django.conf import settings
+from mock import patch
+
+from networkapi.distributedlock.metrics import metrics
+from networkapi.infrastructure import commit_hooks
+from networkapi.semaforo.model import Semaforo
+
+
+@patch.object(settings, 'LOCK_BACKEND', 'mysql')
+@patch('networkapi.semaforo.model.MySQLLock')
+class SemaforoMySQLLockTestCase(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        commit_hooks.discard_batch()
+
+    def test_released_after_commit(self, lock_class):
+        lock_class.return_value.acquire.return_value = True
+        commit_hooks.start_batch()
+
+        Semaforo.lock(Semaforo.ALOCAR_VLAN_ID)
+        self.assertEqual(0, lock_class.return_value.release.call_count)
+
+        commit_hooks.run_batch()
+        self.assertEqual(1, lock_class.return_value.release.call_count)
+        self.assertEqual(1, metrics.snapshot()['semaforo']['acquired'])
+
+    def test_released_after_rollback(self, lock_class):
+        lock_class.return_value.acquire.return_value = True
+        commit_hooks.start_batch()
+
+        Semaforo.lock(Semaforo.CRIAR_IP_ID)
+        commit_hooks.discard_batch()
+        self.assertEqual(1, lock_class.return_value.release.call_count)
+        self.assertTrue(metrics.snapshot()['semaforo']['hold_max'] >= 0)
+
+    def test_not_acquired(self, lock_class):
+        lock_class.return_value.acquire.return_value = False
+        commit_hooks.start_batch()
+
+        self.assertRaises(Exception, Semaforo.lock, Semaforo.CRIAR_IP_ID)
+        commit_hooks.run_batch()
+        self.assertEqual(0, lock_class.return_value.release.call_count)
+        self.assertEqual(1, metrics.snapshot()['semaforo']['not_acquired'])
@@ -58,6 +58,15 @@ LOG_DB_LEVEL = logging.DEBUG if LOG_SHOW_SQL else logging.INFO
 LOG_USE_STDOUT = False
 LOG_SHOW_TRACEBACK = True
 
+# Máximo de mensagens esperando a gravação no arquivo de log. As mensagens
+# acima do limite são descartadas para não bloquear as requisições.
+LOG_QUEUE_SIZE = 10000
+# Grava um arquivo de log por processo (nome do arquivo seguido do pid).
+LOG_PER_PROCESS_FILE = os.getenv('NETWORKAPI_LOG_PER_PROCESS_FILE', '0') == '1'
+# Fração das requisições que têm o corpo gravado no log, e tamanho máximo gravado.
+LOG_REQUEST_BODY_SAMPLE_RATE = float(os.getenv('NETWORKAPI_LOG_REQUEST_BODY_SAMPLE_RATE', '1.0'))
+LOG_REQUEST_BODY_MAX_SIZE = int(os.getenv('NETWORKAPI_LOG_REQUEST_BODY_MAX_SIZE', '2048'))
+
 # Inicialização do log
 # O primeiro parâmetro informa o nome do arquivo de log a ser gerado.
 # O segundo parâmetro é o número de dias que os arquivos ficarão mantidos.
@@ -112,6 +121,10 @@ CACHES = {
 # Diretório dos arquivos dos scripts
 #SCRIPTS_DIR = os.path.abspath(os.path.join(__file__, '../../scripts'))
 SCRIPTS_DIR = os.getenv("NETWORKAPI_SCRIPTS_DIR", os.path.abspath(os.path.join(__file__, '../../scripts')))
+# Tempo máximo padrão de cada script, em segundos. Scripts que passam dele são mortos.
+SCRIPT_TIMEOUT = int(os.getenv('NETWORKAPI_SCRIPT_TIMEOUT', '600'))
+# Número máximo de scripts rodando ao mesmo tempo em cada processo.
+SCRIPT_MAX_CONCURRENCY = int(os.getenv('NETWORKAPI_SCRIPT_MAX_CONCURRENCY', '16'))
 
 # Armazena a raiz do projeto.
 SITE_ROOT = os.path.abspath(__file__ + '/../../')
@@ -151,10 +164,12 @@ LOGGING = {
     'handlers': {
         'log_file': {
             'level': LOG_LEVEL,
-            'class': 'logging.handlers.WatchedFileHandler',
+            'class': 'networkapi.log.AsyncFileHandler',
             'filename': LOG_FILE,
             'formatter': 'verbose',
             'mode': 'a',
+            'per_process': LOG_PER_PROCESS_FILE,
+            'max_queue_size': LOG_QUEUE_SIZE,
         },
     },
     'loggers': {
@@ -235,6 +250,35 @@ SECRET_KEY = 'ry@zgop%w80_nu83#!tbz)m&7*i@1)d-+ki@5^d#%6-&^216sg'
 VLAN_CACHE_TIME = None
 EQUIPMENT_CACHE_TIME = None
 
+# Time in seconds that the bitmap of used IPv4 of a network stays in cache.
+IPV4_INDEX_CACHE_TIME = 3600
+
+# Time in seconds that the occupied ranges of IPv6 of a network stay in cache.
+IPV6_INDEX_CACHE_TIME = 3600
+
+# Time in seconds that the VLAN numbers used by an environment stay in cache.
+VLAN_NUMBERS_CACHE_TIME = 3600
+
+# Time in seconds that the permission matrix of a user stays in cache.
+PERMISSION_CACHE_TIME = 3600
+
+# Time in seconds after which a process reloads its index of networks from database,
+# even if no network change was announced. Changes are kept in cache for as long.
+NETWORK_INDEX_MAX_AGE = 600
+
+# Time in seconds that the links of an interface stay in cache.
+INTERFACE_GRAPH_CACHE_TIME = 3600
+
+# Audit logs of a request are written with one insert before the commit. When
+# True, the insert is done by a background thread after the commit, so it does
+# not delay the request.
+EVENTLOG_ASYNC_WRITER = False
+
+# Backend of networkapi.distributedlock: 'memcached' or 'mysql'. The 'mysql'
+# backend uses GET_LOCK (MySQL 5.7 or newer), which wakes a waiter up as soon as
+# the lock is released. The lock is not granted in arrival order.
+LOCK_BACKEND = 'memcached'
+
 # List of callables that know how to import templates from various sources.
 TEMPLATE_LOADERS = (
     'django.template.loaders.filesystem.Loader',
@@ -245,6 +289,7 @@ TEMPLATE_LOADERS = (
 if LOG_SHOW_SQL:
     MIDDLEWARE_CLASSES = (
         'networkapi.extra_logging.middleware.ExtraLoggingMiddleware',
+        'networkapi.infrastructure.commit_hooks.CommitHooksMiddleware',
         'django.middleware.common.CommonMiddleware',
         #        'django.contrib.sessions.middleware.SessionMiddleware',
         #        'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -254,6 +299,7 @@ if LOG_SHOW_SQL:
 else:
     MIDDLEWARE_CLASSES = (
         'networkapi.extra_logging.middleware.ExtraLoggingMiddleware',
+        'networkapi.infrastructure.commit_hooks.CommitHooksMiddleware',
         'django.middleware.common.CommonMiddleware',
         'networkapi.processExceptionMiddleware.LoggingMiddleware',
         #        'django.contrib.sessions.middleware.SessionMiddleware',
@@ -296,6 +342,7 @@ INSTALLED_APPS = (
     'rest_framework',
     'networkapi.snippets',
     'networkapi.api_pools',
+    'networkapi.api_job',
     'django_extensions',
 )
 
@@ -358,6 +405,12 @@ POOL_REAL_DISABLE = 'gerador_vips -p %s --id_ip %s --port_ip %s --dis'
 POOL_REAL_CHECK = 'gerador_vips -p %s --id_ip %s --port_ip %s --chk'
 POOL_REAL_CHECK_BY_POOL = 'gerador_vips --pool %s --check_status'
 POOL_REAL_CHECK_BY_VIP = 'gerador_vips --vip %s --check_status'
+# Time in seconds the status check of a pool may take before it is killed.
+POOL_MEMBER_STATUS_TIMEOUT = 30
+# Number of pools whose status is checked at the same time.
+POOL_MEMBER_STATUS_WORKERS = 8
+# Time in seconds that the checked status of the members of a pool stays in cache.
+POOL_MEMBER_STATUS_CACHE_TIME = 30
 POOL_SERVICEDOWNACTION = 'gerador_vips --pool %s --servicedownaction'
 POOL_MEMBER_PRIORITIES = 'gerador_vips --pool %s --priority'
 
@@ -406,6 +459,11 @@ QUEUE_DESTINATION = u"/topic/networkapi_queue"
 QUEUE_BROKER_URI = NETWORKAPI_BROKER_URI
 QUEUE_BROKER_CONNECT_TIMEOUT = int(NETWORKAPI_BROKER_CONNECT_TIMEOUT)
 
+# Messages are kept in this file while the broker is down, and sent when it is back.
+BROKER_SPOOL_FILE = os.getenv('NETWORKAPI_BROKER_SPOOL_FILE', '/tmp/networkapi_queue.spool')
+# Longest wait in seconds between two tries to reconnect to the broker.
+BROKER_MAX_BACKOFF = 60
+
 ###################################
 #    PATH ACLS
 ###################################
@@ -424,6 +482,9 @@ PATH_TO_GUIDE = os.getenv('NETWORKAPI_PATH_TO_GUIDE','/vagrant/networkapi/rack/r
 PATH_TO_CONFIG = os.getenv('NETWORKAPI_PATH_TO_CONFIG','/vagrant/networkapi/rack/roteiros/')
 PATH_TO_MV = os.getenv('NETWORKAPI_PATH_TO_MV','/vagrant/networkapi/rack/roteiros/')
 
+# Numero de threads que geram os arquivos de configuracao de um rack
+RACK_CONFIG_WORKERS = int(os.getenv('NETWORKAPI_RACK_CONFIG_WORKERS', '4'))
+
 LEAF = "LF-CM"
 OOB = "OOB-CM"
 SPN = "SPN-CM"
@@ -486,8 +547,26 @@ NETWORK_CONFIG_TEMPLATE_PATH = CONFIG_TEMPLATE_PATH+NETWORK_CONFIG_REL_PATH
 NETWORK_CONFIG_FILES_PATH = TFTPBOOT_FILES_PATH+CONFIG_FILES_REL_PATH+NETWORK_CONFIG_REL_PATH
 #networkapi/generated_config/interface/
 NETWORK_CONFIG_TOAPPLY_REL_PATH = CONFIG_FILES_REL_PATH+NETWORK_CONFIG_REL_PATH
+# Number of equipments configured at the same time by a deploy.
+DEPLOY_PARALLELISM = int(os.getenv('NETWORKAPI_DEPLOY_PARALLELISM', '8'))
+# Time in seconds an idle ssh session to an equipment is kept open to be reused.
+SSH_POOL_IDLE_TIMEOUT = int(os.getenv('NETWORKAPI_SSH_POOL_IDLE_TIMEOUT', '300'))
+# Idle ssh sessions kept by equipment access.
+SSH_POOL_MAX_IDLE = 2
+# Time in seconds to wait for an expected answer of an equipment.
+SSH_PROMPT_TIMEOUT = int(os.getenv('NETWORKAPI_SSH_PROMPT_TIMEOUT', '600'))
 ###################
 
+########
+# JOBS #
+########
+# Number of processes of the jobworker command, which runs the deploys asked with async=1.
+JOB_WORKERS = int(os.getenv('NETWORKAPI_JOB_WORKERS', '4'))
+# Time in seconds an idle worker waits before looking for new jobs.
+JOB_POLL_INTERVAL = 1
+# Times a job is queued again when its lock is taken, before failing.
+JOB_MAX_ATTEMPTS = 30
+
 
 ## TESTS CONFIGS ##
 # If is running on CI: if CI=1 or running inside jenkins
@@ -0,0 +1,138 @@
+# -*- coding:utf-8 -*-
+
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from unittest import TestCase
+
+from django.core.cache import get_cache
+from django.db.models.signals import post_save, post_delete
+from mock import patch
+
+from networkapi import util
+from networkapi.infrastructure import commit_hooks
+
+
+class Item(object):
+
+    def __init__(self, id, value=None):
+        self.id = id
+        self.value = value
+
+
+class Owner(object):
+    pass
+
+
+class Other(object):
+    pass
+
+
+class ResultCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = get_cache('django.core.cache.backends.locmem.LocMemCache')
+        self.cache.clear()
+        self.patcher = patch.object(util, 'cache', self.cache)
+        self.patcher.start()
+
+        self.calls = []
+        self.values = {}
+
+        def compute(item, suffix=''):
+            self.calls.append(item.id)
+            return '%s%s' % (self.values.get(item.id, item.id), suffix)
+
+        self.result_cache = util.ResultCache(
+            compute, 'test', 60, [(Item, lambda item: [item.id]), (Owner, lambda owner: []), Other])
+
+    def tearDown(self):
+        for sender in (Item, Owner, Other):
+            post_save.disconnect(self.result_cache.invalidate, sender=sender)
+            post_delete.disconnect(self.result_cache.invalidate, sender=sender)
+        commit_hooks.discard_batch()
+        self.patcher.stop()
+
+    def test_results_are_cached(self):
+        self.assertEqual('1', self.result_cache(Item(1)))
+        self.assertEqual('1', self.result_cache(Item(1)))
+        self.assertEqual(['1-x', '1'], self.result_cache.get_many([Item(1)], '-x') + [self.result_cache(Item(1))])
+        self.assertEqual([1, 1], self.calls)
+
+    def test_get_many_uses_batch(self):
+        batches = []
+
+        @self.result_cache.batch
+        def compute_many(items):
+            batches.append([item.id for item in items])
+            return [str(item.id) for item in items]
+
+        self.result_cache(Item(1))
+        self.assertEqual(['1', '2', '3', '2'], self.result_cache.get_many([Item(1), Item(2), Item(3), Item(2)]))
+        self.assertEqual([[2, 3]], batches)
+
+    def test_save_invalidates_only_the_affected_instance(self):
+        self.result_cache.get_many([Item(1), Item(2)])
+        self.values[1] = 'new'
+
+        post_save.send(sender=Item, instance=Item(1), created=False)
+        self.assertEqual(['new', '2'], self.result_cache.get_many([Item(1), Item(2)]))
+        self.assertEqual([1, 2, 1], self.calls)
+
+    def test_sender_affecting_nothing_keeps_the_results(self):
+        self.result_cache(Item(1))
+        post_save.send(sender=Owner, instance=Owner(), created=False)
+        self.result_cache(Item(1))
+        self.assertEqual([1], self.calls)
+
+    def test_sender_without_function_invalidates_all(self):
+        self.result_cache.get_many([Item(1), Item(2)])
+        post_save.send(sender=Other, instance=Other(), created=False)
+        self.result_cache.get_many([Item(1), Item(2)])
+        self.assertEqual([1, 2, 1, 2], self.calls)
+
+    def test_invalidated_again_after_the_commit(self):
+        commit_hooks.start_batch()
+        post_save.send(sender=Item, instance=Item(1), created=False)
+
+        # A concurrent request caches the value of before the commit
+        self.result_cache(Item(1))
+        self.values[1] = 'committed'
+        self.assertEqual('1', self.result_cache(Item(1)))
+
+        commit_hooks.run_batch()
+        self.assertEqual('committed', self.result_cache(Item(1)))
+
+    def test_invalidated_again_after_the_rollback(self):
+        commit_hooks.start_batch()
+        self.values[1] = 'uncommitted'
+        post_save.send(sender=Item, instance=Item(1), created=False)
+
+        # The request itself caches the value it has not committed
+        self.assertEqual('uncommitted', self.result_cache(Item(1)))
+        self.values[1] = 'rolled back'
+
+        commit_hooks.discard_batch()
+        self.assertEqual('rolled back', self.result_cache(Item(1)))
+
+    def test_destroy_cache_function_by_ids(self):
+        cache_function = util.cache_function('vlan', 60)(lambda item: self.values.get(item.id, item.id))
+        self.assertEqual([1, 2], cache_function.get_many([Item(1), Item(2)]))
+        self.values[1] = 10
+        self.values[2] = 20
+
+        util.destroy_cache_function([1])
+        self.assertEqual([10, 2], cache_function.get_many([Item(1), Item(2)]))
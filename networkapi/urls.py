@@ -30,6 +30,7 @@ urlpatterns = patterns('',
     url(api_prefix, include('networkapi.api_deploy.urls')),
     url(api_prefix, include('networkapi.api_healthcheck.urls')),
     url(api_prefix, include('networkapi.api_interface.urls')),
+    url(api_prefix, include('networkapi.api_job.urls')),
     url(api_prefix, include('networkapi.api_network.urls')),
     url(api_prefix, include('networkapi.api_pools.urls')),
     url(api_prefix, include('networkapi.api_vip_request.urls')),
@@ -24,15 +24,22 @@ import socket
 import copy
 import sys
 import re
+import threading
 
 import time
 
+from networkapi.infrastructure import commit_hooks
 from networkapi.infrastructure.ipaddr import IPAddress, AddressValueError
 from django.forms.models import model_to_dict
 from django.core import validators
+from django.db.models.signals import post_save, post_delete
 
 LOCK = 'LOCK'
 
+RESULT_CACHE_KEY = 'result_cache:%s:%s:%s:%s'
+RESULT_CACHE_GENERATION_KEY = 'result_cache_generation:%s'
+RESULT_CACHE_OBJECT_GENERATION_KEY = 'result_cache_generation:%s:%s'
+
 
 def is_valid_regex(string, regex):
     '''Checks if the parameter is a valid value by regex.
@@ -412,72 +419,202 @@ def mount_ipv6_string(ip):
     return str(str(ip.block1) + ':' + str(ip.block2) + ':' + str(ip.block3) + ':' + str(ip.block4) + ':' + str(ip.block5) + ':' + str(ip.block6) + ':' + str(ip.block7) + ':' + str(ip.block8))
 
 
-def cache_function(length, equipment=False):
+def _result_cache_generation(name, length):
+    key = RESULT_CACHE_GENERATION_KEY % name
+    generation = cache.get(key)
+    if generation is None:
+        # Starts from the clock, so the keys of a lost generation are not reused
+        cache.add(key, int(time.time() * 1000), length)
+        generation = cache.get(key)
+    return generation
+
+
+def _result_cache_object_generations(name, ids, length):
+    """
+    Returns {id: generation} of the results of each id in the cache called name
+    """
+    keys = dict((RESULT_CACHE_OBJECT_GENERATION_KEY % (name, id), id) for id in set(ids))
+    found = cache.get_many(keys.keys())
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # add does not overwrite a generation set meanwhile by an invalidation
+        start = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, start, length)
+        found.update(cache.get_many(missing))
+    return dict((id, found.get(key)) for key, id in keys.items())
+
+
+def invalidate_result_cache(name, length=None, ids=None):
     """
-    Cache the result of function
+    Discards the results of the cache called name, by moving it to a new generation
 
-    @param length: time in seconds to stay in cache
+    @param ids: ids of the instances whose results are discarded, all of them if None
     """
-    def _decorated(func):
+    if ids is None:
+        keys = [RESULT_CACHE_GENERATION_KEY % name]
+    else:
+        keys = [RESULT_CACHE_OBJECT_GENERATION_KEY % (name, id) for id in set(ids)]
 
-        def _cache(*args, **kwargs):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), length)
 
-            if equipment == True:
-                key = sha1(str(args[0].id) + 'equipment').hexdigest()
-                print str(args[0].id) + 'equipment'
-            else:
-                key = sha1(str(args[0].id)).hexdigest()
-                print str(args[0].id)
 
-            # Search in cache if it exists
-            if cache.has_key(key):
+class _Flight(object):
 
-                # Get value in cache
-                value = cache.get(key)
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.result = None
 
-                # If was locked
-                if value == LOCK:
-                    # Try until unlock
-                    while value == LOCK:
-                        time.sleep(1)
-                        value = cache.get(key)
-                # Return value of cache
-                return value
 
-            # If not exists in cache
-            else:
-                # Function can be called several times before it finishes and is put into the cache,
-                # then lock it to others wait it finishes.
-                cache.set(key, LOCK, length)
+class ResultCache(object):
 
-                # Execute method
-                result = func(*args, **kwargs)
+    """
+    Cache of the results of a function whose first argument is a model instance.
 
-                # Set in cache the result of method
-                cache.set(key, result, length)
+    Results are stored by the id of the instance and the other arguments, under the
+    current generation of the cache and of the instance. Saving or deleting an instance
+    of one of the senders moves to a new generation the instances its function returns,
+    or the whole cache for senders without function. The signals run before the commit,
+    and a miss in the meantime may cache rows that are not committed yet, or of before
+    the commit, so the generations move again at the end of the transaction, on commit
+    and on rollback.
 
-                # If not exists in cache
-                # key_list = cache.get(sha1('key_networkapi_vlans').hexdigest())
-                # if(key_list == None):
-                #    key_list = []
+    When several threads of the process miss the same key at the same time, only
+    one of them calls the function and the others wait for its result.
 
-                # Set in cache the keys
-                # key_list.append(key)
-                # cache.set(sha1('key_networkapi_vlans').hexdigest(), key_list)
+    A function that computes many results at once may be registered with batch,
+    and is then used by get_many when more than one instance is missing.
+    """
 
-                return result
+    def __init__(self, func, name, length, senders=()):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.batch_func = None
+        self.name = name
+        self.length = length
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._affected = {}
+
+        for sender in senders:
+            affected = None
+            if isinstance(sender, tuple):
+                sender, affected = sender
+            self._affected[sender] = affected
+            post_save.connect(self.invalidate, sender=sender, weak=False)
+            post_delete.connect(self.invalidate, sender=sender, weak=False)
+
+    def invalidate(self, sender=None, instance=None, **kwargs):
+        ids = None
+        affected = self._affected.get(sender)
+        if affected is not None and instance is not None:
+            ids = affected(instance)
+            if ids is not None:
+                ids = list(ids)
+                if not ids:
+                    return
+
+        def invalidate():
+            invalidate_result_cache(self.name, self.length, ids)
+
+        invalidate()
+        commit_hooks.on_transaction_end(invalidate)
+
+    def batch(self, func):
+        """
+        Decorator registering func(objs, *args), which returns the results of all the
+        instances of objs in the same order
+        """
+        self.batch_func = func
+        return func
+
+    def _key(self, generation, object_generation, obj, args):
+        params = ':'.join([str(obj.id)] + [str(arg) for arg in args])
+        return RESULT_CACHE_KEY % (self.name, generation, object_generation, sha1(params).hexdigest())
+
+    def _compute(self, key, obj, args):
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.ok:
+                return flight.result
+            return self.func(obj, *args)
+
+        try:
+            flight.result = self.func(obj, *args)
+            flight.ok = True
+            return flight.result
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def get_many(self, objs, *args):
+        """
+        Returns the results for each instance of objs, in the same order, with two
+        get_many (generations and results) and one set_many to the cache
+        """
+        generation = _result_cache_generation(self.name, self.length)
+        object_generations = _result_cache_object_generations(
+            self.name, [obj.id for obj in objs], self.length)
+        keys = [self._key(generation, object_generations[obj.id], obj, args) for obj in objs]
+
+        found = cache.get_many(keys)
+        missing = []
+        missing_keys = set()
+        for obj, key in zip(objs, keys):
+            if key not in found and key not in missing_keys:
+                missing.append((key, obj))
+                missing_keys.add(key)
+
+        if self.batch_func is not None and len(missing) > 1:
+            results = self.batch_func([obj for key, obj in missing], *args)
+            computed = dict(zip([key for key, obj in missing], results))
+        else:
+            computed = dict((key, self._compute(key, obj, args)) for key, obj in missing)
+
+        if computed:
+            cache.set_many(computed, self.length)
+
+        return [found[key] if key in found else computed[key] for key in keys]
+
+    def __call__(self, obj, *args):
+        return self.get_many([obj], *args)[0]
+
+
+def cache_function(name, length, senders=()):
+    """
+    Cache the result of function, see ResultCache
 
-        return _cache
+    @param name: name of the cache, used by invalidate_result_cache
+    @param length: time in seconds to stay in cache
+    @param senders: models whose save or delete invalidate the cache, or (model, function)
+        where function(instance) returns the ids of the results to invalidate, or None for all
+    """
+    def _decorated(func):
+        return ResultCache(func, name, length, senders)
     return _decorated
 
 
 def destroy_cache_function(key_list, equipment=False):
-    for key in key_list:
-        key = str(key)
-        if equipment == True:
-            key = str(key) + 'equipment'
-        if(cache.has_key(sha1(key).hexdigest())):
-            cache.delete(sha1(key).hexdigest())
+    """
+    Discards the cached search results of the VLANs, or of the equipments if equipment
+    is True, whose ids are in key_list
+    """
+    if equipment == True:
+        invalidate_result_cache('equipment', ids=key_list)
+    else:
+        invalidate_result_cache('vlan', ids=key_list)
 
 
 class IP_VERSION:
@@ -16,13 +16,20 @@
 # limitations under the License.
 
 from __future__ import with_statement
+import time
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
 from django.core.exceptions import ObjectDoesNotExist
 from networkapi.log import Log
 from networkapi.semaforo.model import Semaforo
 from networkapi.models.BaseModel import BaseModel
 from _mysql_exceptions import OperationalError
 from networkapi.infrastructure.ipaddr import IPNetwork
+from networkapi.infrastructure import commit_hooks
+from networkapi.infrastructure.ip_bitmap import AddressBitmap
 from networkapi.util import clone
 from networkapi.filter.models import verify_subnet_and_equip
 from networkapi.queue_tools import queue_keys
@@ -319,51 +326,86 @@ class Vlan(BaseModel):
             self.log.error(u'Falha ao pesquisar as VLANs.')
             raise VlanError(e, u'Falha ao pesquisar as VLANs.')
 
-    def calculate_vlan_number(self, min_num, max_num, list_available=False):
+    def get_used_vlan_numbers(self, refresh=False):
+        """
+            Get the VLAN numbers that can not be used in the environment: the numbers of its
+            own VLANs and of the VLANs of the environments that share 'switches', 'roteadores'
+            or 'balanceadores' with it.
 
-        from networkapi.equipamento.models import EquipamentoAmbiente
+            The numbers are searched with one query and kept in cache as a bitmap, which is
+            discarded when any Vlan or EquipamentoAmbiente is saved or deleted.
+
+            @param refresh: Ignores the cached bitmap and builds it again from database.
+
+            @return: AddressBitmap indexed by VLAN number.
         """
-            Caculate if has a number available in range (min_num/max_num) to specified environment
 
-            @param min_num: Minimum number that the vlan can be created.
-            @param max_num: Maximum number that the vlan can be created.
-            @param list_available: If = True, return the list of numbers availables
+        key = VLAN_NUMBERS_KEY % (_vlan_numbers_generation(), self.ambiente_id)
+        if not refresh:
+            bits = cache.get(key)
+            if bits is not None:
+                return AddressBitmap(VLAN_NUMBERS_SIZE, bits)
+
+        vlan_numbers = self._vlans_sharing_numbers().values_list('num_vlan', flat=True).distinct()
+
+        used_numbers = AddressBitmap.from_offsets(VLAN_NUMBERS_SIZE, vlan_numbers)
+        cache.set(key, used_numbers.bits, settings.VLAN_NUMBERS_CACHE_TIME)
+
+        return used_numbers
 
-            @return: None when hasn't a number available | num_vlan when found a number available
+    def _vlans_sharing_numbers(self):
+        """
+            Get the VLANs of the environment and of the environments that share 'switches',
+            'roteadores' or 'balanceadores' with it.
         """
-        interval = range(min_num, max_num + 1)
 
-        # Vlan numbers in interval in the same environment
-        vlan_numbers_in_interval = self.search_vlan_numbers(
-            self.ambiente_id, min_num, max_num)
+        from networkapi.equipamento.models import EquipamentoAmbiente
 
         # Find equipment's ids from environmnet that is 'switches',
         # 'roteadores' or 'balanceadores'
         id_equipamentos = EquipamentoAmbiente.objects.filter(equipamento__tipo_equipamento__id__in=[1, 3, 5],
                                                              ambiente__id=self.ambiente_id).values_list('equipamento',
                                                                                                         flat=True)
-        # Vlan numbers in others environment but in environment that has equipments found in before
-        # filter ('switches', 'roteadores' or 'balanceadores')
-        vlans_others_environments = Vlan.objects.exclude(ambiente__id=self.ambiente_id) \
-            .filter(ambiente__equipamentoambiente__equipamento__id__in=id_equipamentos) \
-            .values_list('num_vlan', flat=True)
-
-        # Clean duplicates numbers and update merge 'vlan_numbers_in_interval'
-        # with 'vlans_others_environments'
-        vlan_numbers_in_interval = set(vlan_numbers_in_interval)
-        vlan_numbers_in_interval.update(vlans_others_environments)
-
-        self.log.info("Interval: %s.", interval)
-        self.log.info("VLANs in interval: %s.", vlan_numbers_in_interval)
-
-        # if len(interval) > len(vlan_numbers_in_interval):
-        diff_set = set(interval) - set(vlan_numbers_in_interval)
-        self.log.info("Difference in the lists: %s.", diff_set)
+        # Vlan numbers in the same environment or in environments that has
+        # equipments found in before filter
+        return Vlan.objects.filter(Q(ambiente__id=self.ambiente_id) |
+                                   Q(ambiente__equipamentoambiente__equipamento__id__in=id_equipamentos))
+
+    def calculate_vlan_number(self, min_num, max_num, list_available=False):
+        """
+            Caculate if has a number available in range (min_num/max_num) to specified environment
+
+            @param min_num: Minimum number that the vlan can be created.
+            @param max_num: Maximum number that the vlan can be created.
+            @param list_available: If = True, return the list of numbers availables
+
+            The cached bitmap may be stale, so the number found is checked in database and the
+            bitmap is rebuilt once if it is already in use.
+
+            @return: None when hasn't a number available | lowest num_vlan available
+        """
+
+        used_numbers = self.get_used_vlan_numbers()
+
         if list_available:
-            return diff_set
-        for num_vlan in diff_set:
-            return num_vlan
-        return None
+            return set(used_numbers.free_offsets(min_num, max_num))
+
+        num_vlan = used_numbers.first_free(min_num, max_num)
+        if num_vlan is not None and self._vlans_sharing_numbers().filter(num_vlan=num_vlan).exists():
+            num_vlan = self.get_used_vlan_numbers(refresh=True).first_free(min_num, max_num)
+        self.log.info("Interval: %s-%s, VLAN number available: %s.", min_num, max_num, num_vlan)
+        return num_vlan
+
+    def calculate_vlan_numbers(self, min_num, max_num, quantity):
+        """
+            Caculate many numbers available in range (min_num/max_num) to specified environment
+
+            @param quantity: How many numbers are needed.
+
+            @return: List with the lowest numbers available, it may be shorter than quantity
+        """
+
+        return self.get_used_vlan_numbers().free_offsets(min_num, max_num, quantity)
 
     def activate(self, authenticated_user):
         """ Set column ativada = 1"""
@@ -429,6 +471,8 @@ class Vlan(BaseModel):
             raise VlanNameDuplicatedError(
                 None, 'Name VLAN can not be duplicated in the environment.')
 
+        Semaforo.lock(Semaforo.ALOCAR_VLAN_ID)
+
         # Calculate Number VLAN
         self.num_vlan = self.calculate_vlan_number(min_num_01, max_num_01)
         if self.num_vlan is None:
@@ -805,3 +849,36 @@ class Vlan(BaseModel):
                 cause, "Esta Vlan possui uma Rede com Requisição Vip apontando para ela, e não pode ser excluída")
         except VlanCantDeallocate, e:
             raise e
+
+
+VLAN_NUMBERS_KEY = 'vlan_numbers:%s:%s'
+VLAN_NUMBERS_GENERATION_KEY = 'vlan_numbers_generation'
+VLAN_NUMBERS_SIZE = 4096
+
+
+def _vlan_numbers_generation():
+    generation = cache.get(VLAN_NUMBERS_GENERATION_KEY)
+    if generation is None:
+        # Starts from the clock, so the keys of a lost generation are not reused
+        cache.add(VLAN_NUMBERS_GENERATION_KEY, int(time.time() * 1000), settings.VLAN_NUMBERS_CACHE_TIME)
+        generation = cache.get(VLAN_NUMBERS_GENERATION_KEY)
+    return generation
+
+
+def _next_vlan_numbers_generation():
+    try:
+        cache.incr(VLAN_NUMBERS_GENERATION_KEY)
+    except ValueError:
+        cache.set(VLAN_NUMBERS_GENERATION_KEY, int(time.time() * 1000), settings.VLAN_NUMBERS_CACHE_TIME)
+
+
+def vlan_numbers_post_change(sender, instance, **kwargs):
+    """Discards the cached VLAN numbers of all environments, now and at the end of the transaction."""
+    _next_vlan_numbers_generation()
+    commit_hooks.on_transaction_end(_next_vlan_numbers_generation)
+
+
+# EquipamentoAmbiente connects the same receiver in equipamento.models,
+# which imports this module through ambiente.models
+post_save.connect(vlan_numbers_post_change, sender=Vlan)
+post_delete.connect(vlan_numbers_post_change, sender=Vlan)
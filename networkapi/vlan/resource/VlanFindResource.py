@@ -22,16 +22,18 @@ from django.db.models import Q
 from networkapi.admin_permission import AdminPermission
 from networkapi.auth import has_perm
 from networkapi.grupo.models import GrupoError
-from networkapi.infrastructure.xml_utils import dumps_networkapi, loads
+from networkapi.infrastructure.xml_utils import iterdumps_networkapi, loads
 from networkapi.log import Log
 from networkapi.rest import RestResource
 from networkapi.util import is_valid_string_minsize, is_valid_int_greater_zero_param, is_valid_boolean_param, is_valid_int_greater_equal_zero_param,\
     cache_function
-from networkapi.vlan.models import Vlan, VlanError
+from networkapi.vlan.models import Vlan, VlanError, TipoRede
+from networkapi.ip.models import Ip, Ipv6, IpEquipamento, Ipv6Equipament, NetworkIPv4, NetworkIPv6
+from networkapi.equipamento.models import Equipamento, EquipamentoAmbiente
 from networkapi.exception import InvalidValueError
 from networkapi.infrastructure.ipaddr import IPNetwork
 from string import split
-from networkapi.ambiente.models import IP_VERSION
+from networkapi.ambiente.models import IP_VERSION, Ambiente, DivisaoDc, AmbienteLogico, GrupoL3
 from networkapi.infrastructure.datatable import build_query_to_datatable
 from django.forms.models import model_to_dict
 from networkapi.settings import VLAN_CACHE_TIME
@@ -113,121 +115,177 @@ def get_networks(vlans, half=True):
     Join networks of vlan
     """
 
-    itens = []
-    for vlan in vlans:
-        vlan_dict = prepares_network(vlan, half)
-        itens.append(vlan_dict)
+    return prepares_network.get_many(list(vlans), half)
+
+
+def _vlans_of_ip_equipment(ip_equipment):
+    return Ip.objects.filter(id=ip_equipment.ip_id).values_list('networkipv4__vlan', flat=True)
+
+
+def _vlans_of_ipv6_equipment(ip_equipment):
+    return Ipv6.objects.filter(id=ip_equipment.ip_id).values_list('networkipv6__vlan', flat=True)
 
-    return itens
 
-#@cache_function(VLAN_CACHE_TIME)
+def _vlans_of_equipment(equipment):
+    return set(IpEquipamento.objects.filter(equipamento=equipment.id).values_list(
+        'ip__networkipv4__vlan', flat=True)) | set(Ipv6Equipament.objects.filter(
+            equipamento=equipment.id).values_list('ip__networkipv6__vlan', flat=True))
 
 
+def _vlans_of_environment(environment_id):
+    return Vlan.objects.filter(ambiente=environment_id).values_list('id', flat=True)
+
+
+# Models the search result of a vlan is built from, with the vlans affected by each
+# instance. Changes of the models without function discard the results of all vlans.
+@cache_function('vlan', VLAN_CACHE_TIME,
+                [(Vlan, lambda vlan: [vlan.id]),
+                 (NetworkIPv4, lambda network: [network.vlan_id]),
+                 (NetworkIPv6, lambda network: [network.vlan_id]),
+                 (IpEquipamento, _vlans_of_ip_equipment),
+                 (Ipv6Equipament, _vlans_of_ipv6_equipment),
+                 (Equipamento, _vlans_of_equipment),
+                 (EquipamentoAmbiente, lambda equip_environment: _vlans_of_environment(equip_environment.ambiente_id)),
+                 (Ambiente, lambda environment: _vlans_of_environment(environment.id)),
+                 TipoRede, DivisaoDc, AmbienteLogico, GrupoL3])
 def prepares_network(vlan, half):
-    vlan_dict = dict()
+    return prepares_networks([vlan], half)[0]
+
+
+def _routers_by_network(ip_equips, network_environment, routers):
+    """
+    Returns the names of the routers of each network, from (network, equipment, name) rows
+    """
+    names = dict()
+    for network_id, equip_id, equip_name in ip_equips:
+        if (equip_id, network_environment[network_id]) in routers:
+            equips = names.setdefault(network_id, [])
+            if equip_name not in equips:
+                equips.append(equip_name)
+    return names
+
+
+@prepares_network.batch
+def prepares_networks(vlans, half):
+    """
+    Builds the dicts of many vlans with a fixed number of queries, whatever the
+    number of vlans, networks and IPs
+    """
+    vlan_ids = [vlan.id for vlan in vlans]
+    vlan_environment = dict((vlan.id, vlan.ambiente_id) for vlan in vlans)
+
+    netsv4 = NetworkIPv4.objects.filter(vlan__in=vlan_ids).order_by('id').values_list(
+        'vlan', 'id', 'oct1', 'oct2', 'oct3', 'oct4', 'block', 'network_type__tipo_rede')
+    netsv6 = NetworkIPv6.objects.filter(vlan__in=vlan_ids).order_by('id').values_list(
+        'vlan', 'id', 'block1', 'block2', 'block3', 'block4', 'block5', 'block6', 'block7', 'block8',
+        'block', 'network_type__tipo_rede')
+
+    netsv4_by_vlan = dict()
+    for net in netsv4:
+        net_str = str(net[2]) + "." + str(net[3]) + "." + str(net[4]) + "." + str(net[5]) + "/" + str(net[6])
+        netsv4_by_vlan.setdefault(net[0], []).append((net[1], IPNetwork(net_str).exploded, net[7]))
+
+    netsv6_by_vlan = dict()
+    for net in netsv6:
+        net_str = ":".join([str(block) for block in net[2:10]]) + "/" + str(net[10])
+        netsv6_by_vlan.setdefault(net[0], []).append((net[1], IPNetwork(net_str).compressed, net[11]))
+
+    environment_names = dict()
+    routersv4 = dict()
+    routersv6 = dict()
     if not half:
-        vlan_dict = model_to_dict(vlan)
-        vlan_dict["ambiente_name"] = vlan.ambiente.divisao_dc.nome + " - " + \
-            vlan.ambiente.ambiente_logico.nome + \
-            " - " + vlan.ambiente.grupo_l3.nome
-
-    vlan_dict["is_more"] = False
-    netv4_itens = []
-    for netv4 in vlan.networkipv4_set.all().prefetch_related("network_type"):
-        net_dict = dict()
-        net = str(netv4.oct1) + "." + str(netv4.oct2) + "." + \
-            str(netv4.oct3) + "." + str(netv4.oct4) + "/" + str(netv4.block)
-        net_dict['network'] = IPNetwork(net).exploded
-        net_dict['id'] = netv4.id
-        if not half:
-            net_dict['tipo_rede_name'] = netv4.network_type.tipo_rede
-
-            equip_itens = []
-            for ip in netv4.ip_set.all():
-                for ip_equip in ip.ipequipamento_set.all():
-                    if not ip_equip.equipamento.nome in equip_itens:
-                        for equip_amb in ip_equip.equipamento.equipamentoambiente_set.filter(ambiente=vlan.ambiente, is_router=True):
-                            equip_itens.append(ip_equip.equipamento.nome)
-
-            if len(equip_itens) == 0:
-                equip_itens.append("&nbsp;")
-            elif len(equip_itens) > 3:
-                vlan_dict["is_more"] = True
-
-            net_dict['equipamentos'] = equip_itens
-
-        netv4_itens.append(net_dict)
-
-    netv6_itens = []
-    for netv6 in vlan.networkipv6_set.all():
-        net_dict = dict()
-        net = str(netv6.block1) + ":" + str(netv6.block2) + ":" + str(netv6.block3) + ":" + str(netv6.block4) + ":" + \
-            str(netv6.block5) + ":" + str(netv6.block6) + ":" + \
-            str(netv6.block7) + ":" + \
-            str(netv6.block8) + "/" + str(netv6.block)
-        net_dict['network'] = IPNetwork(net).compressed
-        net_dict['id'] = netv6.id
+        for env_id, division, logical, l3_group in Ambiente.objects.filter(
+                id__in=set(vlan_environment.values())).values_list(
+                'id', 'divisao_dc__nome', 'ambiente_logico__nome', 'grupo_l3__nome'):
+            environment_names[env_id] = division + " - " + logical + " - " + l3_group
+
+        routers = set(EquipamentoAmbiente.objects.filter(
+            ambiente__in=set(vlan_environment.values()), is_router=True).values_list('equipamento', 'ambiente'))
+
+        network_environment = dict((net[1], vlan_environment[net[0]]) for net in netsv4)
+        routersv4 = _routers_by_network(IpEquipamento.objects.filter(
+            ip__networkipv4__in=network_environment.keys()).order_by('ip', 'id').values_list(
+            'ip__networkipv4', 'equipamento', 'equipamento__nome'), network_environment, routers)
+
+        network_environment = dict((net[1], vlan_environment[net[0]]) for net in netsv6)
+        routersv6 = _routers_by_network(Ipv6Equipament.objects.filter(
+            ip__networkipv6__in=network_environment.keys()).order_by('ip', 'id').values_list(
+            'ip__networkipv6', 'equipamento', 'equipamento__nome'), network_environment, routers)
+
+    vlan_dicts = []
+    for vlan in vlans:
+        vlan_dict = dict()
         if not half:
-            net_dict['tipo_rede_name'] = netv6.network_type.tipo_rede
+            vlan_dict = model_to_dict(vlan)
+            vlan_dict["ambiente_name"] = environment_names[vlan.ambiente_id]
+
+        vlan_dict["is_more"] = False
+        items = dict()
+        for key, nets, routers in (("redeipv4", netsv4_by_vlan, routersv4), ("redeipv6", netsv6_by_vlan, routersv6)):
+            items[key] = []
+            for net_id, network, network_type in nets.get(vlan.id, []):
+                net_dict = dict()
+                net_dict['network'] = network
+                net_dict['id'] = net_id
+                if not half:
+                    net_dict['tipo_rede_name'] = network_type
 
-            equip_itens = []
-            for ip in netv6.ipv6_set.all():
-                for ip_equip in ip.ipv6equipament_set.all():
-                    if not ip_equip.equipamento.nome in equip_itens:
-                        for equip_amb in ip_equip.equipamento.equipamentoambiente_set.filter(ambiente=vlan.ambiente, is_router=True):
-                            equip_itens.append(ip_equip.equipamento.nome)
+                    equip_itens = list(routers.get(net_id, []))
+                    if len(equip_itens) == 0:
+                        equip_itens.append("&nbsp;")
+                    elif len(equip_itens) > 3:
+                        vlan_dict["is_more"] = True
 
-            if len(equip_itens) == 0:
-                equip_itens.append("&nbsp;")
-            elif len(equip_itens) > 3:
-                vlan_dict["is_more"] = True
+                    net_dict['equipamentos'] = equip_itens
 
-            net_dict['equipamentos'] = equip_itens
+                items[key].append(net_dict)
 
-        netv6_itens.append(net_dict)
+        netv4_itens = items["redeipv4"]
+        netv6_itens = items["redeipv6"]
 
-    vlan_dict["id"] = vlan.id
-    vlan_dict["redeipv4"] = netv4_itens
-    vlan_dict["redeipv6"] = netv6_itens
+        vlan_dict["id"] = vlan.id
+        vlan_dict["redeipv4"] = netv4_itens
+        vlan_dict["redeipv6"] = netv6_itens
 
-    if (len(netv4_itens) > 1):
-        if(vlan_dict["is_more"] == True) or (len(netv4_itens) > 3):
-            vlan_dict["more_than_three"] = True
-    if (len(netv6_itens) > 1):
-        if(vlan_dict["is_more"] == True) or (len(netv6_itens) > 3):
-            vlan_dict["more_than_three"] = True
+        if (len(netv4_itens) > 1):
+            if(vlan_dict["is_more"] == True) or (len(netv4_itens) > 3):
+                vlan_dict["more_than_three"] = True
+        if (len(netv6_itens) > 1):
+            if(vlan_dict["is_more"] == True) or (len(netv6_itens) > 3):
+                vlan_dict["more_than_three"] = True
 
-    if len(netv4_itens) > 3:
-        vlan_dict["is_more"] = True
-    if len(netv6_itens) > 3:
-        vlan_dict["is_more"] = True
+        if len(netv4_itens) > 3:
+            vlan_dict["is_more"] = True
+        if len(netv6_itens) > 3:
+            vlan_dict["is_more"] = True
 
-    return vlan_dict
+        vlan_dicts.append(vlan_dict)
 
+    return vlan_dicts
+
+
+def overlap_filter(network_ip, version):
+    """
+    Returns the filter of the vlans with a network that is subnet or supernet
+    of (or equal to) network_ip. Two prefixes overlap only when one contains
+    the other, so the packed network ranges are compared in the database.
+    """
+    start = int(network_ip.network)
+    end = int(network_ip.broadcast)
 
-def verify_subnet(vlan, network_ip, version):
     if version == IP_VERSION.IPv4[0]:
-        key = "redeipv4"
-    else:
-        key = "redeipv6"
-
-    # One vlan may have many networks, iterate over it
-    for net in vlan[key]:
-        ip_net = IPNetwork(net["network"])
-        # If some network, inside this vlan, is subnet of network search param
-        if ip_net in network_ip:
-            # This vlan must be in vlans founded, dont need to continue
-            # checking
-            return True
-        # If some network, inside this vlan, is supernet of network search
-        # param
-        if network_ip in ip_net:
-            # This vlan must be in vlans founded, dont need to continue
-            # checking
-            return True
-
-    # If dont found any subnet return None
-    return False
+        return Q(networkipv4__start_int__lte=end, networkipv4__end_int__gte=start)
+
+    half = (1L << 64) - 1
+    start_high, start_low = start >> 64, start & half
+    end_high, end_low = end >> 64, end & half
+
+    # 128 bits comparisons over the (high, low) pairs
+    starts_before_end = Q(networkipv6__start_high__lt=end_high) | \
+        Q(networkipv6__start_high=end_high, networkipv6__start_low__lte=end_low)
+    ends_after_start = Q(networkipv6__end_high__gt=start_high) | \
+        Q(networkipv6__end_high=start_high, networkipv6__end_low__gte=start_low)
+    return starts_before_end & ends_after_start
 
 
 class VlanFindResource(RestResource):
@@ -392,6 +450,11 @@ class VlanFindResource(RestResource):
                             if len(blocks[4]) != 0:
                                 blk = Q(networkipv4__block=blocks[4])
 
+                            if 0 not in [len(block) for block in blocks[:4]]:
+                                # Whole address given, search by the packed column
+                                oct1 = oct2 = oct3 = Q()
+                                oct4 = Q(networkipv4__start_int=int(network_ip.ip))
+
                             vlans = vlans.filter(
                                 oct1 & oct2 & oct3 & oct4 & blk)
                         else:
@@ -425,6 +488,12 @@ class VlanFindResource(RestResource):
                             if len(blocks[8]) != 0:
                                 blk = Q(networkipv6__block=blocks[8])
 
+                            if 0 not in [len(block) for block in blocks[:8]]:
+                                # Whole address given, search by the packed columns
+                                oct1 = oct2 = oct3 = oct4 = oct5 = oct6 = oct7 = Q()
+                                oct8 = Q(networkipv6__start_high=int(network_ip.ip) >> 64,
+                                         networkipv6__start_low=int(network_ip.ip) & ((1L << 64) - 1))
+
                             vlans = vlans.filter(
                                 oct1 & oct2 & oct3 & oct4 & oct5 & oct6 & oct7 & oct8 & blk)
                     # If subnet is 1
@@ -440,19 +509,8 @@ class VlanFindResource(RestResource):
                         if blocks != expl:
                             raise InvalidValueError(None, 'rede', network)
 
-                        # First, get all vlans filtered until now
-                        itens = get_networks(vlans)
-
-                        ids_exclude = []
-                        # Then iterate over it to verify each vlan
-                        for vlan in itens:
-
-                            is_subnet = verify_subnet(
-                                vlan, network_ip, version)
-                            if not is_subnet:
-                                ids_exclude.append(vlan["id"])
-
-                        vlans = vlans.exclude(id__in=ids_exclude)
+                        # Filtered in the database, before the pagination
+                        vlans = vlans.filter(overlap_filter(network_ip, version))
 
             # Custom order
             if asorting_cols:
@@ -493,7 +551,7 @@ class VlanFindResource(RestResource):
             vlan_map["vlan"] = itens
             vlan_map["total"] = total
 
-            return self.response(dumps_networkapi(vlan_map))
+            return self.response(iterdumps_networkapi(vlan_map))
 
         except InvalidValueError, e:
             self.log.error(